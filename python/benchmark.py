@@ -0,0 +1,77 @@
+import argparse
+import matplotlib
+
+import benchmarks.main as benchmarks
+from benchmarks.cases import BENCHMARKS
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the samplers, collision time kernels, "
+        "conversions and save/plot stages"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=float,
+        nargs="+",
+        default=benchmarks.DEFAULT_SIZES,
+        help="Problem sizes to run, e.g. 1e4 1e6 (default: 1e4 to 1e8)",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=[benchmark.name for benchmark in BENCHMARKS],
+        default=None,
+        help="Only run these benchmarks",
+    )
+    parser.add_argument(
+        "--group",
+        nargs="+",
+        choices=sorted({benchmark.group for benchmark in BENCHMARKS}),
+        default=None,
+        help="Only run benchmarks in these groups",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the inputs")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of timed calls per size"
+    )
+    parser.add_argument(
+        "--ignore-limits",
+        action="store_true",
+        help="Run every benchmark at every size, even ones too large to be useful",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="Baseline file (default: output/benchmarks/baseline.json)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the results as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown or memory growth flagged as a regression",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    matplotlib.use("Agg")
+
+    regressed = benchmarks.main(
+        [int(n) for n in args.sizes],
+        args.only,
+        args.group,
+        args.seed,
+        args.repeat,
+        args.ignore_limits,
+        args.baseline,
+        args.save_baseline,
+        args.threshold,
+    )
+    raise SystemExit(1 if regressed else 0)
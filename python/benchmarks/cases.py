@@ -0,0 +1,294 @@
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import matplotlib.pyplot as plt
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import rust
+from helpers import get_base_dir
+from disk_calcs.disk import DiskCalcs
+from disk_calcs.plot import plot_disk_radii_dist
+from imf.plot_and_save import plot_imf_histogram
+from interaction_times.collision_times import t_coll_disk, t_coll_earth
+from interaction_times.main import N_O, V_O
+from rock_calcs.conversions import (
+    rock_lifetime_curve,
+    rock_mass_to_lifetime,
+    rock_mass_to_radius,
+    rock_radius_to_lifetime,
+)
+from rock_calcs.save_and_plot import plot_rock_dist, plot_rock_lifetimes
+from rock_calcs.survival import SurvivalFunction
+from run_store import RunStore
+
+# Number of stars return_coll_times always samples (RUNS in rust/src/lib.rs)
+RUST_RUNS: int = 100_000
+
+# Slow imports that runs without plots never need (see helpers.lazy_import)
+DEFERRED_MODULES: tuple[str, ...] = ("astropy", "matplotlib", "pandas")
+
+
+class Benchmark:
+    """One benchmarked operation.
+
+    `setup(n, seed, workdir)` prepares the inputs for a problem size outside
+    the timed region and returns the zero-argument callable that is timed.
+
+    Args:
+        name (str): Name of the benchmark, used as its key in results
+        group (str): What the benchmark covers, e.g. "sampler" or "plot"
+        setup (Callable[[int, int, str], Callable[[], object]]): Prepares a run
+        max_n (int | None): Largest problem size worth running by default.
+            Sizes above it are skipped unless limits are ignored.
+        fixed_n (int | None): Problem size of operations that do not take one.
+            They are run once, at this size, whatever sizes are requested.
+        budget_s (float | None): Time the operation must always stay under,
+            checked on every run whether or not there is a baseline
+    """
+
+    def __init__(
+        self,
+        name: str,
+        group: str,
+        setup: Callable[[int, int, str], Callable[[], object]],
+        max_n: int | None = None,
+        fixed_n: int | None = None,
+        budget_s: float | None = None,
+    ) -> None:
+        self.name: str = name
+        self.group: str = group
+        self.setup: Callable[[int, int, str], Callable[[], object]] = setup
+        self.max_n: int | None = max_n
+        self.fixed_n: int | None = fixed_n
+        self.budget_s: float | None = budget_s
+
+    def sizes(self, requested: list[int], ignore_limits: bool = False) -> list[int]:
+        """Returns the problem sizes to run this benchmark at.
+
+        Args:
+            requested (list[int]): Sizes asked for on the command line
+            ignore_limits (bool): Run sizes above max_n too
+
+        Returns:
+            list[int]: Sizes to run
+        """
+        if self.fixed_n is not None:
+            return [self.fixed_n]
+        if ignore_limits or self.max_n is None:
+            return list(requested)
+        return [n for n in requested if n <= self.max_n]
+
+
+@contextmanager
+def graphs_redirected(directory: str) -> Iterator[None]:
+    """Makes plt.savefig write into `directory` instead of output/graphs,
+    so benchmarking the plot stages does not overwrite the project's graphs.
+
+    Args:
+        directory (str): Directory to save the figures to
+    """
+    savefig: Callable = plt.savefig
+
+    def redirected(fname, *args, **kwargs):
+        return savefig(
+            os.path.join(directory, os.path.basename(str(fname))), *args, **kwargs
+        )
+
+    plt.savefig = redirected
+    try:
+        yield
+    finally:
+        plt.savefig = savefig
+
+
+def _stellar_masses(n: int, seed: int) -> np.ndarray:
+    return rust.get_stellar_masses(n, seed)
+
+
+def _rock_masses(n: int, seed: int) -> np.ndarray:
+    return rust.get_rock_masses(n, seed)
+
+
+def _setup_get_stellar_masses(n: int, seed: int, workdir: str) -> Callable:
+    return lambda: rust.get_stellar_masses(n, seed)
+
+
+def _setup_get_rock_masses(n: int, seed: int, workdir: str) -> Callable:
+    return lambda: rust.get_rock_masses(n, seed)
+
+
+def _setup_get_stellar_masses_out(n: int, seed: int, workdir: str) -> Callable:
+    out: np.ndarray = np.empty(n)
+    return lambda: rust.get_stellar_masses(seed=seed, out=out)
+
+
+def _setup_return_coll_times(n: int, seed: int, workdir: str) -> Callable:
+    return rust.return_coll_times
+
+
+def _setup_return_coll_time_columns(n: int, seed: int, workdir: str) -> Callable:
+    stellar_mass: np.ndarray = _stellar_masses(n, seed)
+    return lambda: rust.return_coll_time_columns(stellar_mass)
+
+
+def _setup_t_coll_earth(n: int, seed: int, workdir: str) -> Callable:
+    # t_coll_earth is scalar in the pipeline; an array of velocities
+    # gives it a problem size
+    v_o: np.ndarray = np.linspace(1e3, 50e3, n)
+    return lambda: t_coll_earth(N_O, v_o)
+
+
+def _setup_disk_calcs(n: int, seed: int, workdir: str) -> Callable:
+    stellar_mass: np.ndarray = _stellar_masses(n, seed)
+    return lambda: DiskCalcs(stellar_mass, verbose=False).density
+
+
+def _setup_t_coll_disk(n: int, seed: int, workdir: str) -> Callable:
+    stellar_mass: np.ndarray = _stellar_masses(n, seed)
+    disk = DiskCalcs(stellar_mass, verbose=False)
+    # Evaluates the lazy disk values outside the timed region
+    _ = disk.density, disk.csa_sideview, disk.csa_topview
+    return lambda: t_coll_disk(N_O, V_O, disk, stellar_mass)
+
+
+def _setup_rock_mass_to_radius(n: int, seed: int, workdir: str) -> Callable:
+    rock_masses: np.ndarray = _rock_masses(n, seed)
+    return lambda: rock_mass_to_radius(rock_masses)
+
+
+def _setup_rock_radius_to_lifetime(n: int, seed: int, workdir: str) -> Callable:
+    rock_radii: np.ndarray = rock_mass_to_radius(_rock_masses(n, seed))
+    return lambda: rock_radius_to_lifetime(rock_radii)
+
+
+def _setup_rock_mass_to_lifetime(n: int, seed: int, workdir: str) -> Callable:
+    rock_masses: np.ndarray = _rock_masses(n, seed)
+    lifetimes: np.ndarray = np.empty_like(rock_masses)
+    return lambda: rock_mass_to_lifetime(rock_masses, lifetimes)
+
+
+def _setup_survival_function(n: int, seed: int, workdir: str) -> Callable:
+    rock_lifetimes: np.ndarray = rock_mass_to_lifetime(_rock_masses(n, seed))
+    # One Earth or disk collision time per row of the 10^6-row cell tables
+    coll_times: np.ndarray = np.logspace(12, 17, 10**6)
+    return lambda: SurvivalFunction.from_lifetimes(rock_lifetimes)(coll_times)
+
+
+def _setup_import(module: str) -> Callable[[int, int, str], Callable]:
+    """Returns the setup of a benchmark timing a fresh interpreter importing
+    `module`, which fails if the import pulls in any of DEFERRED_MODULES."""
+
+    code: str = (
+        f"import sys, {module}\n"
+        f"loaded = sorted(set(sys.modules) & {set(DEFERRED_MODULES)!r})\n"
+        "if loaded:\n"
+        f"    sys.exit('Importing {module} imported ' + ', '.join(loaded))"
+    )
+
+    def setup(n: int, seed: int, workdir: str) -> Callable:
+        def run() -> None:
+            result = subprocess.run(
+                [sys.executable, "-c", code],
+                cwd=f"{get_base_dir()}/python",
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip())
+
+        return run
+
+    return setup
+
+
+def _setup_save_npy(n: int, seed: int, workdir: str) -> Callable:
+    values: np.ndarray = _stellar_masses(n, seed)
+    return lambda: np.save(os.path.join(workdir, "values.npy"), values)
+
+
+def _setup_save_run_store(n: int, seed: int, workdir: str) -> Callable:
+    values: np.ndarray = _stellar_masses(n, seed)
+
+    def save() -> None:
+        with RunStore.create(tempfile.mkdtemp(dir=workdir), {}) as store:
+            store.save("stellar_masses", values, "kg")
+
+    return save
+
+
+def _setup_plot_imf_histogram(n: int, seed: int, workdir: str) -> Callable:
+    stellar_mass: np.ndarray = _stellar_masses(n, seed)
+    return lambda: plot_imf_histogram(stellar_mass)
+
+
+def _setup_plot_disk(n: int, seed: int, workdir: str) -> Callable:
+    disk = DiskCalcs(_stellar_masses(n, seed), verbose=False)
+
+    def plot() -> None:
+        disk.plot_dust_mass_vs_disk_density(disk.dust_mass, disk.density)
+        plot_disk_radii_dist(disk.get_reduced_radius())
+
+    return plot
+
+
+def _setup_plot_rock_dist(n: int, seed: int, workdir: str) -> Callable:
+    rock_masses: np.ndarray = _rock_masses(n, seed)
+    return lambda: plot_rock_dist(rock_masses)
+
+
+def _setup_plot_rock_lifetimes(n: int, seed: int, workdir: str) -> Callable:
+    rock_masses: np.ndarray = _rock_masses(n, seed)
+    return lambda: plot_rock_lifetimes(
+        *rock_lifetime_curve(np.min(rock_masses), np.max(rock_masses))
+    )
+
+
+BENCHMARKS: tuple[Benchmark, ...] = (
+    Benchmark("get_stellar_masses", "sampler", _setup_get_stellar_masses),
+    Benchmark("get_rock_masses", "sampler", _setup_get_rock_masses),
+    Benchmark("get_stellar_masses_out", "sampler", _setup_get_stellar_masses_out),
+    Benchmark(
+        "return_coll_times", "collision", _setup_return_coll_times, fixed_n=RUST_RUNS
+    ),
+    # Returns 25 rows per star, so 10^7 stars is already ~10 GB
+    Benchmark(
+        "return_coll_time_columns",
+        "collision",
+        _setup_return_coll_time_columns,
+        max_n=10**6,
+    ),
+    Benchmark("t_coll_earth", "collision", _setup_t_coll_earth),
+    Benchmark("disk_calcs", "collision", _setup_disk_calcs),
+    Benchmark("t_coll_disk", "collision", _setup_t_coll_disk),
+    Benchmark("rock_mass_to_radius", "conversion", _setup_rock_mass_to_radius),
+    Benchmark("rock_radius_to_lifetime", "conversion", _setup_rock_radius_to_lifetime),
+    Benchmark("rock_mass_to_lifetime", "conversion", _setup_rock_mass_to_lifetime),
+    Benchmark("survival_function", "conversion", _setup_survival_function),
+    Benchmark("save_npy", "save", _setup_save_npy),
+    Benchmark("save_run_store", "save", _setup_save_run_store),
+    Benchmark("plot_imf_histogram", "plot", _setup_plot_imf_histogram, max_n=10**7),
+    # Line plots of the disk draw every sample
+    Benchmark("plot_disk", "plot", _setup_plot_disk, max_n=10**6),
+    Benchmark("plot_rock_dist", "plot", _setup_plot_rock_dist, max_n=10**7),
+    Benchmark("plot_rock_lifetimes", "plot", _setup_plot_rock_lifetimes),
+    # Startup of the entry points, including the interpreter's own.
+    # The budgets leave room for numpy, numba and the Rust library
+    Benchmark("import_run", "startup", _setup_import("run"), fixed_n=1, budget_s=1.0),
+    Benchmark(
+        "import_streaming",
+        "startup",
+        _setup_import("streaming.main"),
+        fixed_n=1,
+        budget_s=1.0,
+    ),
+    Benchmark(
+        "import_sweep",
+        "startup",
+        _setup_import("interaction_times.sweep"),
+        fixed_n=1,
+        budget_s=0.5,
+    ),
+)
@@ -0,0 +1,304 @@
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from helpers import get_base_dir
+from benchmarks.cases import BENCHMARKS, Benchmark, graphs_redirected
+from profiling import current_rss_bytes
+
+DEFAULT_SIZES: tuple[int, ...] = (10**4, 10**5, 10**6, 10**7, 10**8)
+
+
+def benchmark_dir() -> str:
+    return f"{get_base_dir()}/output/benchmarks"
+
+
+def default_baseline_path() -> str:
+    return f"{benchmark_dir()}/baseline.json"
+
+
+def environment() -> dict:
+    """Describes the machine and code version results were measured on,
+    since timings are only comparable on the same setup.
+
+    Returns:
+        dict: JSON-serialisable description
+    """
+    try:
+        commit: str | None = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=get_base_dir(),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmark(
+    benchmark: Benchmark, n: int, seed: int, repeat: int, workdir: str
+) -> dict:
+    """Times one benchmark at one problem size.
+
+    Memory is measured on a separate, untimed call with tracemalloc,
+    which sees NumPy allocations but not those made inside Rust,
+    so the change in resident set size is recorded as well.
+
+    Args:
+        benchmark (Benchmark): Benchmark to run
+        n (int): Problem size
+        seed (int): Seed for the sampled inputs
+        repeat (int): Number of timed calls
+        workdir (str): Scratch directory for files the benchmark writes
+
+    Returns:
+        dict: Timings (s), throughput (items/s) and memory use (bytes)
+    """
+    function = benchmark.setup(n, seed, workdir)
+
+    times: list[float] = []
+    for _ in range(repeat):
+        gc.collect()
+        start: float = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    rss_before: int | None = current_rss_bytes()
+    tracemalloc.start()
+    result = function()
+    traced_peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss_after: int | None = current_rss_bytes()
+    del result
+
+    best: float = min(times)
+    return {
+        "name": benchmark.name,
+        "group": benchmark.group,
+        "n": n,
+        "budget_s": benchmark.budget_s,
+        "repeat": repeat,
+        "best_s": best,
+        "median_s": float(np.median(times)),
+        "throughput": n / best if best > 0 else None,
+        "traced_peak_bytes": traced_peak,
+        "rss_delta_bytes": (
+            rss_after - rss_before
+            if rss_before is not None and rss_after is not None
+            else None
+        ),
+    }
+
+
+def run_benchmarks(
+    sizes: list[int],
+    names: list[str] | None = None,
+    groups: list[str] | None = None,
+    seed: int = 1,
+    repeat: int = 3,
+    ignore_limits: bool = False,
+) -> dict:
+    """Runs the selected benchmarks at every requested problem size.
+
+    Args:
+        sizes (list[int]): Problem sizes (number of samples)
+        names (list[str] | None): Benchmarks to run. If None, all of them.
+        groups (list[str] | None): Groups to run. If None, all of them.
+        seed (int): Seed for the sampled inputs
+        repeat (int): Number of timed calls per benchmark and size
+        ignore_limits (bool): Also run sizes above each benchmark's max_n
+
+    Returns:
+        dict: JSON-serialisable results with the environment they ran in
+    """
+    selected: list[Benchmark] = [
+        benchmark
+        for benchmark in BENCHMARKS
+        if (names is None or benchmark.name in names)
+        and (groups is None or benchmark.group in groups)
+    ]
+    if not selected:
+        raise ValueError("No benchmarks match the given names and groups")
+
+    records: list[dict] = []
+    with tempfile.TemporaryDirectory() as workdir, graphs_redirected(workdir):
+        for benchmark in selected:
+            for n in benchmark.sizes(sizes, ignore_limits):
+                print(f"Running {benchmark.name} with N = {n:.0e}...")
+                record: dict = run_benchmark(benchmark, n, seed, repeat, workdir)
+                print(
+                    f"    best {record['best_s']:.4g} s, "
+                    f"traced peak {record['traced_peak_bytes'] / 1024**2:.1f} MiB"
+                )
+                records.append(record)
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "argv": sys.argv,
+        "environment": environment(),
+        "results": records,
+    }
+
+
+def save_results(results: dict, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.1) -> list[dict]:
+    """Compares results against a baseline, matching on benchmark and size.
+
+    Args:
+        results (dict): Results from run_benchmarks()
+        baseline (dict): Earlier results to compare against
+        threshold (float): Relative slowdown or memory growth counted
+            as a regression, e.g. 0.1 for 10%
+
+    Returns:
+        list[dict]: One row per benchmark and size present in both,
+            with the time and memory ratios and whether it regressed
+    """
+    baseline_records: dict[tuple[str, int], dict] = {
+        (record["name"], record["n"]): record for record in baseline["results"]
+    }
+
+    rows: list[dict] = []
+    for record in results["results"]:
+        old: dict | None = baseline_records.get((record["name"], record["n"]))
+        if old is None:
+            continue
+        time_ratio: float = record["best_s"] / old["best_s"]
+        memory_ratio: float | None = (
+            record["traced_peak_bytes"] / old["traced_peak_bytes"]
+            if old["traced_peak_bytes"] > 0
+            else None
+        )
+        rows.append(
+            {
+                "name": record["name"],
+                "n": record["n"],
+                "time_ratio": time_ratio,
+                "memory_ratio": memory_ratio,
+                "regressed": time_ratio > 1 + threshold
+                or (memory_ratio is not None and memory_ratio > 1 + threshold),
+            }
+        )
+    return rows
+
+
+def over_budget(results: dict) -> list[dict]:
+    """Returns the results of benchmarks slower than their time budget.
+
+    Args:
+        results (dict): Results from run_benchmarks()
+
+    Returns:
+        list[dict]: Records whose best time exceeds their budget
+    """
+    return [
+        record
+        for record in results["results"]
+        if record.get("budget_s") is not None and record["best_s"] > record["budget_s"]
+    ]
+
+
+def print_comparison(rows: list[dict]) -> None:
+    print(f"{'Benchmark':<28}{'N':>10}{'Time':>10}{'Memory':>10}")
+    for row in rows:
+        memory: str = (
+            "-" if row["memory_ratio"] is None else f"{row['memory_ratio']:.2f}x"
+        )
+        flag: str = "  REGRESSION" if row["regressed"] else ""
+        print(
+            f"{row['name']:<28}{row['n']:>10.0e}{row['time_ratio']:>9.2f}x"
+            f"{memory:>10}{flag}"
+        )
+
+
+def main(
+    sizes: list[int] | None = None,
+    names: list[str] | None = None,
+    groups: list[str] | None = None,
+    seed: int = 1,
+    repeat: int = 3,
+    ignore_limits: bool = False,
+    baseline_path: str | None = None,
+    save_baseline: bool = False,
+    threshold: float = 0.1,
+) -> bool:
+    """Runs the benchmarks, saves the results to output/benchmarks
+    and compares them against the baseline if there is one.
+
+    Args:
+        sizes (list[int] | None): Problem sizes (number of samples).
+            If None, DEFAULT_SIZES.
+        names (list[str] | None): Benchmarks to run. If None, all of them.
+        groups (list[str] | None): Groups to run. If None, all of them.
+        seed (int): Seed for the sampled inputs
+        repeat (int): Number of timed calls per benchmark and size
+        ignore_limits (bool): Also run sizes above each benchmark's max_n
+        baseline_path (str | None): Baseline to compare against or save to.
+            If None, output/benchmarks/baseline.json.
+        save_baseline (bool): Save these results as the new baseline
+            instead of comparing against the old one
+        threshold (float): Relative slowdown counted as a regression
+
+    Returns:
+        bool: Whether any benchmark regressed or went over its time budget
+    """
+    sizes = list(DEFAULT_SIZES) if sizes is None else sizes
+    baseline_path = baseline_path or default_baseline_path()
+    results: dict = run_benchmarks(sizes, names, groups, seed, repeat, ignore_limits)
+
+    results_path: str = f"{benchmark_dir()}/{time.strftime('%Y%m%d-%H%M%S')}.json"
+    save_results(results, results_path)
+    print(f"Results written to {results_path}")
+
+    over: list[dict] = over_budget(results)
+    for record in over:
+        print(
+            f"OVER BUDGET: {record['name']} took {record['best_s']:.3g} s "
+            f"(budget {record['budget_s']:.3g} s)"
+        )
+
+    if save_baseline:
+        save_results(results, baseline_path)
+        print(f"Baseline written to {baseline_path}")
+        return bool(over)
+
+    if not os.path.isfile(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --save-baseline to make one")
+        return bool(over)
+
+    baseline: dict = load_results(baseline_path)
+    if baseline["environment"].get("platform") != results["environment"]["platform"]:
+        print("Warning: the baseline was measured on a different platform")
+    rows: list[dict] = compare(results, baseline, threshold)
+    print(f"\nCompared with {baseline_path} (threshold {threshold:.0%}):")
+    print_comparison(rows)
+    regressed: int = sum(row["regressed"] for row in rows)
+    print(f"{regressed} of {len(rows)} benchmarks regressed")
+    return regressed > 0 or bool(over)
@@ -0,0 +1,192 @@
+import numba
+import numpy as np
+
+from capture.velocities import VelocityEllipsoid
+from disk_calcs.disk import DiskCalcs
+from interaction_times.collision_times import disk_focusing_terms
+from rock_calcs.conversions import (
+    LIFETIME_PER_RADIUS_SQUARED,
+    RADIUS_CUBED_PER_MASS,
+    SECONDS_IN_MYR,
+)
+from rust import stream_rock_masses
+from streaming.stats import SummaryStatistics
+
+# Quantities summarised for every draw
+CAPTURE_QUANTITIES: tuple[str, ...] = (
+    "relative_speed",
+    "capture_rate_side",
+    "capture_rate_top",
+    "capture_probability_side",
+    "capture_probability_top",
+)
+
+# Mixed into the run seed, so the capture draws get streams of their own
+CAPTURE_SEED_KEY: int = 1
+
+
+@numba.njit(parallel=True, cache=True)
+def _capture_draws(
+    normals: np.ndarray,
+    dispersion: np.ndarray,
+    mean: np.ndarray,
+    star: np.ndarray,
+    rock_masses: np.ndarray,
+    v_esc_sq: np.ndarray,
+    csa_sideview: np.ndarray,
+    csa_topview: np.ndarray,
+    n_o: float,
+    n_star: float,
+    speed: np.ndarray,
+    rate_side: np.ndarray,
+    rate_top: np.ndarray,
+    probability_side: np.ndarray,
+    probability_top: np.ndarray,
+) -> None:
+    # One pass per draw: relative speed, focused capture rates of the
+    # star's disk, and the chance that the rock is captured by a disk
+    # like it within its lifetime
+    for i in numba.prange(rock_masses.size):
+        vx: float = normals[i, 0] * dispersion[0] + mean[0]
+        vy: float = normals[i, 1] * dispersion[1] + mean[1]
+        vz: float = normals[i, 2] * dispersion[2] + mean[2]
+        v: float = np.sqrt(vx * vx + vy * vy + vz * vz)
+        s: int = star[i]
+        # v * (1 + v_esc^2 / v^2), as in t_coll_disk
+        focused_speed: float = v + v_esc_sq[s] / v
+        radius: float = np.cbrt(RADIUS_CUBED_PER_MASS * rock_masses[i])
+        lifetime: float = LIFETIME_PER_RADIUS_SQUARED * radius * radius
+        # Stars met over the rock's lifetime, per unit of cross section
+        sweep: float = n_star * focused_speed * lifetime
+        speed[i] = v
+        rate_side[i] = n_o * focused_speed * csa_sideview[s]
+        rate_top[i] = n_o * focused_speed * csa_topview[s]
+        probability_side[i] = -np.expm1(-sweep * csa_sideview[s])
+        probability_top[i] = -np.expm1(-sweep * csa_topview[s])
+
+
+def capture_distributions(
+    stellar_mass: np.ndarray,
+    disk: DiskCalcs,
+    velocities: VelocityEllipsoid,
+    n_o: float,
+    n_star: float,
+    n: int,
+    chunk_size: int = 1 << 20,
+    seed: int | None = None,
+    threads: int | None = None,
+    stellar_weights: np.ndarray | None = None,
+    strategy: str = "random",
+) -> dict[str, SummaryStatistics]:
+    """Draws n rock-star encounters and summarises their capture rates.
+
+    Each draw pairs a rock from the Rust rock sampler with a star of the
+    sample and a relative velocity from `velocities`. The capture rate
+    is the rate at which rocks like it hit the star's disk,
+    n_o * C * v with C the focused cross section. The capture
+    probability is the chance that the rock itself hits a disk like it
+    within its lifetime, passing through stars of number density n_star:
+    1 - exp(-n_star * C * v * lifetime).
+
+    Draws are made in chunks, through fixed buffers, and folded into
+    streaming summaries, so memory use does not grow with n and 10^8
+    draws or more fit on one machine.
+
+    Args:
+        stellar_mass (np.ndarray): Stellar mass array (SI)
+        disk (DiskCalcs): Disk object of the same stars
+        velocities (VelocityEllipsoid): Distribution of relative velocities
+        n_o (float): Number density of rocks (SI)
+        n_star (float): Number density of stars (SI)
+        n (int): Number of draws
+        chunk_size (int): Number of draws per chunk
+        seed (int | None): Seed of the run. The rocks, stars and velocities
+            are drawn from seeds derived from it, so the rocks differ from
+            the run's rock sample and the draws from other stages' streams.
+        threads (int | None): Number of threads for the Rust rock sampler
+        stellar_weights (np.ndarray | None): Importance weight of each star.
+            Stars are then picked in proportion to their weights.
+        strategy (str): Sampling strategy of the rocks (see sampling.STRATEGIES)
+
+    Returns:
+        dict[str, SummaryStatistics]: Summaries keyed by CAPTURE_QUANTITIES,
+            speeds in km/s and rates in Myr^-1
+    """
+    v_esc_sq, csa_sideview, csa_topview = disk_focusing_terms(disk, stellar_mass)
+    cumulative_weights: np.ndarray | None = None
+    if stellar_weights is not None:
+        cumulative_weights = np.cumsum(stellar_weights)
+
+    seeds = np.random.SeedSequence(None if seed is None else [seed, CAPTURE_SEED_KEY])
+    rock_seeds, draw_seeds = seeds.spawn(2)
+    rng: np.random.Generator = np.random.default_rng(draw_seeds)
+    rock_seed: int = int(rock_seeds.generate_state(1, np.uint64)[0])
+    rocks = stream_rock_masses(n, chunk_size, rock_seed, threads, strategy)
+    normals: np.ndarray = np.empty((rocks.chunk_size, 3))
+    outputs: dict[str, np.ndarray] = {
+        name: np.empty(rocks.chunk_size) for name in CAPTURE_QUANTITIES
+    }
+    # Converts each quantity to the units it is summarised in
+    scales: dict[str, float] = {
+        "relative_speed": 1e-3,
+        "capture_rate_side": SECONDS_IN_MYR,
+        "capture_rate_top": SECONDS_IN_MYR,
+    }
+    summaries: dict[str, SummaryStatistics] = {
+        name: SummaryStatistics() for name in CAPTURE_QUANTITIES
+    }
+
+    print(f"Drawing {n} rock-star encounters in {len(rocks)} chunks...")
+    for rock_masses in rocks:
+        size: int = len(rock_masses)
+        rng.standard_normal(out=normals[:size])
+        if cumulative_weights is None:
+            star: np.ndarray = rng.integers(0, len(stellar_mass), size)
+        else:
+            star = np.searchsorted(
+                cumulative_weights, rng.random(size) * cumulative_weights[-1]
+            )
+        chunk: dict[str, np.ndarray] = {
+            name: values[:size] for name, values in outputs.items()
+        }
+        _capture_draws(
+            normals[:size],
+            velocities.dispersion,
+            velocities.mean,
+            star,
+            rock_masses,
+            v_esc_sq,
+            csa_sideview,
+            csa_topview,
+            n_o,
+            n_star,
+            *chunk.values(),
+        )
+        for name, values in chunk.items():
+            if name in scales:
+                values *= scales[name]
+            summaries[name].update(values)
+    return summaries
+
+
+def sketch_histogram(
+    summary: SummaryStatistics, buckets_per_bin: int = 20
+) -> tuple[np.ndarray, np.ndarray]:
+    """Turns the quantile sketch of a summary into a histogram, by merging
+    its log-spaced buckets. Values of zero are left out.
+
+    Args:
+        summary (SummaryStatistics): Summary of a quantity
+        buckets_per_bin (int): Number of sketch buckets per histogram bin
+
+    Returns:
+        np.ndarray: Bin edges
+        np.ndarray: Number of draws in each bin
+    """
+    sketch = summary.sketch
+    bins: int = -(-sketch.counts.size // buckets_per_bin)
+    counts: np.ndarray = np.zeros(bins * buckets_per_bin)
+    counts[: sketch.counts.size] = sketch.counts
+    # Bucket k of the sketch holds the values in (gamma^(k-1), gamma^k]
+    keys: np.ndarray = sketch.offset - 1 + buckets_per_bin * np.arange(bins + 1)
+    return sketch.gamma**keys, counts.reshape(bins, buckets_per_bin).sum(axis=1)
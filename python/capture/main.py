@@ -0,0 +1,83 @@
+import numpy as np
+import constants
+from capture.engine import capture_distributions, sketch_histogram
+from capture.plot import plot_capture_distributions
+from capture.velocities import VelocityEllipsoid
+from disk_calcs.disk import DiskCalcs
+from interaction_times.main import N_O
+from neighbourhood.field import LOCAL_STELLAR_DENSITY
+from rendering import Renderer
+from run_store import RunStore, save_values
+from streaming.stats import SummaryStatistics
+
+# Label and units of each summarised quantity
+CAPTURE_LABELS: dict[str, str] = {
+    "relative_speed": "Relative speed (km/s)",
+    "capture_rate_side": "Capture rate, side (Myr^-1)",
+    "capture_rate_top": "Capture rate, top (Myr^-1)",
+    "capture_probability_side": "Capture probability, side",
+    "capture_probability_top": "Capture probability, top",
+}
+CAPTURE_UNITS: dict[str, str] = {
+    "relative_speed": "km/s",
+    "capture_rate_side": "Myr^-1",
+    "capture_rate_top": "Myr^-1",
+    "capture_probability_side": "",
+    "capture_probability_top": "",
+}
+
+
+def main(
+    stellar_mass: np.ndarray,
+    velocities: VelocityEllipsoid,
+    draws: int,
+    chunk_size: int = 1 << 20,
+    seed: int | None = None,
+    threads: int | None = None,
+    store: RunStore | None = None,
+    disk: DiskCalcs | None = None,
+    renderer: Renderer | None = None,
+    weights: np.ndarray | None = None,
+    strategy: str = "random",
+    stellar_density: float = LOCAL_STELLAR_DENSITY,
+) -> dict[str, SummaryStatistics]:
+    renderer = renderer or Renderer("serial")
+    if disk is None:
+        disk = DiskCalcs(stellar_mass)
+
+    print(f"Sampling capture rates with {velocities}...")
+    summaries: dict[str, SummaryStatistics] = capture_distributions(
+        stellar_mass,
+        disk,
+        velocities,
+        N_O,
+        stellar_density / constants.PC**3,
+        draws,
+        chunk_size,
+        seed,
+        threads,
+        weights,
+        strategy,
+    )
+
+    histograms: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+    for name, summary in summaries.items():
+        print(summary.format(CAPTURE_LABELS[name]))
+        histograms[name] = sketch_histogram(summary)
+        edges, counts = histograms[name]
+        save_values(f"{name}_edges", edges, CAPTURE_UNITS[name], store)
+        save_values(f"{name}_counts", counts, "", store)
+
+    if renderer.enabled:
+        print("Plotting capture distributions...")
+        for quantity, xlabel in (
+            ("capture_rate", "Capture rate (Myr^-1)"),
+            ("capture_probability", "Capture probability over rock lifetime"),
+        ):
+            renderer.submit(
+                plot_capture_distributions,
+                {view: histograms[f"{quantity}_{view}"] for view in ("side", "top")},
+                xlabel,
+                f"{quantity}_distribution",
+            )
+    return summaries
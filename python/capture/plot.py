@@ -0,0 +1,30 @@
+import numpy as np
+from helpers import get_base_dir, lazy_import
+
+plt = lazy_import("matplotlib.pyplot")
+
+
+def plot_capture_distributions(
+    histograms: dict[str, tuple[np.ndarray, np.ndarray]],
+    xlabel: str,
+    filename: str,
+) -> None:
+    """Plots the distributions of one capture quantity, side-on and top-down,
+    as the fraction of draws in each log-spaced bin.
+
+    Args:
+        histograms (dict[str, tuple[np.ndarray, np.ndarray]]): Bin edges and
+            counts, keyed by the label of each line
+        xlabel (str): Label of the x axis
+        filename (str): Name of the saved graph, without extension
+    """
+    plt.figure()
+    for label, (edges, counts) in histograms.items():
+        plt.stairs(counts / max(np.sum(counts), 1), edges, label=label)
+    plt.xscale("log")
+    plt.yscale("log")
+    plt.xlabel(xlabel)
+    plt.ylabel("Fraction of draws")
+    plt.legend()
+    plt.savefig(f"{get_base_dir()}/output/graphs/{filename}.png")
+    plt.close()
@@ -0,0 +1,69 @@
+import numpy as np
+
+VELOCITY_KINDS: tuple[str, ...] = ("maxwellian", "ellipsoid")
+
+# Dispersions of the relative velocity along (U, V, W), radial, rotational
+# and vertical (km/s), roughly those of thin-disk stars
+ELLIPSOID_DISPERSION: tuple[float, float, float] = (35.0, 25.0, 20.0)
+
+
+class VelocityEllipsoid:
+    """Distribution of rock velocities relative to the star they meet.
+
+    Each component of the relative velocity is normal, with its own
+    dispersion and mean, so the distribution is a velocity ellipsoid.
+    Equal dispersions and no mean give a Maxwellian distribution of
+    speeds (see maxwellian).
+
+    Args:
+        dispersion (tuple[float, float, float]): Dispersion of each
+            component (SI)
+        mean (tuple[float, float, float]): Mean of each component (SI),
+            e.g. the Sun's motion relative to the rocks
+    """
+
+    def __init__(
+        self,
+        dispersion: tuple[float, float, float],
+        mean: tuple[float, float, float] = (0.0, 0.0, 0.0),
+    ) -> None:
+        self.dispersion: np.ndarray = np.asarray(dispersion, dtype=np.float64)
+        self.mean: np.ndarray = np.asarray(mean, dtype=np.float64)
+        if self.dispersion.shape != (3,) or self.mean.shape != (3,):
+            raise ValueError("dispersion and mean need one value per component")
+        if np.any(self.dispersion < 0):
+            raise ValueError("dispersion must not be negative")
+
+    @classmethod
+    def maxwellian(cls, mean_speed: float) -> "VelocityEllipsoid":
+        """Isotropic distribution whose speeds follow a Maxwellian with the
+        given mean, whose dispersion is mean_speed * sqrt(pi / 8).
+
+        Args:
+            mean_speed (float): Mean relative speed (SI)
+
+        Returns:
+            VelocityEllipsoid: The distribution
+        """
+        sigma: float = mean_speed * np.sqrt(np.pi / 8)
+        return cls((sigma, sigma, sigma))
+
+    def mean_speed(self, draws: int = 1_000_000, seed: int = 0) -> float:
+        """Estimates the mean relative speed by sampling.
+
+        Args:
+            draws (int): Number of velocities to draw
+            seed (int): Seed for the draws
+
+        Returns:
+            float: Mean speed (SI)
+        """
+        normals: np.ndarray = np.random.default_rng(seed).standard_normal((draws, 3))
+        return float(
+            np.mean(np.linalg.norm(normals * self.dispersion + self.mean, axis=1))
+        )
+
+    def __repr__(self) -> str:
+        dispersion: str = ", ".join(f"{v / 1e3:g}" for v in self.dispersion)
+        mean: str = ", ".join(f"{v / 1e3:g}" for v in self.mean)
+        return f"VelocityEllipsoid(dispersion=({dispersion}) km/s, mean=({mean}) km/s)"
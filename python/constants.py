@@ -0,0 +1,24 @@
+"""Physical constants in SI units.
+
+These are the values astropy.constants gives (IAU 2015 and CODATA 2018,
+as in the pinned astropy version), copied here so that the stages do not
+pay for importing astropy at startup.
+"""
+
+# Nominal solar mass (kg), IAU 2015 Resolution B3 with CODATA 2018 G
+M_SUN: float = 1.988409870698051e30
+
+# Astronomical unit (m), IAU 2012 Resolution B2
+AU: float = 149597870700.0
+
+# Parsec (m), derived from the astronomical unit
+PC: float = 3.085677581491367e16
+
+# Nominal equatorial Earth radius (m), IAU 2015 Resolution B3
+R_EARTH: float = 6378100.0
+
+# Nominal Earth mass (kg), IAU 2015 Resolution B3 with CODATA 2018 G
+M_EARTH: float = 5.972167867791379e24
+
+# Gravitational constant (m^3 kg^-1 s^-2), CODATA 2018
+G: float = 6.6743e-11
@@ -1,7 +1,12 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import astropy.constants as astro_const
-from helpers import get_base_dir
+import constants
+from disk_calcs import plot
+from rendering import Renderer, downsample_sorted
+from run_store import RunStore, save_values
+
+
+AU_TO_M: float = constants.AU
+M_SUN: float = constants.M_SUN
 
 
 class DiskCalcs:
@@ -11,28 +16,111 @@ class DiskCalcs:
     It takes in a stellar mass and calculates the radius, reduced radius,
     volume, mass, dust mass, and density of the disk.
 
-    Run the run() method to plot dust mass vs disk density."""
-
-    def __init__(self, stellar_mass: np.ndarray):
-        print("Calculating disk values...")
+    Run the run() method to plot dust mass vs disk density.
+
+    disk_height (in AU) and radius_reduction (the factor the disk radius
+    is divided by to get the reduced radius) can be changed for
+    sensitivity studies.
+
+    Every disk property is computed the first time it is used and then
+    kept, so one DiskCalcs can be shared between stages without repeating
+    any work. The find_* methods take an optional `out` array to write
+    into, so each property costs one allocation and no temporaries."""
+
+    __slots__ = (
+        "stellar_mass",
+        "disk_height",
+        "radius_reduction",
+        "_disk_mass",
+        "_dust_mass",
+        "_radius",
+        "_reduced_radius",
+        "_volume",
+        "_density",
+        "_csa_sideview",
+        "_csa_topview",
+    )
+
+    def __init__(
+        self,
+        stellar_mass: np.ndarray,
+        verbose: bool = True,
+        disk_height: float = 0.1,
+        radius_reduction: float = 1,
+    ):
+        if verbose:
+            print("Calculating disk values...")
+        self.disk_height: float = disk_height  # AU
+        self.radius_reduction: float = radius_reduction
         self.stellar_mass: np.ndarray = stellar_mass
-        self.disk_mass: np.ndarray = self.find_mass(stellar_mass)  # Disk mass
-        self.radius: np.ndarray = self.find_radius(stellar_mass)  # Disk radius
-        self.reduced_radius: np.ndarray = self.reduce_radius(
-            self.radius
-        )  # Reduced disk radius
-        self.volume: np.ndarray = self.find_volume_slab_geometry(
-            self.reduced_radius
-        )  # Disk volume
-        self.density: np.ndarray = self.find_density(
-            self.volume, stellar_mass
-        )  # Disk density
-        self.csa_sideview = self.find_csa_sideview(
-            self.reduced_radius
-        )  # Cross sectional area of disk from side view
-        self.csa_topview = self.find_csa_topview(
-            self.reduced_radius
-        )  # Cross sectional area of disk from top view
+        self._disk_mass: np.ndarray | None = None  # Disk mass
+        self._dust_mass: np.ndarray | None = None  # Dust mass
+        self._radius: np.ndarray | None = None  # Disk radius
+        self._reduced_radius: np.ndarray | None = None  # Reduced disk radius
+        self._volume: np.ndarray | None = None  # Disk volume
+        self._density: np.ndarray | None = None  # Disk density
+        # Cross sectional area of disk from side view
+        self._csa_sideview: np.ndarray | None = None
+        # Cross sectional area of disk from top view
+        self._csa_topview: np.ndarray | None = None
+
+    @property
+    def disk_mass(self) -> np.ndarray:
+        if self._disk_mass is None:
+            self._disk_mass = self.find_mass(self.stellar_mass, out=self._new())
+        return self._disk_mass
+
+    @property
+    def dust_mass(self) -> np.ndarray:
+        if self._dust_mass is None:
+            self._dust_mass = self.find_dust_mass(self.stellar_mass, out=self._new())
+        return self._dust_mass
+
+    @property
+    def radius(self) -> np.ndarray:
+        if self._radius is None:
+            self._radius = self.find_radius(self.stellar_mass, out=self._new())
+        return self._radius
+
+    @property
+    def reduced_radius(self) -> np.ndarray:
+        if self._reduced_radius is None:
+            self._reduced_radius = self.reduce_radius(self.radius)
+        return self._reduced_radius
+
+    @property
+    def volume(self) -> np.ndarray:
+        if self._volume is None:
+            self._volume = self.find_volume_slab_geometry(
+                self.reduced_radius, out=self._new()
+            )
+        return self._volume
+
+    @property
+    def density(self) -> np.ndarray:
+        if self._density is None:
+            # Reuses the dust mass instead of recomputing it
+            self._density = np.divide(self.dust_mass, self.volume, out=self._new())
+        return self._density
+
+    @property
+    def csa_sideview(self) -> np.ndarray:
+        if self._csa_sideview is None:
+            self._csa_sideview = self.find_csa_sideview(
+                self.reduced_radius, out=self._new()
+            )
+        return self._csa_sideview
+
+    @property
+    def csa_topview(self) -> np.ndarray:
+        if self._csa_topview is None:
+            self._csa_topview = self.find_csa_topview(
+                self.reduced_radius, out=self._new()
+            )
+        return self._csa_topview
+
+    def _new(self) -> np.ndarray:
+        return np.empty(np.shape(self.stellar_mass), dtype=np.float64)
 
     def get_radius(self) -> np.ndarray:
         return self.radius
@@ -49,36 +137,53 @@ class DiskCalcs:
     def get_csa_topview(self) -> np.ndarray:
         return self.csa_topview
 
-    def find_radius(self, stellar_mass: np.ndarray) -> np.ndarray:
+    def find_radius(
+        self, stellar_mass: np.ndarray, out: np.ndarray | None = None
+    ) -> np.ndarray:
         # This function is based on Equation 13
         # from https://doi.org/10.1093/mnras/stac1513
-
-        au_to_m: float = astro_const.au.value
-        m_sun: float = astro_const.M_sun.value
-        return 200 * au_to_m * (stellar_mass / m_sun) ** (0.3)
+        out = np.divide(stellar_mass, M_SUN, out=out)
+        np.power(out, 0.3, out=out)
+        out *= 200 * AU_TO_M
+        return out
 
     def reduce_radius(self, disk_radius: np.ndarray) -> np.ndarray:
-        return disk_radius / 1
-
-    def find_volume_slab_geometry(self, disk_radius: np.ndarray) -> np.ndarray:
-        au_to_m: float = astro_const.au.value
-        disk_height: float = 0.1 * 1 * au_to_m
-        circumference: float = 2 * np.pi * disk_radius
-        return disk_radius * disk_height * circumference
+        if self.radius_reduction == 1:
+            return disk_radius  # Nothing to reduce, so share the array
+        return disk_radius / self.radius_reduction
 
-    def find_csa_sideview(self, disk_radius: np.ndarray) -> np.ndarray:
-        au_to_m: float = astro_const.au.value
-        disk_height: float = 0.1 * au_to_m
-        return disk_radius * disk_height
+    def find_volume_slab_geometry(
+        self, disk_radius: np.ndarray, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        # radius * height * circumference = 2 * pi * height * radius^2
+        disk_height: float = self.disk_height * AU_TO_M
+        out = np.square(disk_radius, out=out)
+        out *= 2 * np.pi * disk_height
+        return out
+
+    def find_csa_sideview(
+        self, disk_radius: np.ndarray, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        disk_height: float = self.disk_height * AU_TO_M
+        return np.multiply(disk_radius, disk_height, out=out)
 
-    def find_csa_topview(self, disk_radius: np.ndarray) -> np.ndarray:
-        return np.pi * disk_radius**2
+    def find_csa_topview(
+        self, disk_radius: np.ndarray, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        out = np.square(disk_radius, out=out)
+        out *= np.pi
+        return out
 
-    def find_mass(self, stellar_mass: np.ndarray) -> np.ndarray:
-        return 0.1 * stellar_mass
+    def find_mass(
+        self, stellar_mass: np.ndarray, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        return np.multiply(stellar_mass, 0.1, out=out)
 
-    def find_dust_mass(self, stellar_mass: np.ndarray) -> np.ndarray:
-        return 0.01 * self.find_mass(stellar_mass)
+    def find_dust_mass(
+        self, stellar_mass: np.ndarray, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        # 1% of the disk mass
+        return np.multiply(stellar_mass, 0.1 * 0.01, out=out)
 
     def find_density(
         self, disk_volume: np.ndarray, stellar_mass: np.ndarray
@@ -92,28 +197,24 @@ class DiskCalcs:
         self, dust_mass: np.ndarray, disk_density: np.ndarray
     ) -> None:
         print("Plotting dust mass vs disk density...")
-        dust_mass = np.sort(dust_mass)  # SI units
-        disk_density = np.sort(disk_density)  # SI units
-
-        plt.figure()
-        plt.plot(disk_density * 1000 / 100**3, dust_mass / astro_const.M_sun.value)
-        plt.ylabel("Dust Mass (M$_\\odot$)")
-        plt.xlabel("Disk Density (g/cm$^3$)")
-        plt.title("Dust Mass vs Disk Density for Slab Volume Geometry")
-        plt.savefig(f"{get_base_dir()}/output/graphs/dust_mass_vs_disk_density.png")
-        # plt.savefig(f"{get_base_dir()}/output/graphs/dust_mass_vs_disk_density.pgf")
-        plt.close()
-
-    def save_disk_density(self, disk_density: np.ndarray) -> None:
-        print("Saving disk density values...")
-        np.save(
-            f"{get_base_dir()}/output/values/disk_density.npy",
-            disk_density,
-        )
+        plot.plot_dust_mass_vs_disk_density(dust_mass, disk_density)
 
-    def run(self) -> None:
-        self.plot_dust_mass_vs_disk_density(
-            self.find_dust_mass(self.stellar_mass), self.density
-        )
+    def save_disk_density(
+        self, disk_density: np.ndarray, store: RunStore | None = None
+    ) -> None:
+        print("Saving disk density values...")
+        save_values("disk_density", disk_density, "kg m^-3", store)
 
-        self.save_disk_density(self.density)
+    def run(
+        self, store: RunStore | None = None, renderer: Renderer | None = None
+    ) -> None:
+        renderer = renderer or Renderer("serial")
+        if renderer.enabled:
+            print("Plotting dust mass vs disk density...")
+            renderer.submit(
+                plot.plot_dust_mass_vs_disk_density,
+                downsample_sorted(self.dust_mass),
+                downsample_sorted(self.density),
+            )
+
+        self.save_disk_density(self.density, store)
@@ -1,9 +1,20 @@
 import numpy as np
 from disk_calcs.disk import DiskCalcs
-from disk_calcs.plot import plot_disk_radii_dist
+from disk_calcs.plot import disk_radii_histogram, plot_disk_radii_counts
+from rendering import Renderer
+from run_store import RunStore
 
 
-def main(stellar_mass: np.ndarray) -> None:
-    disk_set = DiskCalcs(stellar_mass)
-    disk_set.run()
-    plot_disk_radii_dist(disk_set.get_reduced_radius())
+def main(
+    stellar_mass: np.ndarray,
+    store: RunStore | None = None,
+    disk_set: DiskCalcs | None = None,
+    renderer: Renderer | None = None,
+) -> None:
+    renderer = renderer or Renderer("serial")
+    if disk_set is None:
+        disk_set = DiskCalcs(stellar_mass)
+    disk_set.run(store, renderer)
+    if renderer.enabled:
+        bins, counts = disk_radii_histogram(disk_set.get_reduced_radius())
+        renderer.submit(plot_disk_radii_counts, bins, counts)
@@ -1,14 +1,66 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import constants
+from helpers import get_base_dir, lazy_import
+
+plt = lazy_import("matplotlib.pyplot")
+
+
+def disk_radii_histogram(disk_radii: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Bins disk radii into 75 equal-width bins spanning the radii
+
+    Args:
+        disk_radii (np.ndarray): Disk radii array (SI)
+
+    Returns:
+        np.ndarray: Bin edges (m)
+        np.ndarray: Number of disks in each bin
+    """
+    counts, bins = np.histogram(disk_radii, bins=75)
+    return bins, counts
 
 
 def plot_disk_radii_dist(disk_radii: np.ndarray) -> None:
+    bins, counts = disk_radii_histogram(disk_radii)
+    plot_disk_radii_counts(bins, counts)
+
+
+def plot_disk_radii_counts(bins: np.ndarray, counts: np.ndarray) -> None:
+    """Plots the disk radii histogram from counts that have already been binned
+
+    Args:
+        bins (np.ndarray): Bin edges (m)
+        counts (np.ndarray): Number of disks in each bin
+    """
     plt.figure()
-    plt.hist(disk_radii, bins=75)
+    plt.hist(bins[:-1], bins=bins, weights=counts)
     plt.yscale("log")
     plt.xscale("log")
-    plt.xlim(np.min(disk_radii), np.max(disk_radii))
+    plt.xlim(bins[0], bins[-1])
     plt.xlabel("Disk radii (m)")
     plt.ylabel("Frequency")
     plt.savefig("output/graphs/disk_radii_histogram.png")
     plt.close()
+
+
+def plot_dust_mass_vs_disk_density(
+    dust_mass: np.ndarray, disk_density: np.ndarray
+) -> None:
+    """Plots dust mass against disk density.
+    Both are sorted, so the inputs may be downsampled with
+    rendering.downsample_sorted beforehand.
+
+    Args:
+        dust_mass (np.ndarray): Dust mass array (SI)
+        disk_density (np.ndarray): Disk density array (SI)
+    """
+    dust_mass = np.sort(dust_mass)  # SI units
+    disk_density = np.sort(disk_density)  # SI units
+
+    plt.figure()
+    plt.plot(disk_density * 1000 / 100**3, dust_mass / constants.M_SUN)
+    plt.ylabel("Dust Mass (M$_\\odot$)")
+    plt.xlabel("Disk Density (g/cm$^3$)")
+    plt.title("Dust Mass vs Disk Density for Slab Volume Geometry")
+    plt.savefig(f"{get_base_dir()}/output/graphs/dust_mass_vs_disk_density.png")
+    # plt.savefig(f"{get_base_dir()}/output/graphs/dust_mass_vs_disk_density.pgf")
+    plt.close()
@@ -0,0 +1,85 @@
+import argparse
+
+import ensembles.main as ensembles
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run an ensemble of independent realizations of the pipeline "
+        "and merge their summary statistics"
+    )
+    parser.add_argument(
+        "name", help="Name of the ensemble, its directory in output/ensembles"
+    )
+    parser.add_argument(
+        "--realizations",
+        type=int,
+        default=None,
+        help="Number of realizations (default: 100, or that of an existing ensemble)",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=None,
+        help="Number of stars and rocks to sample in each realization "
+        "(default: 100000, or that of an existing ensemble)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Number of samples per chunk (default: 1048576)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed of the ensemble, from which every realization's seed is derived "
+        "(default: random, or that of an existing ensemble)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of realizations run at once on this host",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of Rust sampler threads per realization "
+        "(default: the cores split between the workers)",
+    )
+    parser.add_argument(
+        "--store",
+        action="store_true",
+        help="Save every realization's values to a run store in its directory",
+    )
+    parser.add_argument(
+        "--merge-only",
+        action="store_true",
+        help="Only merge the realizations that have finished",
+    )
+    parser.add_argument(
+        "--reclaim",
+        action="store_true",
+        help="Rerun realizations claimed by hosts that stopped without finishing",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    ensembles.main(
+        args.name,
+        args.realizations,
+        args.runs,
+        args.chunk_size,
+        args.seed,
+        args.workers,
+        args.threads,
+        args.store,
+        args.merge_only,
+        args.reclaim,
+    )
@@ -0,0 +1,435 @@
+import contextlib
+import json
+import os
+import socket
+import time
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+import streaming.main as streaming
+from helpers import get_base_dir
+from rendering import Renderer
+from run_store import RunStore
+from streaming.stats import RunningStats, StreamSummary
+
+MANIFEST: str = "ensemble.json"
+RESULTS: str = "results.json"
+SUMMARY: str = "summary.json"
+CLAIM: str = "claim"
+LOG: str = "log.txt"
+
+# Statistics of each realization whose spread across the ensemble is reported
+SPREAD_STATISTICS: tuple[str, ...] = ("mean", "std", "min", "25%", "50%", "75%", "max")
+
+# Parameters of a new ensemble that are not given
+DEFAULT_CONFIG: dict = {"realizations": 100, "runs": 100_000, "chunk_size": 1 << 20}
+
+
+def ensemble_dir(name: str) -> str:
+    return f"{get_base_dir()}/output/ensembles/{name}"
+
+
+def realization_dir(directory: str, index: int) -> str:
+    return f"{directory}/realization_{index:05d}"
+
+
+def realization_seed(seed: int, index: int) -> int:
+    """Derives the seed of one realization from the seed of the ensemble.
+
+    Seeds come from a NumPy SeedSequence keyed on (seed, index), so they
+    are the same whichever host or worker runs the realization, and the
+    streams of different realizations are statistically independent.
+
+    Args:
+        seed (int): Seed of the ensemble
+        index (int): Index of the realization
+
+    Returns:
+        int: Seed for the Rust samplers (fits in a u64)
+    """
+    return int(np.random.SeedSequence([seed, index]).generate_state(1, np.uint64)[0])
+
+
+def create_or_join(directory: str, config: dict) -> dict:
+    """Creates the manifest of an ensemble, or checks that an existing one
+    (made by another host on the shared filesystem) matches `config`.
+
+    Args:
+        directory (str): Directory of the ensemble
+        config (dict): Parameters of the ensemble. Parameters that are None
+            are taken from an existing ensemble, or from DEFAULT_CONFIG
+            (a fresh random seed for the seed) for a new one.
+
+    Returns:
+        dict: Parameters of the ensemble, as recorded in the manifest
+    """
+    os.makedirs(directory, exist_ok=True)
+    path: str = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        manifest: dict = dict(DEFAULT_CONFIG)
+        manifest.update(
+            (key, value) for key, value in config.items() if value is not None
+        )
+        if manifest.get("seed") is None:
+            manifest["seed"] = int(np.random.SeedSequence().generate_state(1)[0])
+        manifest["created"] = time.time()
+        partial: str = f"{path}.{socket.gethostname()}.{os.getpid()}"
+        with open(partial, "w") as file:
+            json.dump(manifest, file, indent=2)
+        try:
+            # Linking fails if another host created the manifest first
+            os.link(partial, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(partial)
+
+    with open(path) as file:
+        manifest = json.load(file)
+    for key, value in config.items():
+        if value is not None and manifest[key] != value:
+            raise ValueError(
+                f"Ensemble {directory} was created with {key}={manifest[key]}, "
+                f"not {value}"
+            )
+    return manifest
+
+
+def claim(directory: str, index: int, reclaim: bool = False) -> bool:
+    """Claims a realization for this process, so no other host runs it.
+
+    A claim is a file created with O_EXCL, which is atomic on a shared
+    filesystem. Finished realizations can never be claimed again.
+
+    Args:
+        directory (str): Directory of the ensemble
+        index (int): Index of the realization
+        reclaim (bool): Take over realizations that were claimed but never
+            finished, e.g. by a host that crashed
+
+    Returns:
+        bool: Whether the realization is now this process's to run
+    """
+    path: str = realization_dir(directory, index)
+    if os.path.exists(os.path.join(path, SUMMARY)):
+        return False
+    os.makedirs(path, exist_ok=True)
+    claim_path: str = os.path.join(path, CLAIM)
+    if reclaim and os.path.exists(claim_path):
+        os.remove(claim_path)
+    try:
+        fd: int = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as file:
+        file.write(f"{socket.gethostname()} {os.getpid()}\n")
+    return True
+
+
+def run_realization(
+    directory: str,
+    index: int,
+    manifest: dict,
+    threads: int | None = None,
+    store: bool = False,
+) -> str:
+    """Runs the streaming pipeline for one realization and saves its summaries.
+
+    The pipeline's output goes to the realization's log.txt. Only the
+    summaries are written to summary.json, atomically, so a realization
+    is finished exactly when that file exists.
+
+    Args:
+        directory (str): Directory of the ensemble
+        index (int): Index of the realization, claimed with claim()
+        manifest (dict): Parameters of the ensemble from create_or_join()
+        threads (int | None): Number of threads for the Rust samplers
+        store (bool): Also save every value to a run store in the
+            realization's directory
+
+    Returns:
+        str: Path of summary.json
+    """
+    path: str = realization_dir(directory, index)
+    seed: int = realization_seed(manifest["seed"], index)
+    try:
+        with open(os.path.join(path, LOG), "w") as log, contextlib.redirect_stdout(log):
+            start: float = time.perf_counter()
+            run_store: RunStore | None = None
+            if store:
+                run_store = RunStore.create(
+                    f"{path}/store",
+                    {
+                        "runs": manifest["runs"],
+                        "seed": seed,
+                        "threads": threads,
+                        "stream": True,
+                        "chunk_size": manifest["chunk_size"],
+                        "ensemble": manifest["name"],
+                        "realization": index,
+                    },
+                )
+            summaries: dict[str, StreamSummary] = streaming.main(
+                manifest["runs"],
+                manifest["chunk_size"],
+                seed,
+                threads,
+                run_store,
+                Renderer("none"),
+            )
+            if run_store is not None:
+                run_store.close()
+            elapsed: float = time.perf_counter() - start
+
+        summary_path: str = os.path.join(path, SUMMARY)
+        with open(f"{summary_path}.partial", "w") as file:
+            json.dump(
+                {
+                    "index": index,
+                    "seed": seed,
+                    "runs": manifest["runs"],
+                    "host": socket.gethostname(),
+                    "seconds": elapsed,
+                    "summaries": {
+                        name: summary.to_dict() for name, summary in summaries.items()
+                    },
+                },
+                file,
+            )
+        os.replace(f"{summary_path}.partial", summary_path)
+    finally:
+        # Finished or failed, the realization is no longer being run
+        os.remove(os.path.join(path, CLAIM))
+    return summary_path
+
+
+class EnsembleStatistics:
+    """Statistics of an ensemble, merged one realization at a time.
+
+    `pooled` merges the summaries and histograms of every realization,
+    as if all their samples came from one run. `spread` holds, for each
+    quantity and each statistic in SPREAD_STATISTICS, the running mean
+    and standard deviation of that statistic across realizations, which
+    is the Monte Carlo uncertainty of a single run.
+
+    Only each realization's summary.json is read, never its samples,
+    so memory use depends on neither the number of samples nor the
+    number of realizations."""
+
+    def __init__(self) -> None:
+        self.pooled: dict[str, StreamSummary] = {}
+        self.spread: dict[str, dict[str, RunningStats]] = {}
+        self.indices: set[int] = set()
+        # Error of each realization that failed on this host
+        self.failed: dict[int, str] = {}
+
+    def update(self, realization: dict) -> None:
+        """Folds one realization's summaries into the ensemble.
+
+        Args:
+            realization (dict): Contents of a realization's summary.json
+        """
+        if realization["index"] in self.indices:
+            return
+        self.indices.add(realization["index"])
+        self.failed.pop(realization["index"], None)
+        for name, data in realization["summaries"].items():
+            summary: StreamSummary = StreamSummary.from_dict(data)
+            if name in self.pooled:
+                self.pooled[name].merge(summary)
+            else:
+                self.pooled[name] = summary
+            describe: dict[str, float] = summary.describe()
+            spread = self.spread.setdefault(
+                name, {statistic: RunningStats() for statistic in SPREAD_STATISTICS}
+            )
+            for statistic in SPREAD_STATISTICS:
+                spread[statistic].update(np.array([describe[statistic]]))
+
+    def load(self, path: str) -> None:
+        """Folds in the realization saved at `path`.
+
+        Args:
+            path (str): Path of a realization's summary.json
+        """
+        with open(path) as file:
+            self.update(json.load(file))
+
+    @property
+    def count(self) -> int:
+        return len(self.indices)
+
+    def to_dict(self) -> dict:
+        """Returns a JSON-serialisable copy of the ensemble statistics."""
+        return {
+            "realizations": sorted(self.indices),
+            "failed": {str(index): error for index, error in self.failed.items()},
+            "pooled": {
+                name: {"describe": summary.describe(), **summary.to_dict()}
+                for name, summary in self.pooled.items()
+            },
+            "spread": {
+                name: {
+                    statistic: {
+                        "mean": stats.mean,
+                        "std": stats.std,
+                        "min": stats.min,
+                        "max": stats.max,
+                    }
+                    for statistic, stats in spread.items()
+                }
+                for name, spread in self.spread.items()
+            },
+        }
+
+    def format(self) -> str:
+        """Formats the spread of every statistic as mean ± standard deviation
+        across realizations.
+
+        Returns:
+            str: Printable table
+        """
+        lines: list[str] = [f"Across {self.count} realizations (times in Myr):"]
+        for name, spread in self.spread.items():
+            lines.append(name)
+            lines += [
+                f"  {statistic:<5} {stats.mean:.6g} ± {stats.std:.3g}"
+                for statistic, stats in spread.items()
+            ]
+        return "\n".join(lines)
+
+
+def finished_realizations(directory: str, realizations: int) -> dict[int, str]:
+    """Finds the finished realizations of an ensemble.
+
+    Args:
+        directory (str): Directory of the ensemble
+        realizations (int): Number of realizations in the ensemble
+
+    Returns:
+        dict[int, str]: Path of the summary.json of each finished realization
+    """
+    paths: dict[int, str] = {
+        index: os.path.join(realization_dir(directory, index), SUMMARY)
+        for index in range(realizations)
+    }
+    return {index: path for index, path in paths.items() if os.path.exists(path)}
+
+
+def main(
+    name: str,
+    realizations: int | None = None,
+    runs: int | None = None,
+    chunk_size: int | None = None,
+    seed: int | None = None,
+    workers: int | None = None,
+    threads: int | None = None,
+    store: bool = False,
+    merge_only: bool = False,
+    reclaim: bool = False,
+) -> EnsembleStatistics:
+    """Runs the realizations of an ensemble in a process pool and merges them.
+
+    Several hosts can run the same ensemble over a shared filesystem by
+    calling this with the same name: each claims realizations one at a
+    time, so the work spreads across hosts as they free up. Each host
+    merges every finished realization at the end, including those run by
+    other hosts, and writes the result to the ensemble's results.json.
+    A realization that fails is logged and listed under "failed" in the
+    results, and the others still run.
+
+    Args:
+        name (str): Name of the ensemble, its directory in output/ensembles
+        realizations (int | None): Number of realizations
+        runs (int | None): Number of stars and rocks sampled in each realization
+        chunk_size (int | None): Number of samples per chunk
+        seed (int | None): Seed of the ensemble. If None, a random seed.
+            Parameters that are None are taken from an existing ensemble
+            with this name, or from DEFAULT_CONFIG for a new one.
+        workers (int | None): Number of realizations run at once on this host.
+            If None, one per 4 cores.
+        threads (int | None): Number of threads for the Rust samplers of each
+            realization. If None, the cores are split between the workers.
+        store (bool): Save every realization's values to a run store
+        merge_only (bool): Do not run anything, only merge the finished
+            realizations
+        reclaim (bool): Rerun realizations claimed by hosts that never
+            finished them. Only use this once those hosts have stopped.
+
+    Returns:
+        EnsembleStatistics: Statistics of the finished realizations
+    """
+    directory: str = ensemble_dir(name)
+    ensemble = EnsembleStatistics()
+
+    def collect(future: Future, index: int) -> None:
+        # A failed realization is reported, not raised, so the others
+        # still run and the results are still written
+        try:
+            ensemble.load(future.result())
+        except Exception as error:
+            ensemble.failed[index] = f"{type(error).__name__}: {error}"
+            print(f"Realization {index} failed: {ensemble.failed[index]}")
+        else:
+            print(f"Realization {index} finished")
+
+    manifest: dict = create_or_join(
+        directory,
+        {
+            "name": name,
+            "realizations": realizations,
+            "runs": runs,
+            "chunk_size": chunk_size,
+            "seed": seed,
+        },
+    )
+    realizations = manifest["realizations"]
+    print(
+        f"Ensemble {name}: {realizations} realizations of {manifest['runs']} samples "
+        f"(seed {manifest['seed']}) in {directory}"
+    )
+
+    if not merge_only:
+        cores: int = os.cpu_count() or 1
+        workers = workers or max(1, cores // 4)
+        threads = threads or max(1, cores // workers)
+        print(f"Running with {workers} workers of {threads} threads...")
+        with ProcessPoolExecutor(workers) as executor:
+            running: dict[Future, int] = {}
+            for index in range(realizations):
+                # Claim one realization per free worker, so that other hosts
+                # can take the rest
+                if len(running) == workers:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future, running.pop(future))
+                if claim(directory, index, reclaim):
+                    running[
+                        executor.submit(
+                            run_realization, directory, index, manifest, threads, store
+                        )
+                    ] = index
+            for future in wait(running).done:
+                collect(future, running[future])
+
+    # Realizations finished by other hosts
+    for index, path in finished_realizations(directory, realizations).items():
+        if index not in ensemble.indices:
+            ensemble.load(path)
+    if ensemble.failed:
+        print(f"Realizations {sorted(ensemble.failed)} failed on this host")
+    missing: int = realizations - ensemble.count
+    if missing:
+        print(
+            f"{missing} realizations are still running or failed. "
+            "Merge them later with --merge-only, or rerun with --reclaim"
+        )
+
+    print(ensemble.format())
+    results_path: str = os.path.join(directory, RESULTS)
+    partial: str = f"{results_path}.{socket.gethostname()}.{os.getpid()}"
+    with open(partial, "w") as file:
+        json.dump(ensemble.to_dict(), file)
+    os.replace(partial, results_path)
+    print(f"Ensemble statistics written to {results_path}")
+    return ensemble
@@ -1,6 +1,9 @@
+import importlib
 import numpy as np
 import os
+import sys
 from math import floor, log10
+from types import ModuleType
 
 
 def get_base_dir() -> str:
@@ -41,3 +44,27 @@ def sig_figs(x: float, precision: int) -> float:
     precision = int(precision)
 
     return round(x, -int(floor(log10(abs(x)))) + (precision - 1))
+
+
+class LazyModule(ModuleType):
+    """Stand-in for a module that is imported the first time one of its
+    attributes is used. See lazy_import."""
+
+    def __getattr__(self, name: str):
+        return getattr(importlib.import_module(self.__name__), name)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Returns a module that is only imported when it is first used.
+
+    matplotlib and pandas take longer to import than a short run takes
+    to compute, so the stage modules import them with this and only
+    runs that plot or build tables pay for them.
+
+    Args:
+        name (str): Full name of the module, e.g. "matplotlib.pyplot"
+
+    Returns:
+        ModuleType: The module if it is already imported, else a stand-in
+    """
+    return sys.modules.get(name) or LazyModule(name)
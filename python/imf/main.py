@@ -1,26 +1,147 @@
 import numpy as np
 
-from rust import get_stellar_masses
-from imf.plot_and_save import plot_imf_histogram, save_imf_values
-from helpers import load_stellar_mass_file
+import constants
 
+from rust import (
+    get_stellar_masses,
+    get_weighted_stellar_masses,
+    histogram_stellar_masses,
+)
+from imf.plot_and_save import (
+    imf_bins,
+    imf_histogram_counts,
+    plot_imf_histogram_counts,
+    save_imf_values,
+)
+from result_cache import ResultCache, source_hash
+from run_store import RunStore, save_values
+from rendering import Renderer
+from sampling import Sampling
 
-def get_stellar_mass_array() -> np.ndarray:
+# Code that the sampled stellar masses depend on
+SAMPLER_SOURCES: tuple[str, ...] = (
+    "rust/Cargo.toml",
+    "rust/src/lib.rs",
+    "rust/src/sampling.rs",
+    "rust/src/quantile_function.rs",
+)
+
+
+def get_stellar_mass_sample(
+    n: int = 100_000,
+    seed: int | None = None,
+    threads: int | None = None,
+    cache: ResultCache | None = None,
+    sampling: Sampling | None = None,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """Returns the stellar masses and, with importance sampling, their weights.
+    See get_stellar_mass_array.
+
+    Args:
+        n (int): Number of stellar masses to sample
+        seed (int | None): Seed for the sampler
+        threads (int | None): Number of threads to sample on
+        cache (ResultCache | None): Cache to load the masses from or save them to
+        sampling (Sampling | None): How the masses are drawn.
+            If None, plain random sampling.
+
+    Returns:
+        np.ndarray: Stellar mass array (SI)
+        np.ndarray | None: Weight of each star, or None if unweighted
+    """
+    sampling = sampling or Sampling()
+    print("Calculating stellar masses...")
+
+    def sample() -> dict[str, np.ndarray]:
+        masses, weights = sampling.sample(
+            get_stellar_masses, get_weighted_stellar_masses, n, seed, threads
+        )
+        if weights is None:
+            return {"stellar_mass": masses}
+        return {"stellar_mass": masses, "weight": weights}
+
+    if cache is None or seed is None:
+        arrays: dict[str, np.ndarray] = sample()
+    else:
+        arrays = cache.get_or_compute(
+            "stellar_masses",
+            {"n": n, "seed": seed, **sampling.params()},
+            source_hash(*SAMPLER_SOURCES),
+            sample,
+        )
+    return arrays["stellar_mass"], arrays.get("weight")
+
+
+def get_stellar_mass_array(
+    n: int = 100_000,
+    seed: int | None = None,
+    threads: int | None = None,
+    cache: ResultCache | None = None,
+    sampling: Sampling | None = None,
+) -> np.ndarray:
     """Returns the array of stellar masses.
     This function uses values from the Rust library.
     To see the source code, look in the `rust/src` directory.
 
+    Args:
+        n (int): Number of stellar masses to sample
+        seed (int | None): Seed for the sampler. The same seed gives the
+            same masses whatever the number of threads. If None, a random
+            seed is used.
+        threads (int | None): Number of threads to sample on.
+            If None, all cores are used.
+        cache (ResultCache | None): Cache to load the masses from or save
+            them to. Only used when a seed is given, since that is what makes
+            the result reproducible.
+        sampling (Sampling | None): How the masses are drawn. If it is
+            weighted, use get_stellar_mass_sample to get the weights too.
+
     Returns:
         np.ndarray: Stellar mass array (SI)
     """
-    print("Calculating stellar masses...")
-    return np.array(get_stellar_masses(), dtype=float)
-    # return load_stellar_mass_file()
+    return get_stellar_mass_sample(n, seed, threads, cache, sampling)[0]
+
+
+def get_imf_histogram(
+    n: int,
+    seed: int | None = None,
+    threads: int | None = None,
+    strategy: str = "random",
+) -> np.ndarray:
+    """Returns the IMF histogram of n stellar masses.
+    The masses are sampled and binned in the Rust library, so only the
+    counts are ever held in memory and n can be far larger than a run.
+
+    Args:
+        n (int): Number of stellar masses to sample
+        seed (int | None): Seed for the sampler. If None, a random seed is used.
+        threads (int | None): Number of threads to sample on.
+            If None, all cores are used.
+        strategy (str): Sampling strategy (see sampling.STRATEGIES)
+
+    Returns:
+        np.ndarray: Number of stars in each bin of imf_bins()
+    """
+    print(f"Calculating IMF histogram from {n} stellar masses...")
+    edges: np.ndarray = imf_bins() * constants.M_SUN
+    return histogram_stellar_masses(edges, n, seed, threads, strategy)
 
 
-def main(stellar_mass: np.ndarray) -> None:
-    print("Plotting IMF histogram...")
-    plot_imf_histogram(stellar_mass)
+def main(
+    stellar_mass: np.ndarray,
+    store: RunStore | None = None,
+    renderer: Renderer | None = None,
+    counts: np.ndarray | None = None,
+    weights: np.ndarray | None = None,
+) -> None:
+    renderer = renderer or Renderer("serial")
+    if renderer.enabled:
+        print("Plotting IMF histogram...")
+        if counts is None:
+            counts = imf_histogram_counts(stellar_mass, weights)
+        renderer.submit(plot_imf_histogram_counts, imf_bins(), counts)
 
     print("Saving stellar mass array...")
-    save_imf_values(stellar_mass)
+    save_imf_values(stellar_mass, store)
+    if weights is not None:
+        save_values("stellar_mass_weights", weights, "", store)
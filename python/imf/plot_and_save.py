@@ -1,8 +1,37 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import astropy.constants as astro_const
+import constants
 
-from helpers import get_base_dir
+from helpers import get_base_dir, lazy_import
+from run_store import RunStore, save_values
+
+plt = lazy_import("matplotlib.pyplot")
+
+
+def imf_bins() -> np.ndarray:
+    """Returns the bin edges of the IMF histogram
+
+    Returns:
+        np.ndarray: Bin edges (M_sun)
+    """
+    return np.logspace(np.log10(0.01), np.log10(50), num=75)
+
+
+def imf_histogram_counts(
+    stellar_mass_array: np.ndarray, weights: np.ndarray | None = None
+) -> np.ndarray:
+    """Bins stellar masses into the IMF histogram bins
+
+    Args:
+        stellar_mass_array (np.ndarray): Stellar mass array (SI)
+        weights (np.ndarray | None): Importance weight of each star
+
+    Returns:
+        np.ndarray: Number (or total weight) of stars in each bin of imf_bins()
+    """
+    counts, _ = np.histogram(
+        stellar_mass_array / constants.M_SUN, bins=imf_bins(), weights=weights
+    )
+    return counts
 
 
 def plot_imf_histogram(stellar_mass_array: np.ndarray) -> None:
@@ -11,12 +40,19 @@ def plot_imf_histogram(stellar_mass_array: np.ndarray) -> None:
     Args:
         stellar_mass_array (np.ndarray): Stellar mass array (SI)
     """
+    plot_imf_histogram_counts(imf_bins(), imf_histogram_counts(stellar_mass_array))
+
+
+def plot_imf_histogram_counts(bins: np.ndarray, counts: np.ndarray) -> None:
+    """Plots the histogram of the initial mass function (IMF)
+    from counts that have already been binned
+
+    Args:
+        bins (np.ndarray): Bin edges (M_sun)
+        counts (np.ndarray): Number of stars in each bin
+    """
     plt.figure()
-    bins: list[float] = list(np.logspace(np.log10(0.01), np.log10(50), num=75))
-    plt.hist(
-        stellar_mass_array / astro_const.M_sun.value,
-        bins=bins,
-    )
+    plt.hist(bins[:-1], bins=bins, weights=counts)
     plt.xlim(10**-1, 10**2)
     plt.yscale("log")
     plt.xscale("log")
@@ -28,11 +64,14 @@ def plot_imf_histogram(stellar_mass_array: np.ndarray) -> None:
     plt.close()
 
 
-def save_imf_values(stellar_mass_array: np.ndarray) -> None:
-    """Saves the IMF distribution values to a .npy file
+def save_imf_values(
+    stellar_mass_array: np.ndarray, store: RunStore | None = None
+) -> None:
+    """Saves the IMF distribution values to the run store,
+    or to a .npy file if there is no store
 
     Args:
         stellar_mass_array (np.ndarray): Stellar mass array (SI)
+        store (RunStore | None): Store of the current run
     """
-    values_dir: str = get_base_dir() + "/output/values"
-    np.save(values_dir + "/stellar_masses", stellar_mass_array)
+    save_values("stellar_masses", stellar_mass_array, "kg", store)
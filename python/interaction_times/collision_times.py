@@ -1,25 +1,25 @@
 import numpy as np
-import astropy.constants as astro_const
+import constants
 from disk_calcs.disk import DiskCalcs
 
-AU_TO_M: float = 1.49597871e11
+AU_TO_M: float = constants.AU
 
 
-def t_coll_earth(n_o: float, v_o: float) -> float:
+def t_coll_earth(n_o: float, v_o: float | np.ndarray) -> float | np.ndarray:
     """Finds collision time of 'Oumuamua-like object with Earth
 
     Args:
         n_o (float): Number density of 'Oumuamua-like objects in SI units
-        v_o (float): Velocity of 'Oumuamua-like object in SI units
+        v_o (float | np.ndarray): Velocity of 'Oumuamua-like object in SI units
     Returns:
-        float: Collision time in SI units
+        float | np.ndarray: Collision time in SI units
     """
-    r_earth: float = astro_const.R_earth.value
-    m_earth: float = astro_const.M_earth.value
-    G: float = astro_const.G.value
+    r_earth: float = constants.R_EARTH
+    m_earth: float = constants.M_EARTH
+    G: float = constants.G
 
     v_esc: float = np.sqrt(2 * G * m_earth / r_earth)
-    C: float = (
+    C: float | np.ndarray = (
         np.pi * r_earth**2 * (1 + v_esc**2 / v_o**2)
     )  # Collision cross section in SI units
     return 1 / (n_o * C * v_o)
@@ -47,7 +47,7 @@ def t_coll_disk(
     csa_sideview: np.ndarray = disk.get_csa_sideview()
     csa_topview: np.ndarray = disk.get_csa_topview()
 
-    G: float = astro_const.G.value
+    G: float = constants.G
 
     v_esc: float = np.sqrt(2 * G * (stellar_mass + disk_mass) / disk_radius)
 
@@ -55,3 +55,143 @@ def t_coll_disk(
     C_top: float = csa_topview * (1 + v_esc**2 / v_o**2)
 
     return 1 / (n_o * C_side * v_o), 1 / (n_o * C_top * v_o)
+
+
+def disk_focusing_terms(
+    disk: DiskCalcs, stellar_mass: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the per-star terms of the disk collision times.
+    These do not depend on n_o or v_o, so they only need computing once.
+
+    Args:
+        disk (DiskCalcs): Disk object
+        stellar_mass (np.ndarray): Stellar mass array (SI)
+
+    Returns:
+        np.ndarray: Escape velocity squared at the disk edge (SI)
+        np.ndarray: Side cross sectional area (SI)
+        np.ndarray: Top cross sectional area (SI)
+    """
+    G: float = constants.G
+    v_esc_sq: np.ndarray = (
+        2 * G * (stellar_mass + disk.get_mass()) / disk.get_reduced_radius()
+    )
+    return v_esc_sq, disk.get_csa_sideview(), disk.get_csa_topview()
+
+
+def t_coll_disk_grid(
+    n_o: np.ndarray, v_o: np.ndarray, disk: DiskCalcs, stellar_mass: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Finds disk collision times for every combination of star, n_o and v_o
+    by broadcasting the per-star terms against the (n_o, v_o) grid.
+
+    Args:
+        n_o (np.ndarray): Number densities of 'Oumuamua-like objects in SI units
+        v_o (np.ndarray): Velocities of 'Oumuamua-like objects in SI units
+        disk (DiskCalcs): Disk object
+        stellar_mass (np.ndarray): Stellar mass array (SI)
+
+    Returns:
+        np.ndarray: Side collision times (SI), shape (stars, n_o, v_o)
+        np.ndarray: Top collision times (SI), shape (stars, n_o, v_o)
+    """
+    v_esc_sq, csa_sideview, csa_topview = disk_focusing_terms(disk, stellar_mass)
+    n_o = np.asarray(n_o, dtype=np.float64)[None, :, None]
+    v_o = np.asarray(v_o, dtype=np.float64)[None, None, :]
+
+    # n_o * v_o * (1 + v_esc^2 / v_o^2), the only term mixing star and grid
+    flux: np.ndarray = n_o * (v_o + v_esc_sq[:, None, None] / v_o)
+    return (
+        1 / (flux * csa_sideview[:, None, None]),
+        1 / (flux * csa_topview[:, None, None]),
+    )
+
+
+def t_coll_disk_quantiles(
+    n_o: np.ndarray,
+    v_o: np.ndarray,
+    disk: DiskCalcs,
+    stellar_mass: np.ndarray,
+    quantiles: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Finds quantiles over stars of the disk collision times for every
+    (n_o, v_o) pair, without building the (stars, n_o, v_o) array.
+
+    Collision times are proportional to 1 / n_o, so the quantiles over stars
+    only need computing once per v_o and are then rescaled for each n_o.
+
+    Args:
+        n_o (np.ndarray): Number densities of 'Oumuamua-like objects in SI units
+        v_o (np.ndarray): Velocities of 'Oumuamua-like objects in SI units
+        disk (DiskCalcs): Disk object
+        stellar_mass (np.ndarray): Stellar mass array (SI)
+        quantiles (np.ndarray): Quantiles to compute, between 0 and 1
+
+    Returns:
+        np.ndarray: Side collision time quantiles (SI), shape (n_o, v_o, quantiles)
+        np.ndarray: Top collision time quantiles (SI), shape (n_o, v_o, quantiles)
+    """
+    v_esc_sq, csa_sideview, csa_topview = disk_focusing_terms(disk, stellar_mass)
+    n_o = np.asarray(n_o, dtype=np.float64)
+    v_o = np.asarray(v_o, dtype=np.float64)
+
+    side: np.ndarray = np.empty((v_o.size, np.size(quantiles)))
+    top: np.ndarray = np.empty((v_o.size, np.size(quantiles)))
+    side_to_top: np.ndarray = csa_sideview / csa_topview
+    t_unit_n_o: np.ndarray = np.empty_like(v_esc_sq)  # Reused for every v_o
+    for j, v in enumerate(v_o):
+        # Side collision time for n_o = 1
+        np.divide(v_esc_sq, v, out=t_unit_n_o)
+        t_unit_n_o += v
+        t_unit_n_o *= csa_sideview
+        np.reciprocal(t_unit_n_o, out=t_unit_n_o)
+        side[j] = np.quantile(t_unit_n_o, quantiles)
+        # Top-down only differs by the cross section
+        t_unit_n_o *= side_to_top
+        top[j] = np.quantile(t_unit_n_o, quantiles)
+
+    return side[None] / n_o[:, None, None], top[None] / n_o[:, None, None]
+
+
+def t_coll_disk_histograms(
+    n_o: np.ndarray,
+    v_o: np.ndarray,
+    disk: DiskCalcs,
+    stellar_mass: np.ndarray,
+    bins: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Histograms the disk collision times over stars for every (n_o, v_o) pair,
+    without building the (stars, n_o, v_o) array.
+
+    Args:
+        n_o (np.ndarray): Number densities of 'Oumuamua-like objects in SI units
+        v_o (np.ndarray): Velocities of 'Oumuamua-like objects in SI units
+        disk (DiskCalcs): Disk object
+        stellar_mass (np.ndarray): Stellar mass array (SI)
+        bins (np.ndarray): Bin edges of the collision times (SI)
+
+    Returns:
+        np.ndarray: Side counts, shape (n_o, v_o, len(bins) - 1)
+        np.ndarray: Top counts, shape (n_o, v_o, len(bins) - 1)
+    """
+    v_esc_sq, csa_sideview, csa_topview = disk_focusing_terms(disk, stellar_mass)
+    n_o = np.asarray(n_o, dtype=np.float64)
+    v_o = np.asarray(v_o, dtype=np.float64)
+
+    bins = np.asarray(bins, dtype=np.float64)
+
+    shape: tuple[int, int, int] = (n_o.size, v_o.size, bins.size - 1)
+    side: np.ndarray = np.empty(shape, dtype=np.int64)
+    top: np.ndarray = np.empty(shape, dtype=np.int64)
+    side_to_top: np.ndarray = csa_sideview / csa_topview
+    for j, v in enumerate(v_o):
+        # Collision times for n_o = 1
+        side_unit_n_o: np.ndarray = 1 / ((v + v_esc_sq / v) * csa_sideview)
+        top_unit_n_o: np.ndarray = side_unit_n_o * side_to_top
+        for i, n in enumerate(n_o):
+            # Dividing the collision times by n_o is the same
+            # as multiplying the bin edges by n_o
+            side[i, j], _ = np.histogram(side_unit_n_o, bins=bins * n)
+            top[i, j], _ = np.histogram(top_unit_n_o, bins=bins * n)
+
+    return side, top
@@ -1,13 +1,14 @@
 import numpy as np
-import pandas as pd
+import constants
 from interaction_times.collision_times import (
     t_coll_disk,
     t_coll_earth,
 )
-from helpers import get_base_dir
+from run_store import RunStore, save_values
 from disk_calcs.disk import DiskCalcs
+from streaming.stats import SummaryStatistics
 
-AU_TO_M: float = 1.49597871e11
+AU_TO_M: float = constants.AU
 
 # https://www.doi.org/10.3847/2041-8213/aaae67 gives the
 # number density of 'Oumuamua-like objects as 0.2 per cubic AU
@@ -22,19 +23,18 @@ N_O: float = 0.2 * 1 / (AU_TO_M**3)  # SI units
 V_O: float = 26e3  # SI units
 
 
-def calc_coll_time_earth() -> None:
+def calc_coll_time_earth(store: RunStore | None = None) -> None:
     n_o = N_O
     v_o = V_O
 
-    collision_time = t_coll_earth(n_o, v_o)
+    collision_time: np.ndarray = np.atleast_1d(t_coll_earth(n_o, v_o))
 
-    np.save(
-        f"{get_base_dir()}/output/values/collision_time_earth.npy",
-        collision_time,
-    )
+    save_values("collision_time_earth", collision_time, "s", store)
 
 
-def calc_coll_time_disk(stellar_mass: np.ndarray, disk: DiskCalcs) -> None:
+def calc_coll_time_disk(
+    stellar_mass: np.ndarray, disk: DiskCalcs, store: RunStore | None = None
+) -> tuple[np.ndarray, np.ndarray]:
     v_o = V_O
     n_o = N_O
 
@@ -42,37 +42,33 @@ def calc_coll_time_disk(stellar_mass: np.ndarray, disk: DiskCalcs) -> None:
         n_o, v_o, disk, stellar_mass
     )
 
-    np.save(
-        f"{get_base_dir()}/output/values/collision_times_disk_sideon.npy",
-        collision_times_side_on,
-    )
-    np.save(
-        f"{get_base_dir()}/output/values/collision_times_disk_topdown.npy",
-        collision_times_top_down,
-    )
+    save_values("collision_times_disk_sideon", collision_times_side_on, "s", store)
+    save_values("collision_times_disk_topdown", collision_times_top_down, "s", store)
 
+    return collision_times_side_on, collision_times_top_down
 
-def main(stellar_mass: np.ndarray) -> None:
-    calc_coll_time_earth()
-    disk: DiskCalcs = DiskCalcs(stellar_mass)
-    calc_coll_time_disk(stellar_mass, disk)
+
+def main(
+    stellar_mass: np.ndarray,
+    store: RunStore | None = None,
+    disk: DiskCalcs | None = None,
+    weights: np.ndarray | None = None,
+) -> None:
+    calc_coll_time_earth(store)
+    if disk is None:
+        disk = DiskCalcs(stellar_mass)
+    collision_times_side_on, collision_times_top_down = calc_coll_time_disk(
+        stellar_mass, disk, store
+    )
 
     print("Summary statistics for collision times:")
 
     print("Disk (side-on):")
-    disk_sideon_df = pd.DataFrame(
-        np.load(f"{get_base_dir()}/output/values/collision_times_disk_sideon.npy")
-        / (365.25 * 1e6),
-        columns=["Collision Time (Myr)"],
-    )
-    print(disk_sideon_df.describe())
-    print(f"median: {disk_sideon_df.median()}")
+    disk_sideon_summary = SummaryStatistics()
+    disk_sideon_summary.update(collision_times_side_on / (365.25 * 1e6), weights)
+    print(disk_sideon_summary.format("Collision Time (Myr)"))
 
     print("Disk (top-down):")
-    disk_topdown_df = pd.DataFrame(
-        np.load(f"{get_base_dir()}/output/values/collision_times_disk_topdown.npy")
-        / (365.25 * 1e6),
-        columns=["Collision Time (Myr)"],
-    )
-    print(disk_topdown_df.describe())
-    print(f"median: {disk_topdown_df.median()}")
+    disk_topdown_summary = SummaryStatistics()
+    disk_topdown_summary.update(collision_times_top_down / (365.25 * 1e6), weights)
+    print(disk_topdown_summary.format("Collision Time (Myr)"))
@@ -0,0 +1,140 @@
+import os
+import numpy as np
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import product
+
+import constants
+from disk_calcs.disk import DiskCalcs
+from interaction_times.collision_times import t_coll_disk_quantiles
+from rock_calcs.conversions import SECONDS_IN_MYR
+
+AU_TO_M: float = constants.AU
+
+# Set in each worker process by _init_worker, so the stellar masses
+# are only sent once per process instead of once per task
+_worker_stellar_mass: np.ndarray | None = None
+
+
+def _init_worker(stellar_mass: np.ndarray) -> None:
+    global _worker_stellar_mass
+    _worker_stellar_mass = stellar_mass
+
+
+def _sweep_task(
+    stellar_mass: np.ndarray | None,
+    disk_height: float,
+    radius_reduction: float,
+    n_o: np.ndarray,
+    v_o: np.ndarray,
+    quantiles: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    if stellar_mass is None:
+        stellar_mass = _worker_stellar_mass
+    assert stellar_mass is not None, "worker was not started by _init_worker"
+    disk = DiskCalcs(
+        stellar_mass,
+        verbose=False,
+        disk_height=disk_height,
+        radius_reduction=radius_reduction,
+    )
+    return t_coll_disk_quantiles(n_o, v_o, disk, stellar_mass, quantiles)
+
+
+def sweep_coll_times(
+    stellar_mass: np.ndarray,
+    n_o: np.ndarray,
+    v_o: np.ndarray,
+    disk_heights: np.ndarray = np.array([0.1]),
+    radius_reductions: np.ndarray = np.array([1.0]),
+    quantiles: np.ndarray = np.array([0.25, 0.5, 0.75]),
+    max_workers: int | None = None,
+    use_processes: bool = False,
+    v_o_chunk: int = 64,
+) -> dict[str, np.ndarray]:
+    """Sweeps the disk collision times over a grid of n_o, v_o, disk height
+    and radius reduction, returning quantiles over the stellar population
+    for every grid point.
+
+    The sweep is split into tasks of one (disk height, radius reduction)
+    pair and up to `v_o_chunk` velocities, which run on a thread or
+    process pool. Each task's results are written into pre-allocated
+    arrays, so the grid can have thousands of points along any axis.
+
+    Args:
+        stellar_mass (np.ndarray): Stellar mass array (SI)
+        n_o (np.ndarray): Number densities of 'Oumuamua-like objects (AU^-3)
+        v_o (np.ndarray): Velocities of 'Oumuamua-like objects (km/s)
+        disk_heights (np.ndarray): Disk heights (AU)
+        radius_reductions (np.ndarray): Factors the disk radius is divided by
+        quantiles (np.ndarray): Quantiles over stars to compute, between 0 and 1
+        max_workers (int | None): Size of the pool. If None, the number of CPUs.
+        use_processes (bool): Use a process pool instead of a thread pool
+        v_o_chunk (int): Maximum number of velocities per task
+
+    Returns:
+        dict[str, np.ndarray]: The grid axes ("disk_height", "radius_reduction",
+            "n_o", "v_o", "quantile") and the collision time quantiles in Myr
+            ("coll_time_side", "coll_time_top"), each with shape
+            (disk_height, radius_reduction, n_o, v_o, quantile)
+    """
+    disk_heights = np.atleast_1d(np.asarray(disk_heights, dtype=np.float64))
+    radius_reductions = np.atleast_1d(np.asarray(radius_reductions, dtype=np.float64))
+    n_o = np.atleast_1d(np.asarray(n_o, dtype=np.float64))
+    v_o = np.atleast_1d(np.asarray(v_o, dtype=np.float64))
+    quantiles = np.atleast_1d(np.asarray(quantiles, dtype=np.float64))
+
+    shape: tuple[int, ...] = (
+        disk_heights.size,
+        radius_reductions.size,
+        n_o.size,
+        v_o.size,
+        quantiles.size,
+    )
+    coll_time_side: np.ndarray = np.empty(shape)
+    coll_time_top: np.ndarray = np.empty(shape)
+
+    n_o_si: np.ndarray = n_o / AU_TO_M**3
+    v_o_si: np.ndarray = v_o * 1e3
+
+    executor: Executor
+    if use_processes:
+        executor = ProcessPoolExecutor(
+            max_workers, initializer=_init_worker, initargs=(stellar_mass,)
+        )
+        task_stellar_mass = None
+    else:
+        executor = ThreadPoolExecutor(max_workers or os.cpu_count())
+        task_stellar_mass = stellar_mass
+
+    with executor:
+        futures = {}
+        for (h, height), (r, reduction), start in product(
+            enumerate(disk_heights),
+            enumerate(radius_reductions),
+            range(0, v_o.size, v_o_chunk),
+        ):
+            future = executor.submit(
+                _sweep_task,
+                task_stellar_mass,
+                height,
+                reduction,
+                n_o_si,
+                v_o_si[start : start + v_o_chunk],
+                quantiles,
+            )
+            futures[future] = (h, r, slice(start, start + v_o_chunk))
+
+        for future, (h, r, v_slice) in futures.items():
+            side, top = future.result()
+            coll_time_side[h, r, :, v_slice] = side / SECONDS_IN_MYR
+            coll_time_top[h, r, :, v_slice] = top / SECONDS_IN_MYR
+
+    return {
+        "disk_height": disk_heights,
+        "radius_reduction": radius_reductions,
+        "n_o": n_o,
+        "v_o": v_o,
+        "quantile": quantiles,
+        "coll_time_side": coll_time_side,
+        "coll_time_top": coll_time_top,
+    }
@@ -0,0 +1,110 @@
+import numpy as np
+import constants
+
+FIELD_KINDS: tuple[str, ...] = ("uniform", "clustered")
+
+# Number density of stars in the solar neighbourhood (pc^-3)
+LOCAL_STELLAR_DENSITY: float = 0.1
+
+# Mixed into the run seed, so the positions get a stream of their own
+FIELD_SEED_KEY: int = 2
+
+
+class StellarField:
+    """Positions of stars in a periodic cube.
+
+    The cube is sized so that its mean number density is `density`, and
+    positions wrap around its faces, so every star sees the same mean
+    density whatever its position and there are no edge effects.
+
+    "uniform" places every star independently. "clustered" places a
+    fraction of the stars in Plummer spheres, themselves placed uniformly,
+    and the rest uniformly, which keeps the mean density but raises the
+    density around the clustered stars.
+
+    Args:
+        n (int): Number of stars
+        density (float): Mean number density of stars (pc^-3)
+        kind (str): One of FIELD_KINDS
+        cluster_fraction (float): Fraction of stars in clusters ("clustered" only)
+        cluster_size (int): Mean number of stars per cluster ("clustered" only)
+        cluster_radius (float): Plummer radius of the clusters (pc)
+        seed (int | None): Seed of the run, from which the seed of the positions
+            is derived. If None, a random seed is used.
+    """
+
+    def __init__(
+        self,
+        n: int,
+        density: float = LOCAL_STELLAR_DENSITY,
+        kind: str = "uniform",
+        cluster_fraction: float = 0.5,
+        cluster_size: int = 100,
+        cluster_radius: float = 1.0,
+        seed: int | None = None,
+    ) -> None:
+        if kind not in FIELD_KINDS:
+            raise ValueError(f"Unknown field {kind}, expected {FIELD_KINDS}")
+        if density <= 0:
+            raise ValueError("density must be positive")
+        if not 0 <= cluster_fraction <= 1:
+            raise ValueError("cluster_fraction must be between 0 and 1")
+        self.n: int = n
+        self.density: float = density * constants.PC**-3  # SI
+        self.kind: str = kind
+        self.box_size: float = (n / self.density) ** (1 / 3)  # Side of the cube (m)
+
+        rng: np.random.Generator = np.random.default_rng(
+            None if seed is None else [seed, FIELD_SEED_KEY]
+        )
+        self.positions: np.ndarray = rng.uniform(0, self.box_size, (n, 3))
+        if kind == "clustered":
+            # Chosen at random, as the order of the stars can follow
+            # their masses (e.g. with stratified sampling)
+            members: np.ndarray = rng.permutation(n)[: round(cluster_fraction * n)]
+            self.positions[members] = plummer_clusters(
+                len(members),
+                max(1, round(len(members) / cluster_size)),
+                cluster_radius * constants.PC,
+                self.box_size,
+                rng,
+            )
+
+    def __repr__(self) -> str:
+        return (
+            f"StellarField({self.n}, kind={self.kind!r}, "
+            f"box_size={self.box_size / constants.PC:.4g} pc)"
+        )
+
+
+def plummer_clusters(
+    n: int,
+    clusters: int,
+    radius: float,
+    box_size: float,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Places stars in Plummer spheres centred uniformly in a periodic cube.
+    Each star joins a random cluster, so cluster sizes are Poisson.
+
+    Args:
+        n (int): Number of stars
+        clusters (int): Number of clusters
+        radius (float): Plummer radius (SI)
+        box_size (float): Side of the cube (SI)
+        rng (np.random.Generator): Random number generator
+
+    Returns:
+        np.ndarray: Positions (SI), shape (n, 3), wrapped into the cube
+    """
+    centres: np.ndarray = rng.uniform(0, box_size, (clusters, 3))
+    # Inverse of the Plummer enclosed mass fraction r^3 / (r^2 + a^2)^(3/2).
+    # The tail beyond 0.999 of the mass is cut, as it reaches far outside
+    # the cluster.
+    mass_fraction: np.ndarray = rng.uniform(0, 0.999, n)
+    r: np.ndarray = radius / np.sqrt(mass_fraction ** (-2 / 3) - 1)
+    direction: np.ndarray = rng.standard_normal((n, 3))
+    direction /= np.linalg.norm(direction, axis=1)[:, None]
+    positions: np.ndarray = centres[rng.integers(0, clusters, n)]
+    positions += r[:, None] * direction
+    return np.mod(positions, box_size)
@@ -0,0 +1,507 @@
+import numba
+import numpy as np
+
+# Mean number of stars per cell of a grid whose cell size is not given.
+# Small cells mean few wasted distance checks, large cells few empty ones.
+STARS_PER_CELL: float = 2.0
+
+# The kernels below are compiled by numba on first use (and cached on disk).
+# Stars are stored sorted by cell, so the stars of a cell are a contiguous
+# slice of sorted_positions, from start[cell] to start[cell + 1].
+# Distances use the minimum image, since the field wraps around the cube.
+
+
+@numba.njit(cache=True, inline="always")
+def _cell_of(x: float, cell_size: float, cells: int) -> int:
+    # Clamped, since x may round to exactly the box size
+    return min(max(int(x / cell_size), 0), cells - 1)
+
+
+@numba.njit(cache=True, inline="always")
+def _distance_sq(a: np.ndarray, b: np.ndarray, box_size: float) -> float:
+    # Both points are inside the cube, so one wrap gives the minimum image
+    half: float = 0.5 * box_size
+    total: float = 0.0
+    for axis in range(3):
+        d: float = a[axis] - b[axis]
+        if d > half:
+            d -= box_size
+        elif d < -half:
+            d += box_size
+        total += d * d
+    return total
+
+
+@numba.njit(cache=True, inline="always")
+def _axis_range(c: int, span: int, cells: int) -> tuple[int, int]:
+    # First cell and number of cells within span of cell c along one axis.
+    # Cells are taken modulo cells, so a span wider than the grid is cut
+    # to every cell once.
+    if 2 * span + 1 >= cells:
+        return 0, cells
+    return c - span, 2 * span + 1
+
+
+@numba.njit(parallel=True, cache=True)
+def _count_within(
+    points: np.ndarray,
+    exclude: np.ndarray,
+    sorted_positions: np.ndarray,
+    order: np.ndarray,
+    start: np.ndarray,
+    cells: int,
+    cell_size: float,
+    box_size: float,
+    radius: float,
+    out: np.ndarray,
+) -> None:
+    span: int = int(np.ceil(radius / cell_size))
+    radius_sq: float = radius * radius
+    for q in numba.prange(points.shape[0]):
+        x0, nx = _axis_range(_cell_of(points[q, 0], cell_size, cells), span, cells)
+        y0, ny = _axis_range(_cell_of(points[q, 1], cell_size, cells), span, cells)
+        z0, nz = _axis_range(_cell_of(points[q, 2], cell_size, cells), span, cells)
+        count: int = 0
+        for dx in range(nx):
+            for dy in range(ny):
+                for dz in range(nz):
+                    cell: int = (
+                        (x0 + dx) % cells * cells + (y0 + dy) % cells
+                    ) * cells + (z0 + dz) % cells
+                    for j in range(start[cell], start[cell + 1]):
+                        if order[j] == exclude[q]:
+                            continue
+                        d_sq: float = _distance_sq(
+                            points[q], sorted_positions[j], box_size
+                        )
+                        if d_sq <= radius_sq:
+                            count += 1
+        out[q] = count
+
+
+@numba.njit(parallel=True, cache=True)
+def _inverse_square_sum(
+    points: np.ndarray,
+    exclude: np.ndarray,
+    sorted_positions: np.ndarray,
+    sorted_weights: np.ndarray,
+    sorted_scales: np.ndarray,
+    order: np.ndarray,
+    start: np.ndarray,
+    cells: int,
+    cell_size: float,
+    box_size: float,
+    radius: float,
+    cap: float,
+    out: np.ndarray,
+) -> None:
+    span: int = int(np.ceil(radius / cell_size))
+    radius_sq: float = radius * radius
+    for q in numba.prange(points.shape[0]):
+        x0, nx = _axis_range(_cell_of(points[q, 0], cell_size, cells), span, cells)
+        y0, ny = _axis_range(_cell_of(points[q, 1], cell_size, cells), span, cells)
+        z0, nz = _axis_range(_cell_of(points[q, 2], cell_size, cells), span, cells)
+        total: float = 0.0
+        for dx in range(nx):
+            for dy in range(ny):
+                for dz in range(nz):
+                    cell: int = (
+                        (x0 + dx) % cells * cells + (y0 + dy) % cells
+                    ) * cells + (z0 + dz) % cells
+                    for j in range(start[cell], start[cell + 1]):
+                        if order[j] == exclude[q]:
+                            continue
+                        d_sq: float = _distance_sq(
+                            points[q], sorted_positions[j], box_size
+                        )
+                        if 0 < d_sq <= radius_sq:
+                            total += sorted_scales[j] * min(
+                                sorted_weights[j] / d_sq, cap
+                            )
+        out[q] = total
+
+
+@numba.njit(cache=True, inline="always")
+def _nearest_in_cell(
+    point: np.ndarray,
+    exclude: int,
+    cell: int,
+    sorted_positions: np.ndarray,
+    order: np.ndarray,
+    start: np.ndarray,
+    box_size: float,
+    best_sq: np.ndarray,
+    best: np.ndarray,
+) -> None:
+    # Inserts the points of one cell into the sorted k nearest so far
+    k: int = best.size
+    for j in range(start[cell], start[cell + 1]):
+        if order[j] == exclude:
+            continue
+        d_sq: float = _distance_sq(point, sorted_positions[j], box_size)
+        if d_sq >= best_sq[k - 1]:
+            continue
+        i: int = k - 1
+        while i > 0 and best_sq[i - 1] > d_sq:
+            best_sq[i] = best_sq[i - 1]
+            best[i] = best[i - 1]
+            i -= 1
+        best_sq[i] = d_sq
+        best[i] = order[j]
+
+
+@numba.njit(parallel=True, cache=True)
+def _nearest(
+    points: np.ndarray,
+    exclude: np.ndarray,
+    sorted_positions: np.ndarray,
+    order: np.ndarray,
+    start: np.ndarray,
+    cells: int,
+    cell_size: float,
+    box_size: float,
+    out_distance_sq: np.ndarray,
+    out_index: np.ndarray,
+) -> None:
+    for q in numba.prange(points.shape[0]):
+        best_sq: np.ndarray = out_distance_sq[q]
+        best: np.ndarray = out_index[q]
+        best_sq[:] = np.inf
+        best[:] = -1
+        cx: int = _cell_of(points[q, 0], cell_size, cells)
+        cy: int = _cell_of(points[q, 1], cell_size, cells)
+        cz: int = _cell_of(points[q, 2], cell_size, cells)
+        # Cells are searched in growing cubic shells. Points outside the
+        # shells searched so far are at least span * cell_size away, so
+        # the search stops once the k-th nearest is closer than that.
+        span: int = 0
+        while 2 * span + 1 < cells:
+            for dx in range(-span, span + 1):
+                for dy in range(-span, span + 1):
+                    for dz in range(-span, span + 1):
+                        if max(abs(dx), abs(dy), abs(dz)) != span:
+                            continue
+                        cell: int = (
+                            (cx + dx) % cells * cells + (cy + dy) % cells
+                        ) * cells + (cz + dz) % cells
+                        _nearest_in_cell(
+                            points[q],
+                            exclude[q],
+                            cell,
+                            sorted_positions,
+                            order,
+                            start,
+                            box_size,
+                            best_sq,
+                            best,
+                        )
+            reach: float = span * cell_size
+            if best_sq[-1] <= reach * reach:
+                break
+            span += 1
+        else:
+            # The shells would wrap around the grid, so every cell is
+            # searched once instead
+            best_sq[:] = np.inf
+            best[:] = -1
+            for cell in range(cells**3):
+                _nearest_in_cell(
+                    points[q],
+                    exclude[q],
+                    cell,
+                    sorted_positions,
+                    order,
+                    start,
+                    box_size,
+                    best_sq,
+                    best,
+                )
+
+
+@numba.njit(parallel=True, cache=True)
+def _pair_counts(
+    sorted_positions: np.ndarray,
+    start: np.ndarray,
+    cells: int,
+    cell_size: float,
+    box_size: float,
+    radius: float,
+    out: np.ndarray,
+) -> None:
+    # Number of neighbours of each sorted star that come after it in the
+    # sorted order, so that every pair is counted once
+    span: int = int(np.ceil(radius / cell_size))
+    radius_sq: float = radius * radius
+    for p in numba.prange(sorted_positions.shape[0]):
+        point: np.ndarray = sorted_positions[p]
+        x0, nx = _axis_range(_cell_of(point[0], cell_size, cells), span, cells)
+        y0, ny = _axis_range(_cell_of(point[1], cell_size, cells), span, cells)
+        z0, nz = _axis_range(_cell_of(point[2], cell_size, cells), span, cells)
+        count: int = 0
+        for dx in range(nx):
+            for dy in range(ny):
+                for dz in range(nz):
+                    cell: int = (
+                        (x0 + dx) % cells * cells + (y0 + dy) % cells
+                    ) * cells + (z0 + dz) % cells
+                    for j in range(max(start[cell], p + 1), start[cell + 1]):
+                        if _distance_sq(point, sorted_positions[j], box_size) <= (
+                            radius_sq
+                        ):
+                            count += 1
+        out[p] = count
+
+
+@numba.njit(parallel=True, cache=True)
+def _pair_fill(
+    sorted_positions: np.ndarray,
+    order: np.ndarray,
+    start: np.ndarray,
+    cells: int,
+    cell_size: float,
+    box_size: float,
+    radius: float,
+    offsets: np.ndarray,
+    out_first: np.ndarray,
+    out_second: np.ndarray,
+    out_distance: np.ndarray,
+) -> None:
+    # Same search as _pair_counts, writing each star's pairs from its offset
+    span: int = int(np.ceil(radius / cell_size))
+    radius_sq: float = radius * radius
+    for p in numba.prange(sorted_positions.shape[0]):
+        point: np.ndarray = sorted_positions[p]
+        x0, nx = _axis_range(_cell_of(point[0], cell_size, cells), span, cells)
+        y0, ny = _axis_range(_cell_of(point[1], cell_size, cells), span, cells)
+        z0, nz = _axis_range(_cell_of(point[2], cell_size, cells), span, cells)
+        k: int = offsets[p]
+        for dx in range(nx):
+            for dy in range(ny):
+                for dz in range(nz):
+                    cell: int = (
+                        (x0 + dx) % cells * cells + (y0 + dy) % cells
+                    ) * cells + (z0 + dz) % cells
+                    for j in range(max(start[cell], p + 1), start[cell + 1]):
+                        d_sq: float = _distance_sq(point, sorted_positions[j], box_size)
+                        if d_sq <= radius_sq:
+                            out_first[k] = order[p]
+                            out_second[k] = order[j]
+                            out_distance[k] = np.sqrt(d_sq)
+                            k += 1
+
+
+class CellGrid:
+    """Spatial index of points in a periodic cube, for neighbour queries.
+
+    The cube is cut into equal cubic cells and the points are sorted by
+    cell, so a query only looks at the cells within reach of the query
+    point. Building the grid is a sort, O(N log N), and each query costs
+    the number of points in the cells it touches, so querying every point
+    is near linear in N rather than the O(N^2) of comparing every pair.
+
+    Queries run in parallel over the query points. Every query can be
+    made for arbitrary points, or for the indexed points themselves (by
+    passing no points), in which case each point is not its own neighbour.
+
+    Args:
+        positions (np.ndarray): Positions, shape (N, 3), inside [0, box_size)
+        box_size (float): Side of the cube
+        cell_size (float | None): Smallest side of a cell. If None, sized
+            to hold STARS_PER_CELL points on average.
+    """
+
+    def __init__(
+        self, positions: np.ndarray, box_size: float, cell_size: float | None = None
+    ) -> None:
+        positions = np.ascontiguousarray(positions, dtype=np.float64)
+        if positions.ndim != 2 or positions.shape[1] != 3:
+            raise ValueError("positions must have shape (N, 3)")
+        if cell_size is None:
+            cell_size = box_size * (STARS_PER_CELL / max(len(positions), 1)) ** (1 / 3)
+        self.box_size: float = float(box_size)
+        self.cells: int = max(1, int(box_size / cell_size))  # Along each axis
+        self.cell_size: float = self.box_size / self.cells
+
+        index: np.ndarray = np.minimum(
+            (positions / self.cell_size).astype(np.int64), self.cells - 1
+        )
+        cell: np.ndarray = (index[:, 0] * self.cells + index[:, 1]) * self.cells
+        cell += index[:, 2]
+        # Original index of each sorted point
+        self.order: np.ndarray = np.argsort(cell, kind="stable")
+        self.sorted_positions: np.ndarray = positions[self.order]
+        self.start: np.ndarray = np.zeros(self.cells**3 + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell, minlength=self.cells**3), out=self.start[1:])
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _queries(self, points: np.ndarray | None) -> tuple[np.ndarray, np.ndarray]:
+        # Query points and the index of the point each one is (-1 for none).
+        # The indexed points are queried in sorted order, so neighbouring
+        # queries read the same cells, and _unsort puts the results back.
+        if points is None:
+            return self.sorted_positions, self.order
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        return np.mod(points, self.box_size), np.full(len(points), -1, np.int64)
+
+    def _unsort(self, values: np.ndarray, points: np.ndarray | None) -> np.ndarray:
+        # Results of queries made by _queries, in the order of the points
+        if points is not None:
+            return values
+        unsorted: np.ndarray = np.empty_like(values)
+        unsorted[self.order] = values
+        return unsorted
+
+    def count_within(
+        self, radius: float, points: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Counts the points within a radius of each query point.
+
+        Args:
+            radius (float): Search radius
+            points (np.ndarray | None): Query points, shape (M, 3).
+                If None, every indexed point.
+
+        Returns:
+            np.ndarray: Number of points within the radius of each query point
+        """
+        queries, exclude = self._queries(points)
+        out: np.ndarray = np.empty(len(queries), dtype=np.int64)
+        _count_within(
+            queries,
+            exclude,
+            self.sorted_positions,
+            self.order,
+            self.start,
+            self.cells,
+            self.cell_size,
+            self.box_size,
+            radius,
+            out,
+        )
+        return self._unsort(out, points)
+
+    def nearest(
+        self, k: int = 1, points: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the k nearest points to each query point.
+
+        Args:
+            k (int): Number of neighbours
+            points (np.ndarray | None): Query points, shape (M, 3).
+                If None, every indexed point.
+
+        Returns:
+            np.ndarray: Distances, shape (M, k), nearest first
+            np.ndarray: Indices of the neighbours, shape (M, k)
+        """
+        if not 0 < k < len(self) + (points is not None):
+            raise ValueError("k must be positive and less than the number of points")
+        queries, exclude = self._queries(points)
+        distance_sq: np.ndarray = np.empty((len(queries), k), dtype=np.float64)
+        index: np.ndarray = np.empty((len(queries), k), dtype=np.int64)
+        _nearest(
+            queries,
+            exclude,
+            self.sorted_positions,
+            self.order,
+            self.start,
+            self.cells,
+            self.cell_size,
+            self.box_size,
+            distance_sq,
+            index,
+        )
+        np.sqrt(distance_sq, out=distance_sq)
+        return self._unsort(distance_sq, points), self._unsort(index, points)
+
+    def inverse_square_sum(
+        self,
+        radius: float,
+        weights: np.ndarray,
+        cap: float = np.inf,
+        points: np.ndarray | None = None,
+        scales: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """Sums weight / distance^2 over the points within a radius of each
+        query point, without listing the pairs.
+
+        Args:
+            radius (float): Search radius
+            weights (np.ndarray): Weight of each indexed point
+            cap (float): Largest contribution of a single point
+            points (np.ndarray | None): Query points, shape (M, 3).
+                If None, every indexed point.
+            scales (np.ndarray | None): Factor each point's capped
+                contribution is multiplied by, e.g. an importance weight.
+                If None, 1 for every point.
+
+        Returns:
+            np.ndarray: Sum for each query point
+        """
+        queries, exclude = self._queries(points)
+        out: np.ndarray = np.empty(len(queries), dtype=np.float64)
+        _inverse_square_sum(
+            queries,
+            exclude,
+            self.sorted_positions,
+            np.ascontiguousarray(weights, dtype=np.float64)[self.order],
+            (
+                np.ones(len(self.order))
+                if scales is None
+                else np.ascontiguousarray(scales, dtype=np.float64)[self.order]
+            ),
+            self.order,
+            self.start,
+            self.cells,
+            self.cell_size,
+            self.box_size,
+            radius,
+            cap,
+            out,
+        )
+        return self._unsort(out, points)
+
+    def pairs_within(self, radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Lists every pair of indexed points within a radius of each other,
+        once each. The pairs are counted first, so the output is allocated
+        at its exact size.
+
+        Args:
+            radius (float): Search radius
+
+        Returns:
+            np.ndarray: Index of the first point of each pair
+            np.ndarray: Index of the second point of each pair
+            np.ndarray: Distance between the points
+        """
+        counts: np.ndarray = np.empty(len(self), dtype=np.int64)
+        _pair_counts(
+            self.sorted_positions,
+            self.start,
+            self.cells,
+            self.cell_size,
+            self.box_size,
+            radius,
+            counts,
+        )
+        offsets: np.ndarray = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        first: np.ndarray = np.empty(offsets[-1], dtype=np.int64)
+        second: np.ndarray = np.empty(offsets[-1], dtype=np.int64)
+        distance: np.ndarray = np.empty(offsets[-1], dtype=np.float64)
+        _pair_fill(
+            self.sorted_positions,
+            self.order,
+            self.start,
+            self.cells,
+            self.cell_size,
+            self.box_size,
+            radius,
+            offsets,
+            first,
+            second,
+            distance,
+        )
+        return first, second, distance
@@ -0,0 +1,72 @@
+import numpy as np
+import constants
+from disk_calcs.disk import DiskCalcs
+from interaction_times.main import V_O
+from neighbourhood.field import StellarField
+from neighbourhood.grid import CellGrid
+from neighbourhood.plot import (
+    nearest_neighbour_histogram,
+    plot_nearest_neighbour_counts,
+)
+from neighbourhood.rates import encounter_rates, exchange_fractions, local_density
+from rendering import Renderer
+from rock_calcs.conversions import SECONDS_IN_MYR
+from run_store import RunStore, save_values
+from streaming.stats import SummaryStatistics
+
+# Radius of the neighbourhood searched around each star (pc). At the local
+# stellar density this holds about 50 other stars.
+NEIGHBOUR_RADIUS: float = 5.0
+
+
+def summarise(name: str, values: np.ndarray, weights: np.ndarray | None) -> None:
+    summary = SummaryStatistics()
+    summary.update(values, weights)
+    print(summary.format(name))
+
+
+def main(
+    stellar_mass: np.ndarray,
+    field: StellarField,
+    store: RunStore | None = None,
+    disk: DiskCalcs | None = None,
+    renderer: Renderer | None = None,
+    radius: float = NEIGHBOUR_RADIUS,
+    weights: np.ndarray | None = None,
+) -> None:
+    renderer = renderer or Renderer("serial")
+    if disk is None:
+        disk = DiskCalcs(stellar_mass)
+    radius_si: float = radius * constants.PC
+
+    print(f"Building spatial index of {field}...")
+    grid = CellGrid(field.positions, field.box_size)
+
+    print("Finding nearest neighbours...")
+    distances: np.ndarray = grid.nearest()[0][:, 0]
+    save_values("nearest_neighbour_distance", distances, "m", store)
+    summarise("Nearest neighbour distance (pc)", distances / constants.PC, weights)
+    if renderer.enabled:
+        print("Plotting nearest neighbour distances...")
+        renderer.submit(
+            plot_nearest_neighbour_counts,
+            *nearest_neighbour_histogram(distances),
+            field.density * constants.PC**3,
+        )
+
+    print(f"Counting neighbours within {radius} pc...")
+    density: np.ndarray = local_density(grid, radius_si)
+    save_values("local_stellar_density", density, "m^-3", store)
+    summarise("Local stellar density (pc^-3)", density * constants.PC**3, weights)
+
+    print("Calculating encounter rates...")
+    rates: np.ndarray = encounter_rates(density, stellar_mass, disk, V_O, weights)
+    save_values("encounter_rate", rates, "s^-1", store)
+    summarise("Disk-crossing encounters (Myr^-1)", rates * SECONDS_IN_MYR, weights)
+
+    print(f"Calculating rock exchange fractions within {radius} pc...")
+    side, top = exchange_fractions(grid, radius_si, stellar_mass, disk, V_O, weights)
+    save_values("exchange_fraction_side", side, "", store)
+    save_values("exchange_fraction_top", top, "", store)
+    summarise("Exchange fraction (side)", side, weights)
+    summarise("Exchange fraction (top)", top, weights)
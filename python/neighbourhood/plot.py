@@ -0,0 +1,52 @@
+import numpy as np
+import constants
+from helpers import get_base_dir, lazy_import
+
+plt = lazy_import("matplotlib.pyplot")
+
+
+def nearest_neighbour_histogram(
+    distances: np.ndarray, bins: int = 75
+) -> tuple[np.ndarray, np.ndarray]:
+    """Bins nearest neighbour distances into log-spaced bins spanning them.
+
+    Args:
+        distances (np.ndarray): Nearest neighbour distances (SI)
+        bins (int): Number of bins
+
+    Returns:
+        np.ndarray: Bin edges (pc)
+        np.ndarray: Number of stars in each bin
+    """
+    distances = distances / constants.PC
+    edges: np.ndarray = np.geomspace(np.min(distances), np.max(distances), bins + 1)
+    counts, _ = np.histogram(distances, bins=edges)
+    return edges, counts
+
+
+def plot_nearest_neighbour_counts(
+    edges: np.ndarray, counts: np.ndarray, density: float
+) -> None:
+    """Plots the nearest neighbour distance histogram against the distribution
+    for stars placed uniformly at the same mean density,
+    p(r) = 4 pi n r^2 exp(-4/3 pi n r^3).
+
+    Args:
+        edges (np.ndarray): Bin edges (pc)
+        counts (np.ndarray): Number of stars in each bin
+        density (float): Mean number density of stars (pc^-3)
+    """
+    centres: np.ndarray = np.sqrt(edges[:-1] * edges[1:])
+    uniform: np.ndarray = np.diff(-np.exp(-4 / 3 * np.pi * density * edges**3))
+
+    plt.figure()
+    plt.hist(edges[:-1], bins=edges, weights=counts, label="Sampled field")
+    plt.plot(centres, uniform * np.sum(counts), "k--", label="Uniform field")
+    plt.xscale("log")
+    plt.yscale("log")
+    plt.xlim(edges[0], edges[-1])
+    plt.xlabel("Nearest neighbour distance (pc)")
+    plt.ylabel("Frequency")
+    plt.legend()
+    plt.savefig(f"{get_base_dir()}/output/graphs/nearest_neighbour_histogram.png")
+    plt.close()
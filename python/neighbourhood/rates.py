@@ -0,0 +1,93 @@
+import numpy as np
+import constants
+from disk_calcs.disk import DiskCalcs
+from interaction_times.collision_times import disk_focusing_terms
+from neighbourhood.grid import CellGrid
+
+
+def local_density(grid: CellGrid, radius: float) -> np.ndarray:
+    """Estimates the number density of stars around each star from the
+    number of other stars within a radius.
+
+    Args:
+        grid (CellGrid): Index of the stellar positions
+        radius (float): Radius of the sphere the stars are counted in (SI)
+
+    Returns:
+        np.ndarray: Number density around each star (SI)
+    """
+    return grid.count_within(radius) / (4 / 3 * np.pi * radius**3)
+
+
+def encounter_rates(
+    density: np.ndarray,
+    stellar_mass: np.ndarray,
+    disk: DiskCalcs,
+    v_rel: float,
+    weights: np.ndarray | None = None,
+) -> np.ndarray:
+    """Finds the rate of stellar flybys passing through each star's disk.
+
+    A star of the local density passing at relative velocity v_rel
+    crosses the disk when its impact parameter is within the disk radius,
+    enlarged by gravitational focusing on the combined mass of the pair,
+    taking the mean stellar mass for the passing star:
+    rate = n * pi * R^2 * v * (1 + 2 G (m + <m>) / (R v^2)).
+
+    Args:
+        density (np.ndarray): Number density around each star (SI)
+        stellar_mass (np.ndarray): Stellar mass array (SI)
+        disk (DiskCalcs): Disk object of the same stars
+        v_rel (float): Relative velocity of the encounters (SI)
+        weights (np.ndarray | None): Importance weight of each star,
+            used for the mean stellar mass
+
+    Returns:
+        np.ndarray: Encounter rate of each star (s^-1)
+    """
+    disk_radius: np.ndarray = disk.get_reduced_radius()
+    pair_mass: np.ndarray = stellar_mass + np.average(stellar_mass, weights=weights)
+    focusing: np.ndarray = 2 * constants.G * pair_mass / (disk_radius * v_rel**2)
+    return density * np.pi * disk_radius**2 * v_rel * (1 + focusing)
+
+
+def exchange_fractions(
+    grid: CellGrid,
+    radius: float,
+    stellar_mass: np.ndarray,
+    disk: DiskCalcs,
+    v_rel: float,
+    weights: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Finds the fraction of rocks ejected from each star that hit the disk
+    of another star within a radius.
+
+    Rocks leave isotropically, so a disk of focused cross section C at
+    distance d catches a fraction C / (4 pi d^2) of them, capped at 1 for
+    the closest pairs. The fractions are summed over the neighbours by
+    the grid, without listing the pairs. With importance weights each
+    neighbour's fraction counts for its weight, so the sum stays
+    unbiased when massive stars are oversampled.
+
+    Args:
+        grid (CellGrid): Index of the stellar positions
+        radius (float): Largest distance to a neighbour (SI)
+        stellar_mass (np.ndarray): Stellar mass array (SI)
+        disk (DiskCalcs): Disk object of the same stars
+        v_rel (float): Velocity of the rocks relative to the stars (SI)
+        weights (np.ndarray | None): Importance weight of each star
+
+    Returns:
+        np.ndarray: Fraction caught by disks seen side-on, for each star
+        np.ndarray: Fraction caught by disks seen top-down, for each star
+    """
+    v_esc_sq, csa_sideview, csa_topview = disk_focusing_terms(disk, stellar_mass)
+    focusing: np.ndarray = 1 + v_esc_sq / v_rel**2
+    return (
+        grid.inverse_square_sum(
+            radius, csa_sideview * focusing / (4 * np.pi), 1.0, scales=weights
+        ),
+        grid.inverse_square_sum(
+            radius, csa_topview * focusing / (4 * np.pi), 1.0, scales=weights
+        ),
+    )
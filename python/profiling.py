@@ -0,0 +1,255 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Callable, Iterator
+
+from helpers import get_base_dir
+
+resource: ModuleType | None
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def current_rss_bytes() -> int | None:
+    """Returns the resident set size of this process, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes() -> int | None:
+    """Returns the peak resident set size of this process, or None if unknown."""
+    if resource is None:
+        return None
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Profiler:
+    """Collects per-stage timings, memory use and call counters for a run,
+    and writes them out as a JSON report.
+
+    Stages are timed with `stage()`. `instrument()` wraps functions
+    (for example those of the Rust extension, np.save or plt.savefig)
+    to count their calls and the time spent in them. When the profiler
+    is disabled every method is a cheap no-op.
+
+    Stages may run on several threads at once (see scheduler.run_stages).
+    Their start times are recorded so overlaps show in the report, but
+    memory is measured for the whole process, so the RSS figures of
+    overlapping stages include each other's allocations. The tracemalloc
+    peak is process-wide and reset when a stage starts, so it is only
+    recorded for stages that ran while no stage on another thread did,
+    and is None for the rest."""
+
+    def __init__(
+        self, enabled: bool = True, trace_memory: bool = True, cprofile: bool = False
+    ) -> None:
+        self.enabled: bool = enabled
+        self.trace_memory: bool = enabled and trace_memory
+        self.stages: list[dict] = []
+        self.calls: dict[str, dict[str, float]] = {}
+        self._originals: list[tuple[ModuleType, str, Callable]] = []
+        self._cprofile: cProfile.Profile | None = None
+        self._start: float = time.perf_counter()
+        # Stage nesting is tracked per thread, counters are shared
+        self._local: threading.local = threading.local()
+        self._lock: threading.Lock = threading.Lock()
+        # Running stages: [thread id, whether another thread ran a stage too]
+        self._running: dict[int, list] = {}
+
+        if self.trace_memory:
+            tracemalloc.start()
+        if enabled and cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Times the code inside the `with` block as one stage.
+        Stages can be nested; the depth is recorded in the report.
+
+        Args:
+            name (str): Name of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+
+        thread: int = threading.get_ident()
+        entry: list = [thread, False]
+        with self._lock:
+            for other in self._running.values():
+                if other[0] != thread:
+                    other[1] = entry[1] = True
+            self._running[id(entry)] = entry
+            if self.trace_memory and not entry[1]:
+                tracemalloc.reset_peak()
+        rss_before: int | None = current_rss_bytes()
+        wall_start: float = time.perf_counter()
+        cpu_start: float = time.process_time()
+        depth: int = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            with self._lock:
+                del self._running[id(entry)]
+            record: dict = {
+                "name": name,
+                "depth": depth,
+                "thread": threading.current_thread().name,
+                "start_s": wall_start - self._start,
+                "wall_s": time.perf_counter() - wall_start,
+                "cpu_s": time.process_time() - cpu_start,
+                "rss_before_bytes": rss_before,
+                "rss_after_bytes": current_rss_bytes(),
+                "peak_rss_bytes": peak_rss_bytes(),
+            }
+            if self.trace_memory:
+                record["traced_peak_bytes"] = (
+                    None if entry[1] else tracemalloc.get_traced_memory()[1]
+                )
+            self.stages.append(record)
+
+    def count(self, name: str, seconds: float = 0.0) -> None:
+        """Adds one call (and optionally its duration) to a counter.
+
+        Args:
+            name (str): Name of the counter
+            seconds (float): Time the call took
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            counter = self.calls.setdefault(name, {"calls": 0, "total_s": 0.0})
+            counter["calls"] += 1
+            counter["total_s"] += seconds
+
+    def instrument(self, module: ModuleType, names: list[str] | None = None) -> None:
+        """Counts and times calls to functions of a module.
+
+        Every loaded module holding a reference to one of the functions
+        is patched, so functions imported with `from module import name`
+        are counted too. Call `restore()` to undo this.
+
+        Args:
+            module (ModuleType): Module whose functions to instrument
+            names (list[str] | None): Functions to instrument. If None, every
+                public function defined in the module (not imported into it).
+        """
+        if not self.enabled:
+            return
+        if names is None:
+            names = [
+                name
+                for name, value in vars(module).items()
+                if callable(value)
+                and not isinstance(value, type)
+                and not name.startswith("_")
+                and getattr(value, "__module__", None) == module.__name__
+            ]
+
+        wrappers: dict[int, Callable] = {}
+        for name in names:
+            function: Callable = getattr(module, name)
+            wrappers[id(function)] = self._counted(
+                f"{module.__name__}.{name}", function
+            )
+
+        for loaded in list(sys.modules.values()):
+            for attribute, value in list(getattr(loaded, "__dict__", {}).items()):
+                if id(value) in wrappers:
+                    self._originals.append((loaded, attribute, value))
+                    setattr(loaded, attribute, wrappers[id(value)])
+
+    def _counted(self, name: str, function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start: float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.count(name, time.perf_counter() - start)
+
+        return wrapper
+
+    def restore(self) -> None:
+        """Undoes every `instrument()` call."""
+        for module, attribute, original in reversed(self._originals):
+            setattr(module, attribute, original)
+        self._originals.clear()
+
+    def report(self, top_functions: int = 30) -> dict:
+        """Returns everything collected so far.
+
+        Args:
+            top_functions (int): Number of cProfile entries to include,
+                sorted by cumulative time
+
+        Returns:
+            dict: JSON-serialisable report
+        """
+        report: dict = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "argv": sys.argv,
+            "total_wall_s": time.perf_counter() - self._start,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": self.stages,
+            "calls": self.calls,
+        }
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            stream = io.StringIO()
+            stats = pstats.Stats(self._cprofile, stream=stream)
+            stats.sort_stats("cumulative").print_stats(top_functions)
+            report["cprofile"] = stream.getvalue()
+            self._cprofile.enable()
+        return report
+
+    def write_report(self, path: str | None = None) -> str | None:
+        """Writes the report as JSON and, with cProfile enabled,
+        the raw profile next to it as a .prof file.
+
+        Args:
+            path (str | None): Where to write the report.
+                If None, output/profiles/<timestamp>.json.
+
+        Returns:
+            str | None: Path of the report, or None if the profiler is disabled
+        """
+        if not self.enabled:
+            return None
+        if path is None:
+            directory: str = f"{get_base_dir()}/output/profiles"
+            os.makedirs(directory, exist_ok=True)
+            path = f"{directory}/{time.strftime('%Y%m%d-%H%M%S')}.json"
+
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(os.path.splitext(path)[0] + ".prof")
+        return path
+
+    def close(self) -> None:
+        """Stops tracing and restores instrumented functions."""
+        self.restore()
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
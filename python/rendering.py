@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+import threading
+import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable
+
+from helpers import lazy_import
+
+matplotlib = lazy_import("matplotlib")
+
+RENDER_MODES: tuple[str, ...] = ("pool", "serial", "none")
+
+# Largest number of points handed to matplotlib for one line or scatter
+MAX_PLOT_POINTS: int = 2_000
+
+
+def _init_worker(rc_params: dict) -> None:
+    # Workers never open windows, and being spawned rather than forked
+    # they would otherwise start with the default style
+    matplotlib.use("Agg")
+    matplotlib.rcParams.update(rc_params)
+
+
+class Renderer:
+    """Runs the plotting functions of the pipeline.
+
+    Stages hand a plotting function and its (already reduced) data to
+    `submit()`. In "pool" mode the figures are drawn in worker processes,
+    so rendering overlaps with the Monte Carlo instead of blocking it.
+    "serial" draws each figure straight away on the calling thread, and
+    "none" skips plotting altogether for compute-only runs. pyplot is not
+    thread-safe, so serial figures submitted from concurrent stages are
+    drawn one at a time.
+
+    Arguments are pickled to the workers, so stages should pass histogram
+    counts or downsampled points (see downsample_sorted and bin_scatter)
+    rather than raw sample arrays.
+
+    Workers are spawned, not forked. They start on the first `submit()`,
+    after numba's TBB thread pool is running, and forking a process with
+    TBB threads makes the parent hang at exit.
+
+    Args:
+        mode (str): One of RENDER_MODES
+        max_workers (int | None): Number of worker processes in "pool" mode.
+            If None, up to 4, since there are only a handful of figures.
+    """
+
+    def __init__(self, mode: str = "pool", max_workers: int | None = None) -> None:
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode {mode}, expected {RENDER_MODES}")
+        self.mode: str = mode
+        self._futures: list[Future] = []
+        self._serial_lock: threading.Lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        if mode == "pool":
+            self._executor = ProcessPoolExecutor(
+                max_workers or min(4, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(dict(matplotlib.rcParams),),
+            )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether plots are drawn at all. Stages can skip preparing
+        plot data when this is False."""
+        return self.mode != "none"
+
+    def submit(self, function: Callable, *args, **kwargs) -> None:
+        """Draws a figure, now or in a worker depending on the mode.
+
+        Args:
+            function (Callable): Module-level plotting function
+            *args: Arguments of the function
+            **kwargs: Keyword arguments of the function
+        """
+        if self.mode == "none":
+            return
+        if self._executor is None:
+            with self._serial_lock:
+                function(*args, **kwargs)
+            return
+        self._futures.append(self._executor.submit(function, *args, **kwargs))
+
+    def wait(self) -> None:
+        """Waits for every submitted figure, re-raising the first error."""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        """Waits for the submitted figures and shuts the workers down."""
+        try:
+            self.wait()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self) -> "Renderer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def downsample_sorted(
+    values: np.ndarray, max_points: int = MAX_PLOT_POINTS
+) -> np.ndarray:
+    """Sorts values and keeps at most `max_points` evenly spaced order
+    statistics, always including the minimum and maximum.
+    A line through them is indistinguishable from one through every sample.
+
+    Args:
+        values (np.ndarray): Values to sort
+        max_points (int): Number of values to keep
+
+    Returns:
+        np.ndarray: Sorted, downsampled values
+    """
+    values = np.sort(values)
+    if len(values) <= max_points:
+        return values
+    return values[np.linspace(0, len(values) - 1, max_points).round().astype(np.int64)]
+
+
+def bin_scatter(columns: list[np.ndarray], resolution: int = 256) -> list[np.ndarray]:
+    """Density-bins a scatter plot by snapping every point onto a
+    `resolution`-per-axis grid and keeping one point per occupied cell.
+    At that resolution the plot looks the same, but matplotlib gets at
+    most one point per cell instead of every sample.
+
+    Columns with few distinct values (for example a colour key) are
+    binned on those values, so points of different groups are never merged
+    and the values come back exactly as they went in.
+
+    Args:
+        columns (list[np.ndarray]): Coordinates (and any per-point keys),
+            all of the same length
+        resolution (int): Number of grid cells per axis
+
+    Returns:
+        list[np.ndarray]: The columns for the occupied cells. Continuous
+            columns hold the mean of the points in each cell.
+    """
+    codes: np.ndarray = np.zeros(len(columns[0]), dtype=np.int64)
+    is_key: list[bool] = []
+    for column in columns:
+        # A continuous column shows many distinct values in its first few
+        # rows, which saves a full np.unique over it
+        is_key.append(len(np.unique(column[: 4 * resolution])) <= resolution)
+        if is_key[-1]:
+            distinct: np.ndarray = np.unique(column)
+            is_key[-1] = len(distinct) <= resolution
+        if is_key[-1]:
+            cell: np.ndarray = np.searchsorted(distinct, column)
+            cells: int = len(distinct)
+        else:
+            low, high = column.min(), column.max()
+            scale: float = (resolution - 1) / (high - low) if high > low else 0.0
+            cell = ((column - low) * scale).astype(np.int64)
+            cells = resolution
+        codes = codes * cells + cell
+
+    _, first, inverse, counts = np.unique(
+        codes, return_index=True, return_inverse=True, return_counts=True
+    )
+    return [
+        column[first] if key else np.bincount(inverse, weights=column) / counts
+        for column, key in zip(columns, is_key)
+    ]
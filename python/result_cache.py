@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+
+from helpers import get_base_dir
+
+
+def source_hash(*relative_paths: str) -> str:
+    """Hashes source files, so cached results are invalidated
+    when the code that produced them changes.
+
+    Args:
+        *relative_paths (str): Paths relative to the project base directory.
+            Files that do not exist are skipped.
+
+    Returns:
+        str: Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    for relative_path in sorted(relative_paths):
+        path: str = os.path.join(get_base_dir(), relative_path)
+        if os.path.isfile(path):
+            digest.update(relative_path.encode())
+            with open(path, "rb") as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+def array_hash(array: np.ndarray) -> str:
+    """Hashes the contents of an array, for use as a cache parameter.
+
+    Args:
+        array (np.ndarray): Array to hash
+
+    Returns:
+        str: Hex digest of the dtype, shape and data
+    """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha256(f"{array.dtype}{array.shape}".encode())
+    digest.update(array.reshape(-1).view(np.uint8).data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Content-addressed cache for the arrays produced by pipeline stages.
+
+    Each entry is a directory named after a hash of the stage name,
+    its parameters and the version of the code that produced it.
+    It holds one .npy file per array plus a meta.json describing the
+    entry. Arrays are loaded with memory mapping, so a cache hit costs
+    almost nothing until the data is read.
+
+    Entries older than `max_age_days` are removed, then the least recently
+    used entries are removed until the cache is under `max_bytes`.
+
+    Only the expensive, seeded results are cached: the stellar and rock
+    mass samples and the Earth and disk collision time tables. The other
+    stages are cheap next to them and always rerun on the loaded arrays,
+    so they still save their values and draw their plots."""
+
+    def __init__(
+        self,
+        directory: str | None = None,
+        max_bytes: int = 2 * 1024**3,
+        max_age_days: float = 30,
+    ) -> None:
+        self.directory: str = directory or f"{get_base_dir()}/output/cache"
+        self.max_bytes: int = max_bytes
+        self.max_age_days: float = max_age_days
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, stage: str, params: dict, code_version: str) -> str:
+        """Returns the key of a stage's result.
+
+        Args:
+            stage (str): Name of the stage
+            params (dict): JSON-serialisable parameters of the stage
+            code_version (str): Hash of the code the stage runs (see source_hash)
+
+        Returns:
+            str: Hex digest identifying the result
+        """
+        description: str = json.dumps(
+            {"stage": stage, "params": params, "code_version": code_version},
+            sort_keys=True,
+        )
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def get(
+        self, stage: str, params: dict, code_version: str
+    ) -> dict[str, np.ndarray] | None:
+        """Loads a stage's result if it is cached.
+
+        Returns:
+            dict[str, np.ndarray] | None: Read-only memory-mapped arrays,
+                or None on a cache miss
+        """
+        entry: str = os.path.join(self.directory, self.key(stage, params, code_version))
+        meta_path: str = os.path.join(entry, "meta.json")
+        if not os.path.isfile(meta_path):
+            return None
+
+        with open(meta_path) as file:
+            meta: dict = json.load(file)
+        os.utime(meta_path)  # Marks the entry as recently used
+        return {
+            name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="r")
+            for name in meta["arrays"]
+        }
+
+    def put(
+        self,
+        stage: str,
+        params: dict,
+        code_version: str,
+        arrays: dict[str, np.ndarray],
+    ) -> None:
+        """Stores a stage's result, then evicts old entries if needed.
+
+        Args:
+            stage (str): Name of the stage
+            params (dict): JSON-serialisable parameters of the stage
+            code_version (str): Hash of the code the stage runs
+            arrays (dict[str, np.ndarray]): Arrays produced by the stage
+        """
+        key: str = self.key(stage, params, code_version)
+        entry: str = os.path.join(self.directory, key)
+        # Unique per thread, since concurrent stages can store the same entry
+        partial: str = f"{entry}.partial{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(partial, exist_ok=True)
+
+        for name, array in arrays.items():
+            np.save(os.path.join(partial, f"{name}.npy"), array)
+        with open(os.path.join(partial, "meta.json"), "w") as file:
+            json.dump(
+                {
+                    "stage": stage,
+                    "params": params,
+                    "code_version": code_version,
+                    "arrays": list(arrays),
+                    "created": time.time(),
+                },
+                file,
+                indent=2,
+            )
+
+        # Renaming is atomic, so readers never see a half-written entry
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(partial, entry)
+        self.evict()
+
+    def get_or_compute(
+        self, stage: str, params: dict, code_version: str, compute
+    ) -> dict[str, np.ndarray]:
+        """Loads a stage's result, or computes and caches it on a miss.
+
+        Args:
+            stage (str): Name of the stage
+            params (dict): JSON-serialisable parameters of the stage
+            code_version (str): Hash of the code the stage runs
+            compute (Callable[[], dict[str, np.ndarray]]): Runs the stage
+
+        Returns:
+            dict[str, np.ndarray]: Arrays produced by the stage
+        """
+        cached = self.get(stage, params, code_version)
+        if cached is not None:
+            print(f"Loaded {stage} from cache")
+            return cached
+
+        arrays: dict[str, np.ndarray] = compute()
+        self.put(stage, params, code_version, arrays)
+        return arrays
+
+    def evict(self) -> None:
+        """Removes entries older than max_age_days, then the least recently
+        used entries until the cache is no larger than max_bytes."""
+        entries: list[tuple[float, int, str]] = []  # (last used, size, path)
+        for name in os.listdir(self.directory):
+            entry: str = os.path.join(self.directory, name)
+            meta_path: str = os.path.join(entry, "meta.json")
+            # Skips entries still being written by other threads
+            if ".partial" in name or not os.path.isfile(meta_path):
+                continue
+            size: int = sum(
+                os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry)
+            )
+            entries.append((os.path.getmtime(meta_path), size, entry))
+
+        oldest_allowed: float = time.time() - self.max_age_days * 24 * 60 * 60
+        total: int = sum(size for _, size, _ in entries)
+        for last_used, size, entry in sorted(entries):
+            if last_used >= oldest_allowed and total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -1,36 +1,133 @@
+import numba
 import numpy as np
 
+ROCK_DENSITY: float = 4 * 10 ** (-3) * 1 / (10 ** (-6))  # 4 g/cm^3 in SI units
+DAYS_IN_A_YEAR: float = (
+    365 + 0.25 - 0.01 + 0.0025 - 0.00025
+)  # 365.2425 days for Gregorian calendar
+SECONDS_IN_MYR: float = 10**6 * DAYS_IN_A_YEAR * 24 * 60 * 60
 
-def rock_mass_to_radius(rock_masses: np.ndarray) -> np.ndarray:
+# r^3 = RADIUS_CUBED_PER_MASS * m for a sphere of rock
+RADIUS_CUBED_PER_MASS: float = 3 / (4 * np.pi * ROCK_DENSITY)
+# t = LIFETIME_PER_RADIUS_SQUARED * r^2, i.e. 75 Myr per m^2
+LIFETIME_PER_RADIUS_SQUARED: float = 75 * SECONDS_IN_MYR
+
+# The kernels below are compiled by numba on first use (and cached on disk).
+# Each makes a single parallel pass over its input, writing straight into
+# the output array, so no temporaries the size of the input are allocated.
+# Module-level floats are frozen into the kernels as compile-time constants.
+
+
+@numba.njit(parallel=True, cache=True)
+def _mass_to_radius(masses: np.ndarray, out: np.ndarray) -> None:
+    for i in numba.prange(masses.size):
+        out[i] = np.cbrt(RADIUS_CUBED_PER_MASS * masses[i])
+
+
+@numba.njit(parallel=True, cache=True)
+def _radius_to_lifetime(radii: np.ndarray, out: np.ndarray) -> None:
+    for i in numba.prange(radii.size):
+        out[i] = LIFETIME_PER_RADIUS_SQUARED * radii[i] * radii[i]
+
+
+@numba.njit(parallel=True, cache=True)
+def _mass_to_lifetime(masses: np.ndarray, out: np.ndarray) -> None:
+    for i in numba.prange(masses.size):
+        radius: float = np.cbrt(RADIUS_CUBED_PER_MASS * masses[i])
+        out[i] = LIFETIME_PER_RADIUS_SQUARED * radius * radius
+
+
+def _apply(kernel, values: np.ndarray | float, out: np.ndarray | None) -> np.ndarray:
+    """Runs an elementwise kernel over an array of any shape.
+
+    Args:
+        kernel: Compiled kernel taking flat input and output arrays
+        values (np.ndarray | float): Input values
+        out (np.ndarray | None): Contiguous float64 array of the same shape
+            to write the results to. If None, a new array is returned.
+
+    Returns:
+        np.ndarray: out, or the new array (a float for scalar input)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not values.flags.c_contiguous:
+        values = np.ascontiguousarray(values)
+    if out is None:
+        out = np.empty_like(values)
+    elif (
+        out.shape != values.shape
+        or out.dtype != np.float64
+        or not out.flags.c_contiguous
+    ):
+        raise ValueError("out must be a contiguous float64 array of the input's shape")
+    kernel(values.reshape(-1), out.reshape(-1))
+    return out if out.ndim else out[()]
+
+
+def rock_mass_to_radius(
+    rock_masses: np.ndarray | float, out: np.ndarray | None = None
+) -> np.ndarray:
     """Converts rock masses to radii using rock density.
 
     Args:
-        rock_masses (np.ndarray): Rock mass array
+        rock_masses (np.ndarray | float): Rock mass array, or a single mass
+        out (np.ndarray | None): Array to write the radii to
 
     Returns:
         np.ndarray: Rock radii array
     """
-    rock_density_cgs = 4  # g/cm^3
-    rock_density = rock_density_cgs * 10 ** (-3) * 1 / (10 ** (-6))
-
-    return (3 * rock_masses / (4 * np.pi * rock_density)) ** (1 / 3)
+    return _apply(_mass_to_radius, rock_masses, out)
 
 
-def rock_radius_to_lifetime(rock_radii: np.ndarray) -> np.ndarray:
+def rock_radius_to_lifetime(
+    rock_radii: np.ndarray | float, out: np.ndarray | None = None
+) -> np.ndarray:
     """Converts rock radius to lifetime using the formula t = 75 * r^2.
     This comes from https://doi.org/10.1088/0004-637X/690/1/210.
 
     Args:
-        rock_radii (np.ndarray): Rock radii array
+        rock_radii (np.ndarray | float): Rock radii array, or a single radius
+        out (np.ndarray | None): Array to write the lifetimes to
+
+    Returns:
+        np.ndarray: Rock lifetime array (SI units)
+    """
+    return _apply(_radius_to_lifetime, rock_radii, out)
+
+
+def rock_mass_to_lifetime(
+    rock_masses: np.ndarray | float, out: np.ndarray | None = None
+) -> np.ndarray:
+    """Converts rock masses straight to lifetimes, without the radii.
+    Same as rock_radius_to_lifetime(rock_mass_to_radius(rock_masses)).
+
+    Args:
+        rock_masses (np.ndarray | float): Rock mass array, or a single mass
+        out (np.ndarray | None): Array to write the lifetimes to
 
     Returns:
-        np.ndarray: Rock lifetime array
+        np.ndarray: Rock lifetime array (SI units)
     """
-    t_myr = 75 * rock_radii**2
+    return _apply(_mass_to_lifetime, rock_masses, out)
 
-    days_in_a_year: float = (
-        365 + 0.25 - 0.01 + 0.0025 - 0.00025
-    )  # 365.2425 days for Gregorian calendar
 
-    t = t_myr * 10**6 * days_in_a_year * 24 * 60 * 60  # SI units
-    return t
+def rock_lifetime_curve(
+    mass_low: float, mass_upp: float, points: int = 2_000
+) -> tuple[np.ndarray, np.ndarray]:
+    """Evaluates the lifetime against radius curve on an even grid of radii.
+    The curve is monotone, so this draws the same line as sorting every
+    sampled radius and lifetime, without touching the samples.
+
+    Args:
+        mass_low (float): Smallest rock mass (kg)
+        mass_upp (float): Largest rock mass (kg)
+        points (int): Number of grid points
+
+    Returns:
+        np.ndarray: Rock radii (m)
+        np.ndarray: Rock lifetimes (SI units)
+    """
+    radii: np.ndarray = np.linspace(
+        rock_mass_to_radius(mass_low), rock_mass_to_radius(mass_upp), points
+    )
+    return radii, rock_radius_to_lifetime(radii)
@@ -1,45 +1,216 @@
 import numpy as np
 from rock_calcs.save_and_plot import (
     save_rock_dist,
-    plot_rock_dist,
+    rock_dist_bins,
+    rock_dist_counts,
+    plot_rock_dist_counts,
     save_rock_lifetimes,
     plot_rock_lifetimes,
     plot_lifetime_vs_coll_times,
+    summarise_rock_lifetimes,
+    extract_colltimes,
+    save_survival_fractions,
+    plot_survival_fractions,
 )
-from rust import get_rock_masses
-from rock_calcs.conversions import rock_mass_to_radius, rock_radius_to_lifetime
-from helpers import get_base_dir
+from rust import get_rock_masses, get_weighted_rock_masses, histogram_rock_masses
+from rock_calcs.conversions import rock_lifetime_curve, rock_mass_to_lifetime
+from rock_calcs.survival import SurvivalFunction
+from result_cache import ResultCache, source_hash
+from run_store import RunStore, save_values
+from rendering import MAX_PLOT_POINTS, Renderer
+from sampling import Sampling
+from streaming.stats import SummaryStatistics
+
+# Code that the sampled rock masses depend on
+SAMPLER_SOURCES: tuple[str, ...] = (
+    "rust/Cargo.toml",
+    "rust/src/lib.rs",
+    "rust/src/sampling.rs",
+    "rust/src/rock_dist.rs",
+)
+
+
+def get_rock_sample(
+    n: int = 100_000,
+    seed: int | None = None,
+    threads: int | None = None,
+    cache: ResultCache | None = None,
+    sampling: Sampling | None = None,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """Returns the rock masses and, with importance sampling, their weights.
+    See get_rock_dist.
+
+    Args:
+        n (int): Number of rock masses to sample
+        seed (int | None): Seed for the sampler
+        threads (int | None): Number of threads to sample on
+        cache (ResultCache | None): Cache to load the masses from or save them to
+        sampling (Sampling | None): How the masses are drawn.
+            If None, plain random sampling.
+
+    Returns:
+        np.ndarray: Rock mass array (SI)
+        np.ndarray | None: Weight of each rock, or None if unweighted
+    """
+    sampling = sampling or Sampling()
+
+    def sample() -> dict[str, np.ndarray]:
+        masses, weights = sampling.sample(
+            get_rock_masses, get_weighted_rock_masses, n, seed, threads
+        )
+        if weights is None:
+            return {"rock_mass": masses}
+        return {"rock_mass": masses, "weight": weights}
+
+    if cache is None or seed is None:
+        arrays: dict[str, np.ndarray] = sample()
+    else:
+        arrays = cache.get_or_compute(
+            "rock_masses",
+            {"n": n, "seed": seed, **sampling.params()},
+            source_hash(*SAMPLER_SOURCES),
+            sample,
+        )
+    return arrays["rock_mass"], arrays.get("weight")
 
 
-def get_rock_dist() -> np.ndarray:
+def get_rock_dist(
+    n: int = 100_000,
+    seed: int | None = None,
+    threads: int | None = None,
+    cache: ResultCache | None = None,
+    sampling: Sampling | None = None,
+) -> np.ndarray:
     """Returns the rock mass distribution.
     This function pulls the values from the Rust library.
     To see the Rust source code, look in the `rust/src` directory.
 
+    Args:
+        n (int): Number of rock masses to sample
+        seed (int | None): Seed for the sampler. If None, a random seed is used.
+        threads (int | None): Number of threads to sample on.
+            If None, all cores are used.
+        cache (ResultCache | None): Cache to load the masses from or save
+            them to. Only used when a seed is given.
+        sampling (Sampling | None): How the masses are drawn. If it is
+            weighted, use get_rock_sample to get the weights too.
+
     Returns:
         np.ndarray: Rock mass distribution.
     """
-    rock_masses: np.ndarray = np.array(get_rock_masses(), dtype=np.float64)
-    return rock_masses
-    # return np.load(f"{get_base_dir()}/output/values/rock_masses.npy")
+    return get_rock_sample(n, seed, threads, cache, sampling)[0]
+
+
+def get_rock_dist_histogram(
+    n: int,
+    seed: int | None = None,
+    threads: int | None = None,
+    strategy: str = "random",
+) -> np.ndarray:
+    """Returns the rock mass histogram of n rocks.
+    The masses are sampled and binned in the Rust library, so only the
+    counts are ever held in memory and n can be far larger than a run.
+
+    Args:
+        n (int): Number of rock masses to sample
+        seed (int | None): Seed for the sampler. If None, a random seed is used.
+        threads (int | None): Number of threads to sample on.
+            If None, all cores are used.
+        strategy (str): Sampling strategy (see sampling.STRATEGIES)
+
+    Returns:
+        np.ndarray: Number of rocks in each bin of rock_dist_bins()
+    """
+    print(f"Calculating rock mass histogram from {n} rock masses...")
+    return histogram_rock_masses(rock_dist_bins(), n, seed, threads, strategy)
 
 
-def main() -> None:
-    print("Calculating rock masses...")
-    rock_masses: np.ndarray = get_rock_dist()
+def main(
+    stellar_mass: np.ndarray | None = None,
+    n: int = 100_000,
+    seed: int | None = None,
+    threads: int | None = None,
+    cache: ResultCache | None = None,
+    store: RunStore | None = None,
+    renderer: Renderer | None = None,
+    counts: np.ndarray | None = None,
+    rock_masses: np.ndarray | None = None,
+    rock_weights: np.ndarray | None = None,
+    stellar_weights: np.ndarray | None = None,
+) -> None:
+    renderer = renderer or Renderer("serial")
+    if rock_masses is None:
+        print("Calculating rock masses...")
+        rock_masses = get_rock_dist(n, seed, threads, cache)
 
     print("Saving rock mass distribution...")
-    save_rock_dist(rock_masses)
-    print("Plotting rock mass distribution...")
-    plot_rock_dist(rock_masses)
+    save_rock_dist(rock_masses, store)
+    if rock_weights is not None:
+        save_values("rock_mass_weights", rock_weights, "", store)
+    if renderer.enabled:
+        print("Plotting rock mass distribution...")
+        bins: np.ndarray = rock_dist_bins()
+        if counts is None:
+            counts = rock_dist_counts(rock_masses, rock_weights)
+            max_rock_mass: float = np.max(rock_masses)
+        elif np.any(counts):
+            # Upper edge of the last occupied bin
+            max_rock_mass = bins[np.flatnonzero(counts)[-1] + 1]
+        else:
+            # Every draw fell outside the bins
+            max_rock_mass = bins[-1]
+        renderer.submit(plot_rock_dist_counts, bins, counts, max_rock_mass)
 
-    rock_radii = rock_mass_to_radius(rock_masses)
-    rock_lifetimes = rock_radius_to_lifetime(rock_radii)
+    print("Calculating rock lifetimes...")
+    rock_lifetimes: np.ndarray = rock_mass_to_lifetime(rock_masses)
 
     print("Saving rock lifetimes...")
-    save_rock_lifetimes(rock_lifetimes)
-    print("Plotting rock lifetimes...")
-    plot_rock_lifetimes(rock_radii, rock_lifetimes)
+    save_rock_lifetimes(rock_lifetimes, store)
+    if renderer.enabled:
+        print("Plotting rock lifetimes...")
+        # The lifetime rises monotonically with the radius, so the curve
+        # is evaluated on a grid rather than by sorting the samples
+        renderer.submit(
+            plot_rock_lifetimes,
+            *rock_lifetime_curve(
+                np.min(rock_masses), np.max(rock_masses), MAX_PLOT_POINTS
+            ),
+        )
+
+    coll_time_dfs = extract_colltimes(stellar_mass, cache=cache)
+    earth_df, side_df, top_df = coll_time_dfs
+
+    # The lifetimes are sorted once, then every (n_o, v_o) cell of the
+    # Earth and every (stellar mass, n_o, v_o) cell of the disks is a
+    # binary search into them
+    print("Calculating rock survival fractions...")
+    survival = SurvivalFunction.from_lifetimes(rock_lifetimes, weights=rock_weights)
+    for df in coll_time_dfs:
+        df["survival"] = survival(df["coll_time"].to_numpy())
+    print("Fraction of rocks outliving the Earth collision time:")
+    print(earth_df.to_string(index=False))
+    for name, df in (("Side", side_df), ("Top", top_df)):
+        print(f"Summary statistics for rock survival in Disk ({name}) collisions:")
+        if stellar_weights is None:
+            print(df["survival"].describe())
+            continue
+        # Rows are grouped by star, one per (n_o, v_o) pair
+        df["weight"] = np.repeat(stellar_weights, len(df) // len(stellar_weights))
+        summary = SummaryStatistics()
+        summary.update(df["survival"].to_numpy(), df["weight"].to_numpy())
+        print(summary.format("Surviving fraction"))
+
+    print("Saving rock survival fractions...")
+    save_survival_fractions(earth_df, side_df, top_df, store)
+    if renderer.enabled:
+        print("Plotting rock survival fractions...")
+        renderer.submit(plot_survival_fractions, earth_df)
 
     print("Plotting survival times vs coll times...")
-    plot_lifetime_vs_coll_times()
+    plot_lifetime_vs_coll_times(
+        stellar_mass,
+        summarise_rock_lifetimes(rock_lifetimes, rock_weights),
+        cache,
+        renderer,
+        coll_time_dfs,
+    )
@@ -1,10 +1,29 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
 import numpy as np
-import astropy.constants as astro_const
-import matplotlib.pyplot as plt
-import pandas as pd
-from helpers import get_base_dir, sig_figs
+import constants
+from helpers import get_base_dir, lazy_import, sig_figs
+from streaming.stats import SummaryStatistics
+from result_cache import ResultCache, array_hash, source_hash
+from run_store import RunStore, save_values
+from rendering import Renderer, bin_scatter
+from rock_calcs.conversions import SECONDS_IN_MYR
 import rust
 
+plt = lazy_import("matplotlib.pyplot")
+mpatches = lazy_import("matplotlib.patches")
+
+if TYPE_CHECKING:
+    # Only for the annotations, which stay strings at runtime
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+# Code that the collision time columns depend on
+COLL_TIME_SOURCES: tuple[str, ...] = ("rust/src/lib.rs", "rust/src/monte_carlo.rs")
+
 # All consts are in SI units
 M_MOON = 7.34767309e22
 M_LOW = 10
@@ -12,14 +31,42 @@ M_UPP = M_MOON
 R_MOON = 1.7371e6
 
 
-def save_rock_dist(rock_masses: np.ndarray) -> None:
-    """Saves the rock masses to a .npy file in the output/values directory.
+def save_rock_dist(rock_masses: np.ndarray, store: RunStore | None = None) -> None:
+    """Saves the rock masses to the run store,
+    or to a .npy file in the output/values directory if there is no store.
+
+    Args:
+        rock_masses (np.ndarray): Rock masses array
+        store (RunStore | None): Store of the current run
+    """
+    save_values("rock_masses", rock_masses, "kg", store)
+
+
+def rock_dist_bins() -> np.ndarray:
+    """Returns the bin edges of the rock mass histogram
+
+    Returns:
+        np.ndarray: Bin edges (kg)
+    """
+    return np.logspace(np.log10(M_LOW), np.log10(M_UPP), num=75)
+
+
+def rock_dist_counts(
+    rock_masses: np.ndarray, weights: np.ndarray | None = None
+) -> np.ndarray:
+    """Bins rock masses into the rock mass histogram bins
 
     Args:
         rock_masses (np.ndarray): Rock masses array
+        weights (np.ndarray | None): Importance weight of each rock
+
+    Returns:
+        np.ndarray: Number (or total weight) of rocks in each bin of rock_dist_bins()
     """
-    base_dir: str = get_base_dir()
-    np.save(f"{base_dir}/output/values/rock_masses.npy", rock_masses)
+    counts, _ = np.histogram(
+        rock_masses, bins=rock_dist_bins(), weights=weights
+    )  # / M_MOON
+    return counts
 
 
 def plot_rock_dist(rock_masses: np.ndarray) -> None:
@@ -28,16 +75,27 @@ def plot_rock_dist(rock_masses: np.ndarray) -> None:
     Args:
         rock_masses (np.ndarray): Rock masses array
     """
-    plt.figure()
-    bins: list[float] = list(np.logspace(np.log10(M_LOW), np.log10(M_UPP), num=75))
-    plt.hist(
-        rock_masses,  # / M_MOON,
-        bins=bins,
+    plot_rock_dist_counts(
+        rock_dist_bins(), rock_dist_counts(rock_masses), np.max(rock_masses)
     )
+
+
+def plot_rock_dist_counts(
+    bins: np.ndarray, counts: np.ndarray, max_rock_mass: float
+) -> None:
+    """Plots the rock mass distribution from counts that have already been binned
+
+    Args:
+        bins (np.ndarray): Bin edges (kg)
+        counts (np.ndarray): Number of rocks in each bin
+        max_rock_mass (float): Largest sampled rock mass (kg)
+    """
+    plt.figure()
+    plt.hist(bins[:-1], bins=bins, weights=counts)
     plt.yscale("log")
     plt.xscale("log")
-    plt.xlim(M_LOW, np.max(rock_masses))
-    print(f"MAX ROCK MASS: {np.max(rock_masses)}")
+    plt.xlim(M_LOW, max_rock_mass)
+    print(f"MAX ROCK MASS: {max_rock_mass}")
     plt.xlabel("Rock mass (kg)")
     plt.ylabel("Frequency")
     # plt.title("Rock Mass Distribution")
@@ -46,36 +104,34 @@ def plot_rock_dist(rock_masses: np.ndarray) -> None:
     plt.close()
 
 
-def save_rock_lifetimes(rock_lifetimes: np.ndarray) -> None:
-    """Saves the rock lifetimes to a .npy file in the output/values directory.
+def save_rock_lifetimes(
+    rock_lifetimes: np.ndarray, store: RunStore | None = None
+) -> None:
+    """Saves the rock lifetimes to the run store,
+    or to a .npy file in the output/values directory if there is no store.
 
     Args:
         rock_lifetimes (np.ndarray): Rock lifetimes array
+        store (RunStore | None): Store of the current run
     """
-    base_dir: str = get_base_dir()
-    np.save(f"{base_dir}/output/values/rock_lifetimes.npy", rock_lifetimes)
+    save_values("rock_lifetimes", rock_lifetimes, "s", store)
 
 
 def plot_rock_lifetimes(rock_radii: np.ndarray, rock_lifetimes: np.ndarray) -> None:
-    """Plots the rock lifetimes as a function of rock radius
+    """Plots the rock lifetimes as a function of rock radius.
+    Both arrays must already be sorted, as the curve from
+    conversions.rock_lifetime_curve is.
 
     Args:
         rock_radii (np.ndarray): Rock radii array
         rock_lifetimes (np.ndarray): Rock lifetime array
     """
-    days_in_a_year: float = 365 + 0.25 - 0.01 + 0.0025 - 0.00025
-
-    rock_lifetimes = np.sort(
-        rock_lifetimes
-    )  # Need to sort so matplotlib plots in order
-    rock_radii = np.sort(rock_radii)
-
     mask = np.where(rock_radii <= R_MOON)  # densities are very similar
 
     plt.figure()
     plt.plot(
         rock_radii[mask],
-        rock_lifetimes[mask] / (10**6 * days_in_a_year * 24 * 60 * 60),
+        rock_lifetimes[mask] / SECONDS_IN_MYR,
     )
     # plot horizontal line showing the age of the universe
     age_of_universe_myr = 13.787e3
@@ -98,86 +154,166 @@ def plot_rock_lifetimes(rock_radii: np.ndarray, rock_lifetimes: np.ndarray) -> N
     plt.close()
 
 
-def extract_colltimes() -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    # earth_coll_times is a dictionary of a dictionary.
-    # The first key is n_o, the second key is v_o.
-    # The value is the collision time.
-    earth_coll_times = rust.return_coll_times()[0]
+def summarise_rock_lifetimes(
+    rock_lifetimes: np.ndarray, weights: np.ndarray | None = None
+) -> SummaryStatistics:
+    """Summarises rock lifetimes without keeping the samples.
+
+    Args:
+        rock_lifetimes (np.ndarray): Rock lifetime array (SI)
+        weights (np.ndarray | None): Importance weight of each rock
+
+    Returns:
+        SummaryStatistics: Summary of the rock lifetimes in Myr
+    """
+    summary = SummaryStatistics()
+    summary.update(rock_lifetimes / SECONDS_IN_MYR, weights)
+    return summary
+
 
-    # n_o_keys_earth = earth_coll_times.keys()
-    # v_o_keys_earth = earth_coll_times[list(n_o_keys_earth)[0]].keys()
-    # collision_times_earth_forloop = []
-    # for n_o in n_o_keys_earth:
-    #     for v_o in v_o_keys_earth:
-    #         collision_times_earth_forloop.append(earth_coll_times[n_o][v_o])
+def save_survival_fractions(
+    earth_df: pd.DataFrame,
+    side_df: pd.DataFrame,
+    top_df: pd.DataFrame,
+    store: RunStore | None = None,
+) -> None:
+    """Saves the fraction of rocks outliving each collision time, row for row
+    with the collision time tables, to the run store,
+    or to .npy files in the output/values directory if there is no store.
+
+    Args:
+        earth_df (pd.DataFrame): Earth collision times, with a survival column
+        side_df (pd.DataFrame): Disk (side) collision times, with a survival column
+        top_df (pd.DataFrame): Disk (top) collision times, with a survival column
+        store (RunStore | None): Store of the current run
+    """
+    for name, df in (
+        ("earth", earth_df),
+        ("disk_sideon", side_df),
+        ("disk_topdown", top_df),
+    ):
+        save_values(f"survival_fraction_{name}", df["survival"].to_numpy(), "", store)
+
+
+def plot_survival_fractions(earth_df: pd.DataFrame) -> None:
+    """Plots the fraction of rocks outliving the Earth collision time
+    against v_o, with one line per n_o.
+
+    Args:
+        earth_df (pd.DataFrame): Earth collision times, with a survival column
+    """
+    plt.figure()
+    for n_o, group in earth_df.groupby("n_o"):
+        group = group.sort_values("v_o")
+        plt.plot(
+            group["v_o"] / 1e3,
+            group["survival"],
+            marker="o",
+            label=f"n$_o$ = {sig_figs(n_o * constants.AU**3, 1)} AU$^{{-3}}$",
+        )
+    plt.yscale("log")
+    plt.xlabel("v$_o$ (km/s)")
+    plt.ylabel("Fraction of rocks outliving $\\tau$ for Earth")
+    plt.legend()
+    plt.savefig(get_base_dir() + "/output/graphs/survival_fraction_earth.png")
+    plt.close()
+
+
+def flatten_coll_time_columns(
+    earth_columns: dict[str, np.ndarray], disk_columns: dict[str, np.ndarray]
+) -> dict[str, np.ndarray]:
+    """Merges the Earth and disk columns into one dictionary for caching,
+    prefixing the names with "earth_" and "disk_".
+    """
+    return {
+        **{f"earth_{name}": array for name, array in earth_columns.items()},
+        **{f"disk_{name}": array for name, array in disk_columns.items()},
+    }
+
+
+def extract_colltimes(
+    stellar_mass: np.ndarray | None = None,
+    n_o: list[float] | None = None,
+    v_o: list[float] | None = None,
+    cache: ResultCache | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Runs the collision time Monte Carlo once and splits the result
+    into Earth, disk (side) and disk (top) tables.
+
+    Args:
+        stellar_mass (np.ndarray | None): Stellar mass array (SI) to use.
+            If None, the Rust library draws its own sample.
+        n_o (list[float] | None): Number densities to use (AU^-3).
+            If None, the Rust library's default grid is used.
+        v_o (list[float] | None): Velocities to use (km/s).
+            If None, the Rust library's default grid is used.
+        cache (ResultCache | None): Cache for the collision time columns.
+            Only used when stellar_mass is given, since the columns are keyed
+            by a hash of the stellar masses.
+
+    Returns:
+        pd.DataFrame: Earth collision times
+        pd.DataFrame: Disk (side) collision times
+        pd.DataFrame: Disk (top) collision times
+    """
+    # earth_columns and disk_columns are dictionaries of flat NumPy arrays.
+    # Row i of every array in a dictionary belongs to the same
+    # (n_o, v_o) or (stellar mass, n_o, v_o) combination.
+    if stellar_mass is not None:
+        stellar_mass = np.ascontiguousarray(stellar_mass, dtype=np.float64)
+
+    if cache is None or stellar_mass is None:
+        earth_columns, disk_columns = rust.return_coll_time_columns(
+            stellar_mass, n_o, v_o
+        )
+    else:
+        columns = cache.get_or_compute(
+            "coll_time_columns",
+            {"stellar_mass": array_hash(stellar_mass), "n_o": n_o, "v_o": v_o},
+            source_hash(*COLL_TIME_SOURCES),
+            lambda: flatten_coll_time_columns(
+                *rust.return_coll_time_columns(stellar_mass, n_o, v_o)
+            ),
+        )
+        earth_columns = {
+            name.removeprefix("earth_"): array
+            for name, array in columns.items()
+            if name.startswith("earth_")
+        }
+        disk_columns = {
+            name.removeprefix("disk_"): array
+            for name, array in columns.items()
+            if name.startswith("disk_")
+        }
 
     earth_df = pd.DataFrame(
-        [
-            (n_o, v_o, time)
-            for n_o, v_o_dict in earth_coll_times.items()
-            for v_o, time in v_o_dict.items()
-        ],
-        columns=["n_o", "v_o", "coll_time"],
+        {
+            "n_o": earth_columns["n_o"],
+            "v_o": earth_columns["v_o"],
+            "coll_time": earth_columns["coll_time"],
+        }
     )
     print("Summary statistics for Earth Monte Carlo:")
     print(earth_df.describe())
 
-    # disk_coll_times_side is a dictionary of a dictionary of a dictionary.
-    # The first key is a stellar mass, the second key is n_o, the third key is v_o.
-    # The value is the collision time.
-    disk_coll_times_side = rust.return_coll_times()[1]
-
-    # stellar_keys_side = disk_coll_times_side.keys()
-    # n_o_keys_side = disk_coll_times_side[list(stellar_keys_side)[0]].keys()
-    # v_o_keys_side = disk_coll_times_side[list(stellar_keys_side)[0]][
-    #     list(n_o_keys_side)[0]
-    # ].keys()
-    # collision_times_disk_side = []
-    # for stellar_mass in stellar_keys_side:
-    #     for n_o in n_o_keys_side:
-    #         for v_o in v_o_keys_side:
-    #             collision_times_disk_side.append(
-    #                 disk_coll_times_side[stellar_mass][n_o][v_o]
-    #             )
-
     side_df = pd.DataFrame(
-        [
-            (stellar_mass, n_o, v_o, time)
-            for stellar_mass, n_o_dict in disk_coll_times_side.items()
-            for n_o, v_o_dict in n_o_dict.items()
-            for v_o, time in v_o_dict.items()
-        ],
-        columns=["stellar_mass", "n_o", "v_o", "coll_time"],
+        {
+            "stellar_mass": disk_columns["stellar_mass"],
+            "n_o": disk_columns["n_o"],
+            "v_o": disk_columns["v_o"],
+            "coll_time": disk_columns["coll_time_side"],
+        }
     )
     print("Summary statistics for Disk (Side) Monte Carlo:")
     print(side_df.describe())
 
-    # disk_coll_times_top is a dictionary of a dictionary of a dictionary.
-    # The first key is a stellar mass, the second key is n_o, the third key is v_o.
-    # The value is the collision time.
-    disk_coll_times_top = rust.return_coll_times()[2]
-
-    # stellar_keys_top = disk_coll_times_top.keys()
-    # n_o_keys_top = disk_coll_times_top[list(stellar_keys_top)[0]].keys()
-    # v_o_keys_top = disk_coll_times_top[list(stellar_keys_top)[0]][
-    #     list(n_o_keys_top)[0]
-    # ].keys()
-    # collision_times_disk_top = []
-    # for stellar_mass in stellar_keys_top:
-    #     for n_o in n_o_keys_top:
-    #         for v_o in v_o_keys_top:
-    #             collision_times_disk_top.append(
-    #                 disk_coll_times_top[stellar_mass][n_o][v_o]
-    #             )
-
     top_df = pd.DataFrame(
-        [
-            (stellar_mass, n_o, v_o, time)
-            for stellar_mass, n_o_dict in disk_coll_times_top.items()
-            for n_o, v_o_dict in n_o_dict.items()
-            for v_o, time in v_o_dict.items()
-        ],
-        columns=["stellar_mass", "n_o", "v_o", "coll_time"],
+        {
+            "stellar_mass": disk_columns["stellar_mass"],
+            "n_o": disk_columns["n_o"],
+            "v_o": disk_columns["v_o"],
+            "coll_time": disk_columns["coll_time_top"],
+        }
     )
     print("Summary statistics for Disk (Top) Monte Carlo:")
     print(top_df.describe())
@@ -185,14 +321,16 @@ def extract_colltimes() -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     return earth_df, side_df, top_df
 
 
-def earth_lifetime_coll_time_plot(earth_df, colors) -> None:
+def earth_lifetime_coll_time_plot(
+    earth_df, colors, rock_lifetime_summary: SummaryStatistics | None = None
+) -> None:
     v_o_full = np.unique(earth_df["v_o"])
     n_o_full = np.unique(earth_df["n_o"])
 
     plt.figure()
     plt.yticks(
         v_o_full,  # Positions
-        [1, 5, 10, 20, 30],  # Labels (v_o in km/s)
+        [f"{v_o / 1e3:g}" for v_o in v_o_full],  # Labels (v_o in km/s)
     )
     plt.xlabel("$\\tau$ for Earth (Myr)")
     plt.ylabel("v$_o$ (km/s)")
@@ -207,39 +345,37 @@ def earth_lifetime_coll_time_plot(earth_df, colors) -> None:
                 plt.scatter(
                     coll_times / (10**6 * 365.25 * 24 * 60 * 60),
                     v_o_full[i],
-                    color=colors[j],
-                    label=f"n$_o$ = {sig_figs(n_o * astro_const.au.value**3, 1)} AU$^{{-3}}$",
+                    color=colors[j % len(colors)],
+                    label=f"n$_o$ = {sig_figs(n_o * constants.AU**3, 1)} AU$^{{-3}}$",
                 )
             plt.scatter(
                 coll_times / (10**6 * 365.25 * 24 * 60 * 60),
                 v_o_full[i],
-                color=colors[j],
+                color=colors[j % len(colors)],
             )
     # Plot dotted line that represents maximum rock survival time
-    rock_survival_times = np.load(f"{get_base_dir()}/output/values/rock_lifetimes.npy")
+    if rock_lifetime_summary is None:
+        rock_lifetime_summary = summarise_rock_lifetimes(
+            np.load(f"{get_base_dir()}/output/values/rock_lifetimes.npy")
+        )
 
     print("Summary statistics for rock survival times:")
-    disk_sideon_df = pd.DataFrame(
-        rock_survival_times / (365.25 * 24 * 60 * 60 * 10**6),
-        columns=["Survival Time (Myr)"],
-    )
-    print(disk_sideon_df.describe())
-    print(f"median: {disk_sideon_df.median()}")
+    print(rock_lifetime_summary.format("Survival Time (Myr)"))
 
     plt.axvline(
-        x=np.max(rock_survival_times) / (10**6 * 365.25 * 24 * 60 * 60),
+        x=rock_lifetime_summary.max,
         color="black",
         linestyle="--",
         label="Maximum rock survival time",
     )
     plt.axvline(
-        np.median(rock_survival_times) / (10**6 * 365.25 * 24 * 60 * 60),
+        rock_lifetime_summary.median(),
         color="orange",
         linestyle="--",
         label="Median rock survival time",
     )
     plt.axvline(
-        np.min(rock_survival_times) / (10**6 * 365.25 * 24 * 60 * 60),
+        rock_lifetime_summary.min,
         color="purple",
         linestyle="--",
         label="Minimum rock survival time",
@@ -254,31 +390,56 @@ def earth_lifetime_coll_time_plot(earth_df, colors) -> None:
 
     plt.xscale("log")
     plt.savefig(get_base_dir() + "/output/graphs/lifetime_vs_coll_times.png")
+    plt.close()
 
 
-import matplotlib.patches as mpatches
+def disk_scatter_points(disk_df) -> list[np.ndarray]:
+    """Density-bins the points of the 3-D disk scatter plot,
+    which would otherwise hold a point for every row of disk_df.
+
+    Args:
+        disk_df (pd.DataFrame): Disk (side or top) collision times
+
+    Returns:
+        list[np.ndarray]: log10 collision time (Myr), v_o (km/s),
+            stellar mass and n_o of the binned points
+    """
+    return bin_scatter(
+        [
+            np.log10(disk_df["coll_time"].to_numpy() / SECONDS_IN_MYR),
+            disk_df["v_o"].to_numpy() / 1e3,
+            disk_df["stellar_mass"].to_numpy(),
+            disk_df["n_o"].to_numpy(),
+        ]
+    )
 
 
 def disk_lifetime_coll_time_plot(disk_df, colors, view) -> None:
-    n_o_full = np.unique(disk_df["n_o"])
+    disk_lifetime_coll_time_plot_points(*disk_scatter_points(disk_df), colors, view)
+
+
+def disk_lifetime_coll_time_plot_points(
+    log_coll_time, v_o, stellar_mass, n_o, colors, view
+) -> None:
+    n_o_full = np.unique(n_o)
 
     fig = plt.figure()
     ax = fig.add_subplot(projection="3d")
 
-    color_dict = {n_o: colors[i] for i, n_o in enumerate(n_o_full)}
-    color_values = disk_df["n_o"].map(color_dict)
+    color_dict = {n_o: colors[i % len(colors)] for i, n_o in enumerate(n_o_full)}
+    color_values = [color_dict[value] for value in n_o]
 
     ax.scatter(
-        np.log10(disk_df["coll_time"] / (10**6 * 365.25 * 24 * 60 * 60)),
-        disk_df["v_o"] / 1e3,
-        disk_df["stellar_mass"],
+        log_coll_time,
+        v_o,
+        stellar_mass,
         c=color_values,
     )
 
     patches = [
         mpatches.Patch(
             color=color,
-            label=f"n$_o$ = {sig_figs(n_o * astro_const.au.value**3, 1)} AU$^{{-3}}$",
+            label=f"n$_o$ = {sig_figs(n_o * constants.AU**3, 1)} AU$^{{-3}}$",
         )
         for n_o, color in color_dict.items()
     ]
@@ -290,12 +451,23 @@ def disk_lifetime_coll_time_plot(disk_df, colors, view) -> None:
     plt.savefig(
         f"{get_base_dir()}/output/graphs/lifetime_vs_coll_times_disk_{view}.png",
     )
-    
+
     plt.close()
 
 
-def plot_lifetime_vs_coll_times() -> None:
-    earth_df, side_df, top_df = extract_colltimes()
+def plot_lifetime_vs_coll_times(
+    stellar_mass: np.ndarray | None = None,
+    rock_lifetime_summary: SummaryStatistics | None = None,
+    cache: ResultCache | None = None,
+    renderer: Renderer | None = None,
+    coll_time_dfs: tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame] | None = None,
+) -> None:
+    renderer = renderer or Renderer("serial")
+    if coll_time_dfs is None:
+        coll_time_dfs = extract_colltimes(stellar_mass, cache=cache)
+    earth_df, side_df, top_df = coll_time_dfs
+    if not renderer.enabled:
+        return
 
     colors = [
         "#000000",
@@ -305,6 +477,13 @@ def plot_lifetime_vs_coll_times() -> None:
         "#F0E442",
     ]  # Colour-blind-friendly colours
 
-    earth_lifetime_coll_time_plot(earth_df, colors)
-    disk_lifetime_coll_time_plot(side_df, colors, "side")
-    disk_lifetime_coll_time_plot(top_df, colors, "top")
+    renderer.submit(
+        earth_lifetime_coll_time_plot, earth_df, colors, rock_lifetime_summary
+    )
+    for disk_df, view in ((side_df, "side"), (top_df, "top")):
+        renderer.submit(
+            disk_lifetime_coll_time_plot_points,
+            *disk_scatter_points(disk_df),
+            colors,
+            view,
+        )
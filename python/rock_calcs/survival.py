@@ -0,0 +1,127 @@
+import numpy as np
+
+# Number of collision times looked up at once, which bounds the
+# temporary arrays of a lookup whatever the number of stars
+QUERY_CHUNK: int = 1 << 22
+
+
+class SurvivalFunction:
+    """Fraction of rocks whose lifetime exceeds a given time.
+
+    The rock lifetimes are sorted once, into a step function of the number
+    of rocks with a lifetime at most t. Each collision time is then looked
+    up by binary search, so evaluating M collision times against N rocks
+    costs O((N + M) log N) rather than the O(N * M) of comparing every
+    rock with every collision time.
+
+    The step function may be exact (every sorted lifetime) or compressed
+    to fewer points (see from_lifetimes), which bounds the memory used
+    for 10^8 rocks or more. With importance weights the
+    step function counts total weight rather than rocks.
+
+    Args:
+        lifetimes (np.ndarray): Sorted lifetimes where the step function rises
+        cumulative (np.ndarray | None): Number (or total weight) of rocks with
+            a lifetime at most each of `lifetimes`. If None, each lifetime
+            is one rock.
+        count (float | None): Total number (or weight) of rocks, which must be
+            positive. If None, the last value of `cumulative`, or the number
+            of lifetimes.
+    """
+
+    def __init__(
+        self,
+        lifetimes: np.ndarray,
+        cumulative: np.ndarray | None = None,
+        count: float | None = None,
+    ) -> None:
+        self.lifetimes: np.ndarray = np.asarray(lifetimes, dtype=np.float64)
+        self.cumulative: np.ndarray | None = cumulative
+        if count is None:
+            if cumulative is None:
+                count = len(self.lifetimes)
+            else:
+                count = cumulative[-1] if len(cumulative) else 0
+        if count <= 0:
+            raise ValueError("count must be positive (no rocks, or zero total weight)")
+        self.count: float = float(count)
+        # Number of rocks at or below each step, indexed by the result of
+        # a binary search (0 for times below the first step)
+        self._dead: np.ndarray | None = None
+        if cumulative is not None:
+            self._dead = np.concatenate(([0], cumulative))
+
+    @classmethod
+    def from_lifetimes(
+        cls,
+        rock_lifetimes: np.ndarray,
+        resolution: int | None = None,
+        weights: np.ndarray | None = None,
+    ) -> "SurvivalFunction":
+        """Builds the survival function of sampled rock lifetimes.
+
+        Args:
+            rock_lifetimes (np.ndarray): Rock lifetimes (SI), in any order
+            resolution (int | None): If given, only keep this many evenly
+                spaced order statistics. Fractions are then within
+                1 / resolution of the exact ones.
+            weights (np.ndarray | None): Importance weight of each rock
+
+        Returns:
+            SurvivalFunction: Survival function of the lifetimes
+        """
+        if weights is None:
+            return cls._from_sorted(np.sort(np.ravel(rock_lifetimes)), resolution)
+        order: np.ndarray = np.argsort(np.ravel(rock_lifetimes))
+        return cls._from_sorted(
+            np.ravel(rock_lifetimes)[order],
+            resolution,
+            np.cumsum(np.ravel(weights)[order]),
+        )
+
+    @classmethod
+    def _from_sorted(
+        cls,
+        lifetimes: np.ndarray,
+        resolution: int | None,
+        cumulative: np.ndarray | None = None,
+    ) -> "SurvivalFunction":
+        # cumulative is the running total weight of the sorted lifetimes
+        if resolution is None or resolution >= len(lifetimes):
+            return cls(lifetimes, cumulative)
+        ranks: np.ndarray = np.unique(
+            np.linspace(0, len(lifetimes) - 1, resolution).round().astype(np.int64)
+        )
+        if cumulative is None:
+            return cls(lifetimes[ranks], ranks + 1, len(lifetimes))
+        return cls(lifetimes[ranks], cumulative[ranks], cumulative[-1])
+
+    def __call__(
+        self, coll_times: np.ndarray, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Returns the fraction of rocks whose lifetime exceeds each collision time.
+
+        Args:
+            coll_times (np.ndarray): Collision times (SI), of any shape
+            out (np.ndarray | None): Float array of the same shape
+                to write the fractions to
+
+        Returns:
+            np.ndarray: Surviving fraction for each collision time
+        """
+        coll_times = np.asarray(coll_times, dtype=np.float64)
+        if out is None:
+            out = np.empty(coll_times.shape, dtype=np.float64)
+        elif out.shape != coll_times.shape or not out.flags.c_contiguous:
+            raise ValueError("out must be a contiguous array of coll_times' shape")
+        flat_times: np.ndarray = coll_times.reshape(-1)
+        flat_out: np.ndarray = out.reshape(-1)
+        for start in range(0, flat_times.size, QUERY_CHUNK):
+            end: int = start + QUERY_CHUNK
+            # Number of steps at or below each collision time
+            steps: np.ndarray = np.searchsorted(
+                self.lifetimes, flat_times[start:end], side="right"
+            )
+            dead: np.ndarray = steps if self._dead is None else self._dead[steps]
+            flat_out[start:end] = 1 - dead / self.count
+        return out
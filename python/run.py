@@ -1,12 +1,290 @@
-import matplotlib
+import argparse
+import os
+import numba
+import numpy as np
 import time
 import imf.main as imf
 import disk_calcs.main as disk
 import interaction_times.main as interaction_times
-from imf.main import get_stellar_mass_array
+from imf.main import get_stellar_mass_sample
 import rock_calcs.main as rock_calcs
+from disk_calcs.disk import DiskCalcs
+import streaming.main as streaming
+import neighbourhood.main as neighbourhood
+from neighbourhood.field import FIELD_KINDS, LOCAL_STELLAR_DENSITY, StellarField
+import capture.main as capture
+from capture.velocities import ELLIPSOID_DISPERSION, VELOCITY_KINDS, VelocityEllipsoid
+from streaming.convergence import (
+    METHODS,
+    MIN_BATCHES,
+    ConvergenceMonitor,
+    Target,
+    write_report,
+)
+from result_cache import ResultCache
+from run_store import RunStore, new_run_dir
+from profiling import Profiler
+from scheduler import Stage, run_stages
+from rendering import RENDER_MODES, Renderer
+from sampling import STRATEGIES, TAIL_INDEX, Sampling
+from helpers import lazy_import
+import rust
+from imf import plot_and_save as imf_plot_and_save
+from disk_calcs import plot as disk_plot
+from interaction_times import collision_times
+from rock_calcs import conversions as rock_conversions
+from rock_calcs import save_and_plot as rock_save_and_plot
+from neighbourhood import rates as neighbourhood_rates
+
+# Only imported by runs that plot, since matplotlib is slow to import
+matplotlib = lazy_import("matplotlib")
+plt = lazy_import("matplotlib.pyplot")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Panspermia in the Sun's locale")
+    parser.add_argument(
+        "--runs", type=int, default=100_000, help="Number of stars and rocks to sample"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for the Rust samplers. With --store, one is drawn and "
+        "recorded if not given",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of threads for the Rust samplers (default: all cores)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Resample the masses and recompute the collision times instead of "
+        "loading seeded results from the cache",
+    )
+    parser.add_argument(
+        "--cache-max-gb",
+        type=float,
+        default=2,
+        help="Size above which the least recently used cache entries are removed",
+    )
+    parser.add_argument(
+        "--store",
+        action="store_true",
+        help="Save values to a run store in output/runs instead of output/values",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Process samples in chunks, keeping only summary statistics in memory",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1 << 20,
+        help="Number of samples per chunk in --stream and --capture-draws modes",
+    )
+    parser.add_argument(
+        "--target",
+        action="append",
+        default=[],
+        metavar="QUANTITY.STATISTIC=REL_ERROR",
+        help="Stream batches until this statistic is known to this relative "
+        "error, e.g. coll_time_side.50%%=0.01 (repeatable). --runs is then "
+        "the most stars and rocks sampled, and --chunk-size the batch size",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level of the --target intervals",
+    )
+    parser.add_argument(
+        "--convergence-method",
+        choices=METHODS,
+        default="batch-means",
+        help="How the --target intervals are found from the batch statistics",
+    )
+    parser.add_argument(
+        "--min-batches",
+        type=int,
+        default=20,
+        help="Fewest batches before a --target counts as met "
+        f"(at least {MIN_BATCHES})",
+    )
+    parser.add_argument(
+        "--sampling",
+        choices=STRATEGIES,
+        default="random",
+        help="How the uniform points fed to the mass samplers are drawn: "
+        "independently, one per stratum, or from a scrambled Sobol or "
+        "Halton sequence",
+    )
+    parser.add_argument(
+        "--tail-fraction",
+        type=float,
+        default=None,
+        help="Draw this fraction of the stars and rocks from a density "
+        "favouring the most massive ones, and weight every sample (e.g. 0.5)",
+    )
+    parser.add_argument(
+        "--tail-index",
+        type=float,
+        default=TAIL_INDEX,
+        help="Steepness of the --tail-fraction density, in [0, 1)",
+    )
+    parser.add_argument(
+        "--field",
+        choices=("none",) + FIELD_KINDS,
+        default="none",
+        help="Place the stars in 3-D, uniformly or in clusters, and find their "
+        "nearest neighbours, encounter rates and rock exchange fractions",
+    )
+    parser.add_argument(
+        "--stellar-density",
+        type=float,
+        default=LOCAL_STELLAR_DENSITY,
+        help="Mean number density of the --field stars, and of the stars the "
+        "--capture-draws rocks pass through (pc^-3)",
+    )
+    parser.add_argument(
+        "--cluster-fraction",
+        type=float,
+        default=0.5,
+        help="Fraction of the stars in clusters with --field clustered",
+    )
+    parser.add_argument(
+        "--cluster-size",
+        type=int,
+        default=100,
+        help="Mean number of stars per cluster with --field clustered",
+    )
+    parser.add_argument(
+        "--cluster-radius",
+        type=float,
+        default=1.0,
+        help="Plummer radius of the clusters with --field clustered (pc)",
+    )
+    parser.add_argument(
+        "--neighbour-radius",
+        type=float,
+        default=neighbourhood.NEIGHBOUR_RADIUS,
+        help="Radius of the neighbourhood searched around each --field star (pc)",
+    )
+    parser.add_argument(
+        "--capture-draws",
+        type=int,
+        default=0,
+        help="Sample the capture rates and probabilities of this many rock-star "
+        "encounters, in chunks of --chunk-size (e.g. 100000000)",
+    )
+    parser.add_argument(
+        "--velocities",
+        choices=VELOCITY_KINDS,
+        default="maxwellian",
+        help="Distribution of the --capture-draws relative velocities",
+    )
+    parser.add_argument(
+        "--mean-speed",
+        type=float,
+        default=interaction_times.V_O / 1e3,
+        help="Mean relative speed with --velocities maxwellian (km/s)",
+    )
+    parser.add_argument(
+        "--velocity-dispersion",
+        type=float,
+        nargs=3,
+        metavar=("U", "V", "W"),
+        default=ELLIPSOID_DISPERSION,
+        help="Velocity dispersions with --velocities ellipsoid (km/s)",
+    )
+    parser.add_argument(
+        "--hist-draws",
+        type=int,
+        default=None,
+        help="Plot the IMF and rock mass histograms from this many draws, "
+        "binned in Rust without keeping the samples (e.g. 10000000000)",
+    )
+    parser.add_argument(
+        "--plots",
+        choices=RENDER_MODES,
+        default="pool",
+        help="Draw the plots in worker processes (pool), one after another "
+        "(serial) or not at all (none)",
+    )
+    parser.add_argument(
+        "--plot-workers",
+        type=int,
+        default=None,
+        help="Number of processes drawing plots in --plots pool mode",
+    )
+    parser.add_argument(
+        "--stage-workers",
+        type=int,
+        default=None,
+        help="Number of pipeline stages run at once on threads "
+        "(default: one per core; 1 runs them one after another)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write per-stage timings, memory use and call counts "
+        "to output/profiles as JSON",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help="With --profile, also capture a cProfile of the whole run. cProfile "
+        "only sees the main thread, so the stages then run one after another",
+    )
+    args = parser.parse_args()
+    try:
+        args.target = [Target.parse(spec) for spec in args.target]
+    except ValueError as error:
+        parser.error(str(error))
+    if args.target:
+        # Adaptive runs stream their batches
+        args.stream = True
+        if args.store:
+            parser.error("--target cannot be used with --store")
+        if args.sampling != "random":
+            # Stratified and quasi-random points spread over all --runs
+            # samples, so stopping early would only sample the lowest
+            # strata, and the batches would not be independent
+            parser.error("--target needs --sampling random")
+    if args.min_batches < MIN_BATCHES:
+        parser.error(f"--min-batches must be at least {MIN_BATCHES}")
+    if args.stream and args.field != "none":
+        parser.error("--field cannot be used with --stream or --target")
+    if args.stream and args.capture_draws:
+        parser.error("--capture-draws cannot be used with --stream or --target")
+    if args.mean_speed <= 0:
+        parser.error("--mean-speed must be positive")
+    if min(args.velocity_dispersion) <= 0:
+        parser.error("--velocity-dispersion must be positive")
+    if args.store and args.seed is None:
+        # The run store records the seed, so a stored run can be reproduced
+        args.seed = int(np.random.default_rng().integers(2**63))
+    if args.cprofile:
+        # Stage threads are invisible to cProfile
+        args.stage_workers = 1
+    if args.tail_fraction is not None and (args.stream or args.hist_draws):
+        parser.error(
+            "--tail-fraction cannot be used with --stream, --target or --hist-draws"
+        )
+    return args
+
 
 if __name__ == "__main__":
+    args = parse_args()
+    # Stages run numba's parallel kernels from several threads at once,
+    # which only the TBB and OpenMP layers support. The workqueue layer
+    # aborts the process instead, so it is never picked.
+    numba.config.THREADING_LAYER = "threadsafe"  # type: ignore[attr-defined]
+
     # # PGF plot settings for exporting plots to LaTeX
     # matplotlib.use("pgf")
     # matplotlib.rcParams.update(
@@ -19,30 +297,271 @@ if __name__ == "__main__":
     #     }
     # )
 
-    matplotlib.rcParams.update({"font.size": 14})
-    matplotlib.rcParams.update({"figure.autolayout": True})
+    if args.plots != "none":
+        matplotlib.rcParams.update({"font.size": 14})
+        matplotlib.rcParams.update({"figure.autolayout": True})
+        matplotlib.use("Agg")
+
+    sampling = Sampling(args.sampling, args.tail_fraction, args.tail_index)
+    profiler = Profiler(enabled=args.profile, cprofile=args.cprofile)
+    # Count and time the Rust calls, I/O, plotting and the stage helpers
+    profiler.instrument(rust)
+    profiler.instrument(np, ["save", "load"])
+    profiler.instrument(plt, ["savefig"])
+    for stage_module in (
+        imf_plot_and_save,
+        disk_plot,
+        collision_times,
+        rock_conversions,
+        rock_save_and_plot,
+        neighbourhood_rates,
+    ):
+        profiler.instrument(stage_module)
 
     start = time.perf_counter()
 
     print("\n---PROGRAM START---")
-    stellar_mass_arr = get_stellar_mass_array()
+    # Made after the style is set, so the workers it spawns use it too
+    renderer = Renderer(args.plots, args.plot_workers)
+    store = None
+    if args.store:
+        store = RunStore.create(
+            new_run_dir(args.seed),
+            {
+                "runs": args.runs,
+                "seed": args.seed,
+                "threads": args.threads,
+                "stream": args.stream,
+                "chunk_size": args.chunk_size if args.stream else None,
+                **sampling.params(),
+                "field": args.field,
+                "stellar_density": args.stellar_density,
+                "capture_draws": args.capture_draws,
+                "velocities": args.velocities if args.capture_draws else None,
+            },
+        )
+        print(f"Saving values to {store.path}")
+
+    if args.target:
+        monitor = ConvergenceMonitor(
+            args.target,
+            args.confidence,
+            args.convergence_method,
+            args.min_batches,
+            args.seed,
+        )
+        with profiler.stage("streaming"):
+            _, report = streaming.converge(
+                monitor,
+                args.runs,
+                args.chunk_size,
+                args.seed,
+                args.threads,
+                renderer,
+                args.sampling,
+            )
+        report_path: str = write_report(
+            report,
+            {
+                "max_runs": args.runs,
+                "seed": args.seed,
+                "chunk_size": args.chunk_size,
+                "confidence": args.confidence,
+                "method": args.convergence_method,
+                "min_batches": args.min_batches,
+                "sampling": args.sampling,
+            },
+        )
+        print(f"Convergence report written to {report_path}")
+    elif args.stream:
+        with profiler.stage("streaming"):
+            streaming.main(
+                args.runs,
+                args.chunk_size,
+                args.seed,
+                args.threads,
+                store,
+                renderer,
+                args.sampling,
+            )
+    else:
+        cache = None
+        if not args.no_cache:
+            cache = ResultCache(max_bytes=int(args.cache_max_gb * 1024**3))
+        hist_draws: int | None = args.hist_draws if renderer.enabled else None
+
+        # The mass stages return (masses, weights), where the weights are
+        # None unless the masses were importance sampled
+        Sample = tuple[np.ndarray, np.ndarray | None]
+
+        def imf_stage(stellar_sample: Sample, counts: np.ndarray | None = None) -> None:
+            # Calculate and plot initial mass function
+            print("")
+            stellar_mass_arr, stellar_weights = stellar_sample
+            imf.main(stellar_mass_arr, store, renderer, counts, stellar_weights)
+
+        def disk_stage(stellar_sample: Sample) -> DiskCalcs:
+            # Calculate disk values and plot dust mass vs disk density.
+            # The same disk values are reused for the collision times.
+            print("")
+            stellar_mass_arr: np.ndarray = stellar_sample[0]
+            disk_set = DiskCalcs(stellar_mass_arr)
+            disk.main(stellar_mass_arr, store, disk_set, renderer)
+            return disk_set
+
+        def interaction_times_stage(
+            stellar_sample: Sample, disk_set: DiskCalcs
+        ) -> None:
+            # Get collision time for 'Oumuamua-like object with Earth
+            # and the dust disk
+            print("")
+            stellar_mass_arr, stellar_weights = stellar_sample
+            interaction_times.main(stellar_mass_arr, store, disk_set, stellar_weights)
+
+        def neighbourhood_stage(stellar_sample: Sample, disk_set: DiskCalcs) -> None:
+            # Place the stars in space and find their encounter and
+            # rock exchange rates with their neighbours
+            print("")
+            stellar_mass_arr, stellar_weights = stellar_sample
+            field = StellarField(
+                len(stellar_mass_arr),
+                args.stellar_density,
+                args.field,
+                args.cluster_fraction,
+                args.cluster_size,
+                args.cluster_radius,
+                args.seed,
+            )
+            neighbourhood.main(
+                stellar_mass_arr,
+                field,
+                store,
+                disk_set,
+                renderer,
+                args.neighbour_radius,
+                stellar_weights,
+            )
+
+        def capture_stage(stellar_sample: Sample, disk_set: DiskCalcs) -> None:
+            # Sample rock-star encounters and the distributions of their
+            # capture rates and probabilities
+            print("")
+            stellar_mass_arr, stellar_weights = stellar_sample
+            if args.velocities == "maxwellian":
+                velocities = VelocityEllipsoid.maxwellian(args.mean_speed * 1e3)
+            else:
+                velocities = VelocityEllipsoid(
+                    tuple(1e3 * sigma for sigma in args.velocity_dispersion)
+                )
+            capture.main(
+                stellar_mass_arr,
+                velocities,
+                args.capture_draws,
+                args.chunk_size,
+                args.seed,
+                args.threads,
+                store,
+                disk_set,
+                renderer,
+                stellar_weights,
+                args.sampling,
+                args.stellar_density,
+            )
 
-    # Calculate and plot initial mass function
-    print("")
-    imf.main(stellar_mass_arr)
+        def rock_calcs_stage(
+            stellar_sample: Sample,
+            rock_sample: Sample,
+            counts: np.ndarray | None = None,
+        ) -> None:
+            # Calculate and plot rock mass distribution
+            print("")
+            stellar_mass_arr, stellar_weights = stellar_sample
+            rock_mass_arr, rock_weights = rock_sample
+            rock_calcs.main(
+                stellar_mass_arr,
+                args.runs,
+                args.seed,
+                args.threads,
+                cache,
+                store,
+                renderer,
+                counts,
+                rock_mass_arr,
+                rock_weights,
+                stellar_weights,
+            )
 
-    # Calculate disk values and plot dust mass vs disk density
-    print("")
-    disk.main(stellar_mass_arr)
+        # The rock stages never need the disk or collision stages, so they
+        # run alongside them. The histograms are the largest samples of
+        # all and depend on nothing.
+        imf_inputs: tuple[str, ...] = ("stellar_masses",)
+        rock_inputs: tuple[str, ...] = ("stellar_masses", "rock_masses")
+        stages: list[Stage] = [
+            Stage(
+                "stellar_masses",
+                lambda: get_stellar_mass_sample(
+                    args.runs, args.seed, args.threads, cache, sampling
+                ),
+            ),
+            Stage(
+                "rock_masses",
+                lambda: rock_calcs.get_rock_sample(
+                    args.runs, args.seed, args.threads, cache, sampling
+                ),
+            ),
+        ]
+        if hist_draws is not None:
+            # Narrowed here, as the check above does not carry into the lambdas
+            draws: int = hist_draws
+            stages += [
+                Stage(
+                    "imf_histogram",
+                    lambda: imf.get_imf_histogram(
+                        draws, args.seed, args.threads, args.sampling
+                    ),
+                ),
+                Stage(
+                    "rock_histogram",
+                    lambda: rock_calcs.get_rock_dist_histogram(
+                        draws, args.seed, args.threads, args.sampling
+                    ),
+                ),
+            ]
+            imf_inputs += ("imf_histogram",)
+            rock_inputs += ("rock_histogram",)
+        stages += [
+            Stage("imf", imf_stage, imf_inputs),
+            Stage("disk", disk_stage, ("stellar_masses",)),
+            Stage(
+                "interaction_times",
+                interaction_times_stage,
+                ("stellar_masses", "disk"),
+            ),
+            Stage("rock_calcs", rock_calcs_stage, rock_inputs),
+        ]
+        if args.field != "none":
+            stages.append(
+                Stage("neighbourhood", neighbourhood_stage, ("stellar_masses", "disk"))
+            )
+        if args.capture_draws:
+            stages.append(Stage("capture", capture_stage, ("stellar_masses", "disk")))
+        stage_workers: int = args.stage_workers or min(len(stages), os.cpu_count() or 1)
+        # Starts numba's thread pool (TBB or OpenMP, see above) on the main
+        # thread. If it were first started by a stage thread, the TBB layer
+        # would hang at exit.
+        numba.get_num_threads()
+        run_stages(stages, stage_workers, profiler)
 
-    # Get collision time for 'Oumuamua-like object with Earth
-    # and the dust disk
-    print("")
-    interaction_times.main(stellar_mass_arr)
+    # Wait for the figures still being drawn
+    with profiler.stage("render"):
+        renderer.close()
 
-    # Calculate and plot rock mass distribution
-    print("")
-    rock_calcs.main()
+    if store is not None:
+        store.close()
 
     print(f"\nProgram took {time.perf_counter() - start} s to run")
+    profile_path: str | None = profiler.write_report()
+    if profile_path is not None:
+        print(f"Profile written to {profile_path}")
+    profiler.close()
     print("---PROGRAM END---\n")
@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+
+from helpers import get_base_dir
+
+MANIFEST: str = "manifest.json"
+FORMAT_VERSION: int = 1
+
+
+class RunStore:
+    """Columnar on-disk store for the results of one run.
+
+    A store is a directory holding one .npy file per column and a
+    manifest.json with the run metadata (seed, N, parameters) and the
+    units, description and number of rows written of every column.
+
+    Columns are pre-allocated at their full length and filled chunk by
+    chunk through memory maps, so results can be written as they are
+    computed. Reads return memory-mapped slices, so opening a store
+    with 10^8 rows only reads the rows that are actually used.
+
+    Stages running on different threads can write to one store; changes
+    to the manifest are made under a lock."""
+
+    def __init__(self, path: str, manifest: dict, writable: bool) -> None:
+        self.path: str = path
+        self.manifest: dict = manifest
+        self.writable: bool = writable
+        self._writers: dict[str, np.memmap] = {}
+        self._lock: threading.RLock = threading.RLock()
+
+    @classmethod
+    def create(cls, path: str, metadata: dict) -> "RunStore":
+        """Creates an empty store.
+
+        Args:
+            path (str): Directory of the store. Must not already hold a store.
+            metadata (dict): JSON-serialisable description of the run
+
+        Returns:
+            RunStore: Writable store
+        """
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, MANIFEST)):
+            raise FileExistsError(f"{path} already holds a run store")
+        store = cls(
+            path,
+            {
+                "format_version": FORMAT_VERSION,
+                "created": time.time(),
+                "metadata": metadata,
+                "columns": {},
+            },
+            writable=True,
+        )
+        store.flush()
+        return store
+
+    @classmethod
+    def open(cls, path: str) -> "RunStore":
+        """Opens an existing store for reading.
+
+        Args:
+            path (str): Directory of the store
+
+        Returns:
+            RunStore: Read-only store
+        """
+        with open(os.path.join(path, MANIFEST)) as file:
+            manifest: dict = json.load(file)
+        if manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported run store format {manifest['format_version']}"
+            )
+        return cls(path, manifest, writable=False)
+
+    @property
+    def metadata(self) -> dict:
+        return self.manifest["metadata"]
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self.manifest["columns"])
+
+    def create_column(
+        self,
+        name: str,
+        length: int,
+        units: str,
+        description: str = "",
+        dtype: str = "float64",
+    ) -> None:
+        """Pre-allocates a column on disk.
+
+        Args:
+            name (str): Column name
+            length (int): Number of rows
+            units (str): Units of the values, e.g. "kg"
+            description (str): What the column holds
+            dtype (str): NumPy dtype of the values
+        """
+        self._check_writable()
+        with self._lock:
+            if name in self.manifest["columns"]:
+                raise ValueError(f"Column {name} already exists")
+            self._writers[name] = np.lib.format.open_memmap(
+                self._column_path(name), mode="w+", dtype=dtype, shape=(length,)
+            )
+            self.manifest["columns"][name] = {
+                "length": length,
+                "rows_written": 0,
+                "dtype": dtype,
+                "units": units,
+                "description": description,
+            }
+            self.flush()
+
+    def write(self, name: str, start: int, values: np.ndarray) -> None:
+        """Writes values into rows start to start + len(values) of a column.
+
+        Args:
+            name (str): Column name
+            start (int): First row to write
+            values (np.ndarray): Values to write
+        """
+        self._check_writable()
+        column: dict = self.manifest["columns"][name]
+        end: int = start + len(values)
+        if end > column["length"]:
+            raise IndexError(f"Writing rows {start}:{end} of {name} past its length")
+        self._writers[name][start:end] = values
+        with self._lock:
+            column["rows_written"] = max(column["rows_written"], end)
+            self.flush()
+
+    def append(self, name: str, values: np.ndarray) -> None:
+        """Writes values after the last row written to a column.
+
+        Args:
+            name (str): Column name
+            values (np.ndarray): Values to write
+        """
+        self.write(name, self.manifest["columns"][name]["rows_written"], values)
+
+    def save(
+        self, name: str, values: np.ndarray, units: str, description: str = ""
+    ) -> None:
+        """Creates a column and writes all of its values at once.
+
+        Args:
+            name (str): Column name
+            values (np.ndarray): Values of the column
+            units (str): Units of the values
+            description (str): What the column holds
+        """
+        values = np.atleast_1d(values)
+        self.create_column(name, len(values), units, description, str(values.dtype))
+        self.write(name, 0, values)
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns the rows written so far as a read-only memory-mapped array.
+        Slicing it does not copy.
+
+        Args:
+            name (str): Column name
+
+        Returns:
+            np.ndarray: Memory-mapped column
+        """
+        rows_written: int = self.manifest["columns"][name]["rows_written"]
+        return np.load(self._column_path(name), mmap_mode="r")[:rows_written]
+
+    def units(self, name: str) -> str:
+        return self.manifest["columns"][name]["units"]
+
+    def flush(self) -> None:
+        """Flushes written rows to disk and atomically rewrites the manifest."""
+        with self._lock:
+            for writer in self._writers.values():
+                writer.flush()
+            partial: str = os.path.join(self.path, f"{MANIFEST}.partial")
+            with open(partial, "w") as file:
+                json.dump(self.manifest, file, indent=2)
+            os.replace(partial, os.path.join(self.path, MANIFEST))
+
+    def close(self) -> None:
+        if self.writable:
+            self.flush()
+        self._writers.clear()
+
+    def __enter__(self) -> "RunStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.npy")
+
+    def _check_writable(self) -> None:
+        if not self.writable:
+            raise PermissionError("Run store was opened read-only")
+
+
+def new_run_dir(seed: int | None) -> str:
+    """Returns a fresh directory under output/runs for a run's store.
+
+    Args:
+        seed (int | None): Seed of the run, included in the name if given
+
+    Returns:
+        str: Path of the directory (not yet created)
+    """
+    name: str = time.strftime("%Y%m%d-%H%M%S")
+    if seed is not None:
+        name += f"_seed{seed}"
+    return f"{get_base_dir()}/output/runs/{name}"
+
+
+def save_values(
+    name: str, values: np.ndarray, units: str, store: RunStore | None = None
+) -> None:
+    """Saves a stage's values into the run store,
+    or into output/values/{name}.npy if there is no store.
+
+    Args:
+        name (str): Name of the values
+        values (np.ndarray): Values to save
+        units (str): Units of the values
+        store (RunStore | None): Store of the current run
+    """
+    if store is None:
+        np.save(f"{get_base_dir()}/output/values/{name}.npy", values)
+    else:
+        store.save(name, values, units)
@@ -0,0 +1,101 @@
+import numpy as np
+from typing import Callable
+
+# Strategies the Rust samplers accept (see Strategy in rust/src/sampling.rs)
+STRATEGIES: tuple[str, ...] = ("random", "stratified", "sobol", "halton")
+
+# Default steepness of the tail importance density (TAIL_INDEX in rust/src/lib.rs)
+TAIL_INDEX: float = 0.9
+
+
+class Sampling:
+    """How the stellar and rock masses of a run are drawn.
+
+    `strategy` picks the uniform points the quantile functions are fed:
+    independent ("random"), one per stratum ("stratified", which is Latin
+    hypercube sampling in one dimension) or a scrambled low-discrepancy
+    sequence ("sobol" or "halton"), whose quantiles converge close to 1/N
+    instead of 1/sqrt(N).
+
+    With `tail_fraction`, that fraction of the points is drawn from a
+    density piling up towards the most massive stars and rocks, and every
+    sample carries a weight. Statistics of the samples, and of everything
+    computed from them, must then be weighted to stay unbiased.
+
+    Args:
+        strategy (str): One of STRATEGIES
+        tail_fraction (float | None): Fraction of points drawn from the tail
+            density, between 0 and 1. If None, samples are unweighted.
+        tail_index (float): Steepness of the tail density, in [0, 1).
+            Higher values put more points further into the tail.
+    """
+
+    def __init__(
+        self,
+        strategy: str = "random",
+        tail_fraction: float | None = None,
+        tail_index: float = TAIL_INDEX,
+    ) -> None:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy}, expected {STRATEGIES}")
+        if tail_fraction is not None and not 0 < tail_fraction < 1:
+            raise ValueError("tail_fraction must be between 0 and 1")
+        if not 0 <= tail_index < 1:
+            raise ValueError("tail_index must be in [0, 1)")
+        self.strategy: str = strategy
+        self.tail_fraction: float | None = tail_fraction
+        self.tail_index: float = tail_index
+
+    @property
+    def weighted(self) -> bool:
+        """Whether samples carry importance weights."""
+        return self.tail_fraction is not None
+
+    def params(self) -> dict:
+        """Returns the settings as cache parameters. Plain random sampling
+        gives no parameters, so its cache entries predate the strategies.
+
+        Returns:
+            dict: JSON-serialisable settings
+        """
+        params: dict = {}
+        if self.strategy != "random":
+            params["strategy"] = self.strategy
+        if self.weighted:
+            params["tail_fraction"] = self.tail_fraction
+            params["tail_index"] = self.tail_index
+        return params
+
+    def sample(
+        self,
+        sampler: Callable[..., np.ndarray],
+        weighted_sampler: Callable[..., tuple[np.ndarray, np.ndarray]],
+        n: int,
+        seed: int | None = None,
+        threads: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        """Draws n samples from one of the Rust samplers.
+
+        Args:
+            sampler (Callable): Unweighted sampler, e.g. rust.get_rock_masses
+            weighted_sampler (Callable): Weighted sampler of the same
+                distribution, e.g. rust.get_weighted_rock_masses
+            n (int): Number of samples
+            seed (int | None): Seed for the sampler
+            threads (int | None): Number of threads to sample on
+
+        Returns:
+            np.ndarray: Samples
+            np.ndarray | None: Weight of each sample, or None if unweighted
+        """
+        if self.weighted:
+            return weighted_sampler(
+                n, seed, threads, self.strategy, self.tail_fraction, self.tail_index
+            )
+        return sampler(n, seed, threads, strategy=self.strategy), None
+
+    def __repr__(self) -> str:
+        return (
+            f"Sampling({self.strategy!r}, tail_fraction={self.tail_fraction!r}, "
+            f"tail_index={self.tail_index!r})"
+        )
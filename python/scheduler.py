@@ -0,0 +1,146 @@
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import nullcontext
+from typing import Callable
+
+from profiling import Profiler
+
+
+class Stage:
+    """One step of the pipeline and the stages whose results it needs.
+
+    The function is called with the results of `after`, in that order,
+    and its return value is handed on to the stages that depend on it.
+
+    Args:
+        name (str): Name of the stage, unique within a pipeline
+        function (Callable): Runs the stage
+        after (tuple[str, ...]): Names of the stages it depends on
+    """
+
+    def __init__(
+        self, name: str, function: Callable, after: tuple[str, ...] = ()
+    ) -> None:
+        self.name: str = name
+        self.function: Callable = function
+        self.after: tuple[str, ...] = tuple(after)
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name!r}, after={self.after!r})"
+
+
+def stage_order(stages: list[Stage]) -> list[Stage]:
+    """Sorts stages so that every stage comes after its dependencies.
+    Otherwise the declared order is kept, so declaring the stages in
+    an order that already works leaves it unchanged.
+
+    Args:
+        stages (list[Stage]): Stages of the pipeline
+
+    Returns:
+        list[Stage]: The same stages, dependencies first
+    """
+    by_name: dict[str, Stage] = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f"Stage {stage.name} is declared twice")
+        by_name[stage.name] = stage
+    for stage in stages:
+        for name in stage.after:
+            if name not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {name}")
+
+    ordered: list[Stage] = []
+    done: set[str] = set()
+    remaining: list[Stage] = list(stages)
+    while remaining:
+        # First declared stage whose dependencies have all been placed
+        ready: Stage | None = next(
+            (s for s in remaining if done.issuperset(s.after)), None
+        )
+        if ready is None:
+            names: str = ", ".join(s.name for s in remaining)
+            raise ValueError(f"Stages {names} depend on each other in a cycle")
+        ordered.append(ready)
+        done.add(ready.name)
+        remaining.remove(ready)
+    return ordered
+
+
+def run_stages(
+    stages: list[Stage],
+    max_workers: int | None = None,
+    profiler: Profiler | None = None,
+    executor: Executor | None = None,
+) -> dict[str, object]:
+    """Runs a pipeline, starting each stage as soon as its dependencies finish.
+
+    Stages run on a thread pool by default. The Rust samplers, NumPy and
+    file I/O release the GIL, so independent stages overlap on several
+    cores. A process pool can be given as `executor` instead, for stages
+    whose functions and results can be pickled.
+
+    With one worker the stages run one after another on the calling thread,
+    in declared order, exactly as a plain script would run them.
+
+    Args:
+        stages (list[Stage]): Stages of the pipeline
+        max_workers (int | None): Number of stages run at once. If None,
+            the number of stages. Ignored if an executor is given.
+        profiler (Profiler | None): Times each stage if given. Stages sent
+            to other processes are not timed, since they cannot report back.
+        executor (Executor | None): Pool to run the stages on. It is not
+            shut down, so one pool can run several pipelines.
+
+    Returns:
+        dict[str, object]: Result of every stage, by name
+    """
+    ordered: list[Stage] = stage_order(stages)
+    results: dict[str, object] = {}
+
+    def run(stage: Stage, *inputs) -> object:
+        with profiler.stage(stage.name) if profiler else nullcontext():
+            return stage.function(*inputs)
+
+    if executor is None and (max_workers or len(ordered)) <= 1:
+        for stage in ordered:
+            results[stage.name] = run(stage, *(results[n] for n in stage.after))
+        return results
+
+    pool: Executor = executor or ThreadPoolExecutor(
+        max_workers or len(ordered), thread_name_prefix="stage"
+    )
+    # Closures (and the profiler) only work on threads of this process
+    in_process: bool = isinstance(pool, ThreadPoolExecutor)
+    running: dict[Future, Stage] = {}
+    pending: list[Stage] = ordered
+    try:
+        while pending or running:
+            # Starts every stage whose inputs are ready, in declared order
+            for stage in [s for s in pending if all(n in results for n in s.after)]:
+                inputs: list[object] = [results[n] for n in stage.after]
+                future: Future = (
+                    pool.submit(run, stage, *inputs)
+                    if in_process
+                    else pool.submit(stage.function, *inputs)
+                )
+                running[future] = stage
+                pending.remove(stage)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                # Re-raises the stage's error. Stages already running are
+                # waited for below, and the rest are never started.
+                results[stage.name] = future.result()
+    finally:
+        if running:
+            wait(running)
+        if executor is None:
+            pool.shutdown()
+    return results
@@ -0,0 +1,285 @@
+import numpy as np
+import constants
+
+from rust import stream_stellar_masses, stream_rock_masses
+from disk_calcs.disk import DiskCalcs
+from imf.plot_and_save import imf_bins, plot_imf_histogram_counts
+from interaction_times.collision_times import t_coll_disk
+from interaction_times.main import N_O, V_O
+from rock_calcs.conversions import SECONDS_IN_MYR, rock_mass_to_lifetime
+from rock_calcs.save_and_plot import M_LOW, M_UPP, plot_rock_dist_counts
+from streaming.convergence import ConvergenceMonitor, format_report
+from streaming.stats import StreamSummary
+from run_store import RunStore
+from rendering import Renderer
+
+# Mass limits of the IMF sampler (see rust/src/quantile_function.rs)
+STELLAR_MASS_LOW: float = 0.1  # M_sun
+STELLAR_MASS_UPP: float = 50  # M_sun
+
+# Columns written to the run store in streaming mode: (name, units, description)
+STELLAR_COLUMNS: tuple[tuple[str, str, str], ...] = (
+    ("stellar_masses", "kg", "Stellar masses sampled from the IMF"),
+    ("disk_density", "kg m^-3", "Dust density of each star's disk"),
+    ("collision_times_disk_sideon", "s", "Side-on disk collision times"),
+    ("collision_times_disk_topdown", "s", "Top-down disk collision times"),
+)
+ROCK_COLUMNS: tuple[tuple[str, str, str], ...] = (
+    ("rock_masses", "kg", "Rock masses"),
+    ("rock_lifetimes", "s", "Rock lifetimes"),
+)
+
+
+def stellar_summaries() -> dict[str, StreamSummary]:
+    """Returns empty summaries for every per-star quantity.
+    The histogram ranges come from the IMF mass limits.
+
+    Returns:
+        dict[str, StreamSummary]: Summaries keyed by quantity name
+    """
+    m_sun: float = constants.M_SUN
+    mass_limits = np.array([STELLAR_MASS_LOW, STELLAR_MASS_UPP]) * m_sun
+    disk_limits = DiskCalcs(mass_limits, verbose=False)
+    side_limits, top_limits = t_coll_disk(N_O, V_O, disk_limits, mass_limits)
+
+    imf_edges: np.ndarray = imf_bins()
+    return {
+        "stellar_mass": StreamSummary(imf_edges[0], imf_edges[-1], len(imf_edges)),
+        "disk_radius": StreamSummary(*disk_limits.get_reduced_radius()),
+        "disk_density": StreamSummary(*np.sort(disk_limits.density)),
+        # Collision times fall as stellar mass rises
+        "coll_time_side": StreamSummary(*side_limits[::-1] / SECONDS_IN_MYR),
+        "coll_time_top": StreamSummary(*top_limits[::-1] / SECONDS_IN_MYR),
+    }
+
+
+def rock_summaries() -> dict[str, StreamSummary]:
+    """Returns empty summaries for every per-rock quantity.
+
+    Returns:
+        dict[str, StreamSummary]: Summaries keyed by quantity name
+    """
+    lifetime_limits = rock_mass_to_lifetime(np.array([M_LOW, M_UPP]))
+    return {
+        "rock_mass": StreamSummary(M_LOW, M_UPP),
+        "rock_lifetime": StreamSummary(*lifetime_limits / SECONDS_IN_MYR),
+    }
+
+
+def fold_stellar_chunk(
+    stellar_mass: np.ndarray,
+    summaries: dict[str, StreamSummary],
+    store: RunStore | None = None,
+) -> dict[str, np.ndarray]:
+    """Runs the IMF, disk and collision time stages on one chunk of stars
+    and folds the results into the summaries.
+
+    Args:
+        stellar_mass (np.ndarray): Chunk of stellar masses (SI)
+        summaries (dict[str, StreamSummary]): Summaries from stellar_summaries()
+        store (RunStore | None): Store to append the chunk's values to
+
+    Returns:
+        dict[str, np.ndarray]: Values folded into each summary
+    """
+    disk = DiskCalcs(stellar_mass, verbose=False)
+    coll_times_side, coll_times_top = t_coll_disk(N_O, V_O, disk, stellar_mass)
+    values: dict[str, np.ndarray] = {
+        "stellar_mass": stellar_mass / constants.M_SUN,
+        "disk_radius": disk.get_reduced_radius(),
+        "disk_density": disk.density,
+        "coll_time_side": coll_times_side / SECONDS_IN_MYR,
+        "coll_time_top": coll_times_top / SECONDS_IN_MYR,
+    }
+    for name, chunk_values in values.items():
+        summaries[name].update(chunk_values)
+
+    if store is not None:
+        store.append("stellar_masses", stellar_mass)
+        store.append("disk_density", disk.density)
+        store.append("collision_times_disk_sideon", coll_times_side)
+        store.append("collision_times_disk_topdown", coll_times_top)
+    return values
+
+
+def fold_rock_chunk(
+    rock_masses: np.ndarray,
+    summaries: dict[str, StreamSummary],
+    store: RunStore | None = None,
+) -> dict[str, np.ndarray]:
+    """Runs the rock stage on one chunk of rocks
+    and folds the results into the summaries.
+
+    Args:
+        rock_masses (np.ndarray): Chunk of rock masses (SI)
+        summaries (dict[str, StreamSummary]): Summaries from rock_summaries()
+        store (RunStore | None): Store to append the chunk's values to
+
+    Returns:
+        dict[str, np.ndarray]: Values folded into each summary
+    """
+    rock_lifetimes: np.ndarray = rock_mass_to_lifetime(rock_masses)
+    values: dict[str, np.ndarray] = {
+        "rock_mass": rock_masses,
+        "rock_lifetime": rock_lifetimes / SECONDS_IN_MYR,
+    }
+    for name, chunk_values in values.items():
+        summaries[name].update(chunk_values)
+
+    if store is not None:
+        store.append("rock_masses", rock_masses)
+        store.append("rock_lifetimes", rock_lifetimes)
+    return values
+
+
+def print_summaries(summaries: dict[str, StreamSummary]) -> None:
+    """Prints the summary statistics of every streamed quantity.
+
+    Args:
+        summaries (dict[str, StreamSummary]): Summaries keyed by quantity name
+    """
+    for name, summary in summaries.items():
+        print(summary.summary.format(name))
+
+
+def main(
+    n: int,
+    chunk_size: int = 1 << 20,
+    seed: int | None = None,
+    threads: int | None = None,
+    store: RunStore | None = None,
+    renderer: Renderer | None = None,
+    strategy: str = "random",
+) -> dict[str, StreamSummary]:
+    """Runs the whole pipeline in fixed-size chunks, keeping only running
+    statistics and histograms in memory.
+
+    Args:
+        n (int): Number of stars and rocks to sample
+        chunk_size (int): Number of samples per chunk
+        seed (int | None): Seed for the Rust samplers
+        threads (int | None): Number of threads for the Rust samplers
+        store (RunStore | None): Store to write every chunk's values to.
+            The values go straight to disk, so memory use stays bounded.
+        renderer (Renderer | None): Renderer for the plots.
+            If None, they are drawn straight away.
+        strategy (str): Sampling strategy (see sampling.STRATEGIES). Every
+            chunk continues the same sequence, so the chunks together are
+            stratified or low-discrepancy, not just each chunk.
+
+    Returns:
+        dict[str, StreamSummary]: Summaries keyed by quantity name
+    """
+    renderer = renderer or Renderer("serial")
+    summaries: dict[str, StreamSummary] = stellar_summaries()
+    if store is not None:
+        for name, units, description in STELLAR_COLUMNS + ROCK_COLUMNS:
+            store.create_column(name, n, units, description)
+
+    stars = stream_stellar_masses(n, chunk_size, seed, threads, strategy)
+    print(f"Streaming {n} stars in {len(stars)} chunks (seed {stars.seed})...")
+    for stellar_mass in stars:
+        fold_stellar_chunk(stellar_mass, summaries, store)
+
+    rock_summary: dict[str, StreamSummary] = rock_summaries()
+    rocks = stream_rock_masses(n, chunk_size, seed, threads, strategy)
+    print(f"Streaming {n} rocks in {len(rocks)} chunks (seed {rocks.seed})...")
+    for rock_masses in rocks:
+        fold_rock_chunk(rock_masses, rock_summary, store)
+    summaries.update(rock_summary)
+
+    print("Summary statistics (times in Myr):")
+    print_summaries(summaries)
+    plot_summaries(summaries, renderer)
+    return summaries
+
+
+def converge(
+    monitor: ConvergenceMonitor,
+    max_runs: int,
+    chunk_size: int = 1 << 20,
+    seed: int | None = None,
+    threads: int | None = None,
+    renderer: Renderer | None = None,
+    strategy: str = "random",
+) -> tuple[dict[str, StreamSummary], list[dict]]:
+    """Runs the streaming pipeline until the monitor's targets are met.
+
+    Stars and rocks are streamed separately, one chunk (batch) at a time,
+    and each stream stops as soon as the targets on its quantities are
+    met, or after max_runs samples. A stream without targets stops after
+    the monitor's minimum number of batches.
+
+    Args:
+        monitor (ConvergenceMonitor): Targets and how their precision is found
+        max_runs (int): Most stars and rocks to sample
+        chunk_size (int): Number of samples per batch
+        seed (int | None): Seed for the Rust samplers
+        threads (int | None): Number of threads for the Rust samplers
+        renderer (Renderer | None): Renderer for the plots.
+            If None, they are drawn straight away.
+        strategy (str): Sampling strategy (see sampling.STRATEGIES)
+
+    Returns:
+        dict[str, StreamSummary]: Summaries keyed by quantity name
+        list[dict]: Precision reached by every target (see
+            ConvergenceMonitor.report)
+    """
+    renderer = renderer or Renderer("serial")
+    known: list[str] = list(stellar_summaries()) + list(rock_summaries())
+    for target in monitor.targets:
+        if target.quantity not in known:
+            raise ValueError(f"Unknown quantity {target.quantity}, expected {known}")
+
+    summaries: dict[str, StreamSummary] = {}
+    groups = (
+        ("stars", stream_stellar_masses, stellar_summaries, fold_stellar_chunk),
+        ("rocks", stream_rock_masses, rock_summaries, fold_rock_chunk),
+    )
+    for label, stream, empty_summaries, fold_chunk in groups:
+        pooled: dict[str, StreamSummary] = empty_summaries()
+        quantities: list[str] = list(pooled)
+        chunks = stream(max_runs, chunk_size, seed, threads, strategy)
+        print(
+            f"Streaming up to {max_runs} {label} in batches of {chunks.chunk_size} "
+            f"(seed {chunks.seed})..."
+        )
+        used: int = 0
+        batches: int = 0
+        for batches, chunk in enumerate(chunks, start=1):
+            monitor.update(fold_chunk(chunk, pooled))
+            used += len(chunk)
+            if batches >= monitor.min_batches and monitor.converged(quantities):
+                break
+        print(f"Used {used} {label} in {batches} batches")
+        summaries.update(pooled)
+
+    print("Summary statistics (times in Myr):")
+    print_summaries(summaries)
+    report: list[dict] = monitor.report()
+    print(format_report(report, monitor.confidence))
+    plot_summaries(summaries, renderer)
+    return summaries, report
+
+
+def plot_summaries(summaries: dict[str, StreamSummary], renderer: Renderer) -> None:
+    """Plots the IMF and rock mass histograms of a streaming run.
+
+    Args:
+        summaries (dict[str, StreamSummary]): Summaries keyed by quantity name
+        renderer (Renderer): Renderer for the plots
+    """
+    if not renderer.enabled:
+        return
+    print("Plotting IMF histogram...")
+    imf = summaries["stellar_mass"].histogram
+    renderer.submit(plot_imf_histogram_counts, imf.edges, imf.counts)
+
+    print("Plotting rock mass distribution...")
+    rock = summaries["rock_mass"]
+    renderer.submit(
+        plot_rock_dist_counts,
+        rock.histogram.edges,
+        rock.histogram.counts,
+        rock.stats.max,
+    )
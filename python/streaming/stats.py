@@ -0,0 +1,457 @@
+import numpy as np
+
+
+class RunningStats:
+    """Running count, mean, standard deviation, minimum and maximum.
+
+    Chunks are folded in with `update`, using the parallel form of
+    Welford's algorithm, so the memory used does not grow with the
+    number of samples. Two instances can be combined with `merge`.
+
+    Samples may carry importance weights, in which case the mean and
+    standard deviation are weighted, `weight` is their total and
+    `weight_sq` the total of their squares."""
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.weight: float = 0.0  # Total weight, equal to count if unweighted
+        self.weight_sq: float = 0.0  # Total squared weight, likewise
+        self.mean: float = 0.0
+        self.m2: float = 0.0  # Sum of squared deviations from the mean
+        self.min: float = np.inf
+        self.max: float = -np.inf
+
+    def update(self, values: np.ndarray, weights: np.ndarray | None = None) -> None:
+        """Folds a chunk of values into the statistics.
+
+        Args:
+            values (np.ndarray): Chunk of values
+            weights (np.ndarray | None): Weight of each value
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        if weights is None:
+            chunk_weight: float = float(values.size)
+            chunk_weight_sq: float = chunk_weight
+            chunk_mean: float = float(np.mean(values))
+            chunk_m2: float = float(np.sum((values - chunk_mean) ** 2))
+        else:
+            weights = np.asarray(weights, dtype=np.float64).ravel()
+            chunk_weight = float(np.sum(weights))
+            chunk_weight_sq = float(np.dot(weights, weights))
+            chunk_mean = float(np.dot(weights, values)) / chunk_weight
+            chunk_m2 = float(np.dot(weights, (values - chunk_mean) ** 2))
+        self._combine(
+            values.size,
+            chunk_weight,
+            chunk_weight_sq,
+            chunk_mean,
+            chunk_m2,
+            float(np.min(values)),
+            float(np.max(values)),
+        )
+
+    def merge(self, other: "RunningStats") -> None:
+        """Folds the statistics of another instance into this one.
+
+        Args:
+            other (RunningStats): Statistics to merge in
+        """
+        if other.count == 0:
+            return
+        self._combine(
+            other.count,
+            other.weight,
+            other.weight_sq,
+            other.mean,
+            other.m2,
+            other.min,
+            other.max,
+        )
+
+    def _combine(
+        self,
+        count: int,
+        weight: float,
+        weight_sq: float,
+        mean: float,
+        m2: float,
+        minimum: float,
+        maximum: float,
+    ) -> None:
+        total: float = self.weight + weight
+        delta: float = mean - self.mean
+        self.mean += delta * weight / total
+        self.m2 += m2 + delta**2 * self.weight * weight / total
+        self.count += count
+        self.weight = total
+        self.weight_sq += weight_sq
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation (same convention as pandas).
+        Weights are treated as reliability weights, dividing by
+        weight - weight_sq / weight, so rescaling them changes nothing.
+        Unweighted, that is count - 1."""
+        if self.count < 2:
+            return np.nan
+        denominator: float = self.weight - self.weight_sq / self.weight
+        if denominator <= 0:
+            return np.nan
+        return float(np.sqrt(self.m2 / denominator))
+
+
+class LogHistogram:
+    """Histogram with fixed log-spaced bins that is filled chunk by chunk.
+
+    Values outside the bin range are counted in `underflow` and `overflow`
+    so that `count` still covers every sample."""
+
+    def __init__(self, low: float, high: float, num: int = 75) -> None:
+        # Same construction as the bins in plot_imf_histogram and plot_rock_dist
+        self.edges: np.ndarray = np.logspace(np.log10(low), np.log10(high), num=num)
+        self.counts: np.ndarray = np.zeros(num - 1, dtype=np.int64)
+        self.underflow: int = 0
+        self.overflow: int = 0
+
+    def update(self, values: np.ndarray) -> None:
+        """Bins a chunk of values.
+
+        Args:
+            values (np.ndarray): Chunk of values, in the units of the bin edges
+        """
+        counts, _ = np.histogram(values, bins=self.edges)
+        self.counts += counts
+        self.underflow += int(np.count_nonzero(values < self.edges[0]))
+        self.overflow += int(np.count_nonzero(values > self.edges[-1]))
+
+    def merge(self, other: "LogHistogram") -> None:
+        """Adds the counts of another histogram with the same bins.
+
+        Args:
+            other (LogHistogram): Histogram to merge in
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Can only merge histograms with the same bin edges")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum()) + self.underflow + self.overflow
+
+    def to_dict(self) -> dict:
+        """Returns a JSON-serialisable copy of the histogram."""
+        return {
+            "edges": self.edges.tolist(),
+            "counts": self.counts.tolist(),
+            "underflow": self.underflow,
+            "overflow": self.overflow,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogHistogram":
+        histogram = cls(data["edges"][0], data["edges"][-1], len(data["edges"]))
+        # The saved edges are exact, where recomputing them may round differently
+        histogram.edges = np.asarray(data["edges"], dtype=np.float64)
+        histogram.counts = np.asarray(data["counts"], dtype=np.int64)
+        histogram.underflow = int(data["underflow"])
+        histogram.overflow = int(data["overflow"])
+        return histogram
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile by interpolating the cumulative counts
+        in log space. The error is at most one bin width.
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: Estimated quantile (nan if q falls outside the bin range)
+        """
+        target: float = q * self.count - self.underflow
+        if target < 0 or target > self.counts.sum():
+            return np.nan
+        cumulative: np.ndarray = np.concatenate(([0], np.cumsum(self.counts)))
+        return float(10 ** np.interp(target, cumulative, np.log10(self.edges)))
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch).
+
+    Values are counted in logarithmically spaced buckets, so every
+    quantile is returned to within a relative error of `relative_accuracy`.
+    The number of buckets only grows with log(max / min), not with the
+    number of samples, and sketches from separate chunks or runs are
+    merged by adding their bucket counts.
+
+    See https://doi.org/10.14778/3352063.3352135."""
+
+    def __init__(self, relative_accuracy: float = 0.005) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy: float = relative_accuracy
+        self.gamma: float = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma: float = float(np.log(self.gamma))
+        self.offset: int = 0  # Bucket key of counts[0]
+        self.counts: np.ndarray = np.zeros(0, dtype=np.float64)
+        self.zero_count: float = 0.0
+        # Whether buckets hold total weights rather than counts
+        self.weighted: bool = False
+
+    def update(self, values: np.ndarray, weights: np.ndarray | None = None) -> None:
+        """Adds a chunk of values to the sketch.
+
+        Args:
+            values (np.ndarray): Chunk of non-negative values
+            weights (np.ndarray | None): Weight of each value. Buckets then
+                hold total weights rather than counts.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if np.any(values < 0):
+            raise ValueError("QuantileSketch only supports non-negative values")
+        is_positive: np.ndarray = values > 0
+        positive: np.ndarray = values[is_positive]
+        if weights is None:
+            self.zero_count += values.size - positive.size
+        else:
+            weights = np.asarray(weights, dtype=np.float64).ravel()
+            self.weighted = True
+            self.zero_count += float(np.sum(weights[~is_positive]))
+            weights = weights[is_positive]
+        if positive.size == 0:
+            return
+        keys: np.ndarray = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+        self._add_counts(int(keys.min()), np.bincount(keys - keys.min(), weights))
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Adds the counts of another sketch with the same accuracy.
+
+        Args:
+            other (QuantileSketch): Sketch to merge in
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("Can only merge sketches with the same relative accuracy")
+        self.zero_count += other.zero_count
+        self.weighted = self.weighted or other.weighted
+        if other.counts.size:
+            self._add_counts(other.offset, other.counts)
+
+    def _add_counts(self, offset: int, counts: np.ndarray) -> None:
+        if self.counts.size == 0:
+            self.offset = offset
+            self.counts = counts.astype(np.float64)
+            return
+        low: int = min(self.offset, offset)
+        high: int = max(self.offset + self.counts.size, offset + counts.size)
+        if low != self.offset or high != self.offset + self.counts.size:
+            grown: np.ndarray = np.zeros(high - low, dtype=np.float64)
+            grown[self.offset - low : self.offset - low + self.counts.size] = (
+                self.counts
+            )
+            self.counts, self.offset = grown, low
+        self.counts[offset - self.offset : offset - self.offset + counts.size] += counts
+
+    @property
+    def count(self) -> float:
+        return float(self.counts.sum()) + self.zero_count
+
+    def quantile(self, q: float) -> float:
+        """Returns a quantile to within the relative accuracy of the sketch.
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: Estimated quantile (nan if the sketch is empty)
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        if self.count == 0:
+            return np.nan
+        # Position among the samples as in pandas, or along the total
+        # weight, which need not be anywhere near the number of samples
+        rank: float = q * self.count if self.weighted else q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative: np.ndarray = np.cumsum(self.counts)
+        index: int = int(
+            np.searchsorted(cumulative, rank - self.zero_count, side="right")
+        )
+        index = min(index, self.counts.size - 1)
+        return float(2 * self.gamma ** (self.offset + index) / (self.gamma + 1))
+
+    def to_dict(self) -> dict:
+        """Returns a JSON-serialisable copy of the sketch."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "offset": self.offset,
+            "counts": self.counts.tolist(),
+            "zero_count": self.zero_count,
+            "weighted": self.weighted,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.offset = int(data["offset"])
+        sketch.counts = np.asarray(data["counts"], dtype=np.float64)
+        sketch.zero_count = float(data["zero_count"])
+        sketch.weighted = bool(data.get("weighted", False))
+        return sketch
+
+
+class SummaryStatistics:
+    """Streaming replacement for pandas' describe() and median().
+
+    Moments, minimum and maximum are exact; quantiles come from a
+    QuantileSketch and are within its relative accuracy. Memory use
+    does not depend on the number of samples, and summaries of
+    separate chunks or runs can be merged. With importance weights,
+    every statistic but the count, minimum and maximum is weighted."""
+
+    def __init__(self, relative_accuracy: float = 0.005) -> None:
+        self.stats: RunningStats = RunningStats()
+        self.sketch: QuantileSketch = QuantileSketch(relative_accuracy)
+
+    def update(self, values: np.ndarray, weights: np.ndarray | None = None) -> None:
+        self.stats.update(values, weights)
+        self.sketch.update(values, weights)
+
+    def merge(self, other: "SummaryStatistics") -> None:
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def count(self) -> int:
+        return self.stats.count
+
+    @property
+    def min(self) -> float:
+        return self.stats.min
+
+    @property
+    def max(self) -> float:
+        return self.stats.max
+
+    def quantile(self, q: float) -> float:
+        """Returns a quantile from the sketch, clamped to the exact minimum
+        and maximum. The sketch gives the middle of a bucket, which can lie
+        outside the values, e.g. 0.995 for values that are all 1.
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: Estimated quantile (nan if there are no values)
+        """
+        if self.stats.count == 0:
+            return np.nan
+        if self.stats.min == self.stats.max:
+            return self.stats.min
+        return float(np.clip(self.sketch.quantile(q), self.stats.min, self.stats.max))
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    def describe(self) -> dict[str, float]:
+        """Returns the same statistics as pandas' describe().
+
+        Returns:
+            dict[str, float]: count, mean, std, min, 25%, 50%, 75% and max
+        """
+        return {
+            "count": self.stats.count,
+            "mean": self.stats.mean,
+            "std": self.stats.std,
+            "min": self.stats.min,
+            "25%": self.quantile(0.25),
+            "50%": self.quantile(0.5),
+            "75%": self.quantile(0.75),
+            "max": self.stats.max,
+        }
+
+    def format(self, name: str) -> str:
+        """Formats describe() and median() like the pandas output they replace.
+
+        Args:
+            name (str): Name of the quantity, including its units
+
+        Returns:
+            str: Printable table
+        """
+        lines: list[str] = [f"{'':<6} {name}"]
+        lines += [f"{key:<6} {value:.6g}" for key, value in self.describe().items()]
+        lines.append(f"median: {self.median():.6g}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        """Returns a JSON-serialisable copy of the summary."""
+        return {
+            "count": self.stats.count,
+            "weight": self.stats.weight,
+            "weight_sq": self.stats.weight_sq,
+            "mean": self.stats.mean,
+            "m2": self.stats.m2,
+            "min": self.stats.min,
+            "max": self.stats.max,
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SummaryStatistics":
+        sketch = QuantileSketch.from_dict(data["sketch"])
+        summary = cls(sketch.relative_accuracy)
+        summary.sketch = sketch
+        summary.stats.count = int(data["count"])
+        summary.stats.weight = float(data.get("weight", data["count"]))
+        summary.stats.weight_sq = float(data.get("weight_sq", data["count"]))
+        summary.stats.mean = float(data["mean"])
+        summary.stats.m2 = float(data["m2"])
+        summary.stats.min = float(data["min"])
+        summary.stats.max = float(data["max"])
+        return summary
+
+
+class StreamSummary:
+    """Summary statistics and a log histogram of one quantity,
+    updated together chunk by chunk."""
+
+    def __init__(self, low: float, high: float, num: int = 75) -> None:
+        self.summary: SummaryStatistics = SummaryStatistics()
+        self.histogram: LogHistogram = LogHistogram(low, high, num)
+
+    def update(self, values: np.ndarray) -> None:
+        self.summary.update(values)
+        self.histogram.update(values)
+
+    def merge(self, other: "StreamSummary") -> None:
+        self.summary.merge(other.summary)
+        self.histogram.merge(other.histogram)
+
+    @property
+    def stats(self) -> RunningStats:
+        return self.summary.stats
+
+    def describe(self) -> dict[str, float]:
+        return self.summary.describe()
+
+    def to_dict(self) -> dict:
+        """Returns a JSON-serialisable copy of the summary and histogram."""
+        return {
+            "summary": self.summary.to_dict(),
+            "histogram": self.histogram.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StreamSummary":
+        histogram = LogHistogram.from_dict(data["histogram"])
+        edges: np.ndarray = histogram.edges
+        stream_summary = cls(edges[0], edges[-1], len(edges))
+        stream_summary.summary = SummaryStatistics.from_dict(data["summary"])
+        stream_summary.histogram = histogram
+        return stream_summary
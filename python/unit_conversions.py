@@ -1,4 +1,4 @@
-import astropy.constants as astro_const
+import constants
 import numpy as np
 
 
@@ -10,8 +10,8 @@ def si_to_msun_au3(density: np.ndarray) -> np.ndarray:
     Returns:
         np.ndarray: Density in Msun/AU^3
     """
-    au_to_m: float = astro_const.au.value
-    m_sun: float = astro_const.M_sun.value
+    au_to_m: float = constants.AU
+    m_sun: float = constants.M_SUN
     return density * (au_to_m**3) / m_sun
 
 
@@ -23,8 +23,8 @@ def si_to_msun_pc3(density: np.ndarray) -> np.ndarray:
     Returns:
         np.ndarray: Density in Msun/pc^3
     """
-    pc_to_m: float = astro_const.pc.value
-    m_sun: float = astro_const.M_sun.value
+    pc_to_m: float = constants.PC
+    m_sun: float = constants.M_SUN
     return density * (pc_to_m**3) / m_sun
 
 
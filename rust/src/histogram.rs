@@ -0,0 +1,81 @@
+use crate::sampling::{self, Points};
+
+use rayon::prelude::*;
+
+/// Checks that `edges` can be used as histogram bin edges:
+/// at least two finite values in strictly increasing order.
+pub fn check_edges(edges: &[f64]) -> Result<(), String> {
+    if edges.len() < 2 {
+        return Err("At least two bin edges are needed".to_string());
+    }
+    if edges.iter().any(|e| !e.is_finite()) {
+        return Err("Bin edges must be finite".to_string());
+    }
+    if edges.windows(2).any(|w| w[0] >= w[1]) {
+        return Err("Bin edges must be strictly increasing".to_string());
+    }
+    Ok(())
+}
+
+/// Returns the bin `x` falls in, with the same convention as
+/// `numpy.histogram`: every bin is half-open, [edges[i], edges[i + 1]),
+/// except the last, which also includes its upper edge.
+/// Values outside the edges are not counted.
+pub fn bin_index(edges: &[f64], x: f64) -> Option<usize> {
+    let last = edges.len() - 1;
+    if !(x >= edges[0] && x <= edges[last]) {
+        return None;
+    }
+    // Number of edges <= x, found by binary search
+    let above = edges.partition_point(|&e| e <= x);
+    Some((above - 1).min(last - 1))
+}
+
+/// Draws `n` samples of `dist(u)` in parallel and bins them, without ever
+/// holding the samples in memory.
+///
+/// Samples come from the same points as `sampling::fill_blocks`,
+/// so the counts equal a histogram of `fill_blocks`'s output for the
+/// same points, whatever the number of threads.
+///
+/// Args:
+///   edges: Bin edges, checked with `check_edges`.
+///   n: Number of samples.
+///   points: Uniform points of the run (seed, stream and strategy).
+///   dist: Quantile function mapping `u` to a sample.
+///
+/// Returns:
+///   Vec<u64>: Number of samples in each of the `edges.len() - 1` bins.
+pub fn histogram_parallel<F>(edges: &[f64], n: usize, points: &Points, dist: F) -> Vec<u64>
+where
+    F: Fn(f64) -> f64 + Sync,
+{
+    let bins = edges.len() - 1;
+    let blocks = (n + sampling::BLOCK_SIZE - 1) / sampling::BLOCK_SIZE;
+    (0..blocks)
+        .into_par_iter()
+        .fold(
+            || vec![0u64; bins],
+            |mut counts, block| {
+                let mut rng = points.rng(block);
+                let first = block * sampling::BLOCK_SIZE;
+                let len = sampling::BLOCK_SIZE.min(n - first);
+                for index in first..first + len {
+                    if let Some(i) = bin_index(edges, dist(points.point(index, &mut rng))) {
+                        counts[i] += 1;
+                    }
+                }
+                counts
+            },
+        )
+        .reduce(
+            || vec![0u64; bins],
+            |mut total, counts| {
+                for (t, c) in total.iter_mut().zip(counts) {
+                    *t += c;
+                }
+                total
+            },
+        )
+}
+
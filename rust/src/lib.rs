@@ -1,18 +1,38 @@
+extern crate numpy;
 extern crate pyo3;
 extern crate rand;
+extern crate rand_chacha;
+extern crate rayon;
 
+mod histogram;
 mod monte_carlo;
 mod quantile_function;
 mod rock_dist;
+mod samplers;
+mod sampling;
+mod stream;
+mod table;
 use monte_carlo::Key;
+use quantile_function::ImfQuantile;
+use rock_dist::RockQuantile;
+use sampling::{Points, Strategy, TailImportance};
+use table::Quantile;
 
+use numpy::{IntoPyArray, PyArray1, PyReadonlyArray1};
 use pyo3::prelude::*;
-use rand::{rngs::ThreadRng, Rng};
+use pyo3::types::PyDict;
+use pyo3::exceptions::PyValueError;
 use std::collections::HashMap;
 
 const RUNS: usize = 100_000;
 const AU_TO_M: f64 = 1.496e11;
 
+// Default importance sampling of the upper tails: half of the points are
+// drawn from the density 0.1 (1 - u)^-0.9, which puts about 6% of all
+// points above the 1 - 10^-9 quantile, against 10^-9 of them uniformly
+const TAIL_FRACTION: f64 = 0.5;
+const TAIL_INDEX: f64 = 0.9;
+
 // Converting my custom Key struct to a Python float
 use pyo3::types::PyFloat;
 
@@ -22,31 +42,330 @@ impl IntoPy<PyObject> for Key {
     }
 }
 
+/// Draws `n` stellar masses (SI units) from the IMF.
+fn sample_stellar_masses(n: usize, seed: u64) -> Vec<f64> {
+    let mut stellar_mass: Vec<f64> = vec![0.0; n];
+    let quantile = ImfQuantile::default();
+    // Quantile function takes in a random number from 0 to 1 (uniform distribution)
+    sampling::fill_parallel(
+        &mut stellar_mass,
+        seed,
+        sampling::STELLAR_MASS_STREAM,
+        |u| quantile.quantile(u),
+    );
+    stellar_mass
+}
+
+/// Returns the points of `stream` for a run of `n` samples, drawn with
+/// the strategy named `strategy` (see `sampling::Strategy`).
+fn points(strategy: &str, seed: Option<u64>, stream: u64, n: usize) -> PyResult<Points> {
+    let strategy = Strategy::parse(strategy).map_err(PyValueError::new_err)?;
+    let seed = seed.unwrap_or_else(sampling::random_seed);
+    Ok(Points::new(strategy, seed, stream, n))
+}
+
+/// Bins `n` samples of `dist` into `edges` on `threads` threads.
+fn sample_histogram<'py, F>(
+    py: Python<'py>,
+    edges: PyReadonlyArray1<'py, f64>,
+    n: usize,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    strategy: &str,
+    stream: u64,
+    dist: F,
+) -> PyResult<&'py PyArray1<u64>>
+where
+    F: Fn(f64) -> f64 + Sync,
+{
+    let edges: &[f64] = edges.as_slice()?;
+    histogram::check_edges(edges).map_err(PyValueError::new_err)?;
+    let points = points(strategy, seed, stream, n)?;
+    let counts = py.allow_threads(|| {
+        run_with_threads(threads, || {
+            histogram::histogram_parallel(edges, n, &points, &dist)
+        })
+    })?;
+    Ok(counts.into_pyarray(py))
+}
+
+/// Runs `f` on `threads` threads, turning pool errors into a Python ValueError.
+fn run_with_threads<T, F>(threads: Option<usize>, f: F) -> PyResult<T>
+where
+    T: Send,
+    F: FnOnce() -> T + Send,
+{
+    sampling::with_threads(threads, f).map_err(|e| PyValueError::new_err(e.to_string()))
+}
+
+/// Fills `out`, or a new array of `n` values, with samples of `dist`.
+///
+/// `n` defaults to the length of `out`, or to RUNS without `out`.
+/// Samples are written straight into the array's buffer, so no list of
+/// Python floats or intermediate Vec is ever made. The GIL is released
+/// while sampling. The array's borrow only guards against other Rust
+/// borrows of it; NumPy and Python code writing to `out` from another
+/// thread would race with the fill, so callers must not touch `out`
+/// until the call returns.
+fn sample_into<'py, F>(
+    py: Python<'py>,
+    n: Option<usize>,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    out: Option<&'py PyArray1<f64>>,
+    strategy: &str,
+    stream: u64,
+    dist: F,
+) -> PyResult<&'py PyArray1<f64>>
+where
+    F: Fn(f64) -> f64 + Sync,
+{
+    let array: &PyArray1<f64> = match out {
+        Some(out) => {
+            if let Some(n) = n.filter(|&n| n != out.len()) {
+                return Err(PyValueError::new_err(format!(
+                    "n = {} does not match len(out) = {}",
+                    n,
+                    out.len()
+                )));
+            }
+            out
+        }
+        None => PyArray1::zeros(py, n.unwrap_or(RUNS), false),
+    };
+    let points = points(strategy, seed, stream, array.len())?;
+    let mut buffer = array.try_readwrite()?;
+    let values: &mut [f64] = buffer.as_slice_mut()?;
+    py.allow_threads(|| {
+        run_with_threads(threads, || {
+            sampling::fill_blocks(values, &points, 0, &dist)
+        })
+    })?;
+    Ok(array)
+}
+
+/// Samples `n` values of `dist` with importance sampling of its upper
+/// tail (see `sampling::TailImportance`), returning the values and weights.
+fn sample_weighted<'py, F>(
+    py: Python<'py>,
+    n: usize,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    strategy: &str,
+    tail_fraction: f64,
+    tail_index: f64,
+    stream: u64,
+    dist: F,
+) -> PyResult<(&'py PyArray1<f64>, &'py PyArray1<f64>)>
+where
+    F: Fn(f64) -> f64 + Sync,
+{
+    let points = points(strategy, seed, stream, n)?;
+    let tail = TailImportance::new(tail_fraction, tail_index).map_err(PyValueError::new_err)?;
+    let (values, weights) = py.allow_threads(|| {
+        run_with_threads(threads, || {
+            let mut values: Vec<f64> = vec![0.0; n];
+            let mut weights: Vec<f64> = vec![0.0; n];
+            sampling::fill_weighted(&mut values, &mut weights, &points, &tail, &dist);
+            (values, weights)
+        })
+    })?;
+    Ok((values.into_pyarray(py), weights.into_pyarray(py)))
+}
+
 // Functions begin
+/// Samples `n` stellar masses (SI units) in parallel into a float64 NumPy array.
+/// The same `seed` gives the same masses for any number of `threads`.
+///
+/// If `out` (a writable, contiguous float64 array) is given, the masses are
+/// written into it and it is returned, so repeated batches can reuse one
+/// buffer. `n` then defaults to `len(out)`.
+///
+/// `strategy` picks how the uniform numbers behind the masses are drawn:
+/// "random", "stratified", "sobol" or "halton" (see `sampling::Strategy`).
 #[pyfunction]
-pub fn get_stellar_masses() -> Vec<f64> {
-    let mut rng: ThreadRng = rand::thread_rng(); // Quantile function takes in a random number from 0 to 1 (uniform distribution)
+#[pyo3(signature = (n=None, seed=None, threads=None, out=None, strategy="random"))]
+pub fn get_stellar_masses<'py>(
+    py: Python<'py>,
+    n: Option<usize>,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    out: Option<&'py PyArray1<f64>>,
+    strategy: &str,
+) -> PyResult<&'py PyArray1<f64>> {
+    let quantile = ImfQuantile::default();
+    sample_into(
+        py,
+        n,
+        seed,
+        threads,
+        out,
+        strategy,
+        sampling::STELLAR_MASS_STREAM,
+        |u| quantile.quantile(u),
+    )
+}
 
-    let stellar_mass: Vec<f64> = (0..RUNS)
-        .map(|_| quantile_function::quantile_func(rng.gen_range(0.0..1.0)))
-        .collect();
+/// Samples `n` rock masses (SI units) in parallel into a float64 NumPy array.
+/// The same `seed` gives the same masses for any number of `threads`.
+/// `out` and `strategy` work as for `get_stellar_masses`.
+#[pyfunction]
+#[pyo3(signature = (n=None, seed=None, threads=None, out=None, strategy="random"))]
+pub fn get_rock_masses<'py>(
+    py: Python<'py>,
+    n: Option<usize>,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    out: Option<&'py PyArray1<f64>>,
+    strategy: &str,
+) -> PyResult<&'py PyArray1<f64>> {
+    let quantile = RockQuantile::default();
+    sample_into(
+        py,
+        n,
+        seed,
+        threads,
+        out,
+        strategy,
+        sampling::ROCK_MASS_STREAM,
+        |u| quantile.quantile(u),
+    )
+}
 
-    stellar_mass // SI units
+/// Samples `n` stellar masses (SI units) with importance sampling of the
+/// high-mass tail, and returns them with their weights as two float64 arrays.
+///
+/// A fraction `tail_fraction` of the points is drawn from a density that
+/// piles up towards the most massive stars, set by `tail_index` in [0, 1),
+/// and the rest uniformly. Weighted statistics of the masses (and of
+/// anything computed from them) are unbiased, and the weights average 1.
+/// `strategy` works as for `get_stellar_masses`.
+#[pyfunction]
+#[pyo3(signature = (
+    n=RUNS,
+    seed=None,
+    threads=None,
+    strategy="random",
+    tail_fraction=TAIL_FRACTION,
+    tail_index=TAIL_INDEX,
+))]
+pub fn get_weighted_stellar_masses<'py>(
+    py: Python<'py>,
+    n: usize,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    strategy: &str,
+    tail_fraction: f64,
+    tail_index: f64,
+) -> PyResult<(&'py PyArray1<f64>, &'py PyArray1<f64>)> {
+    let quantile = ImfQuantile::default();
+    sample_weighted(
+        py,
+        n,
+        seed,
+        threads,
+        strategy,
+        tail_fraction,
+        tail_index,
+        sampling::STELLAR_MASS_STREAM,
+        |u| quantile.quantile(u),
+    )
 }
 
+/// Samples `n` rock masses (kg) with importance sampling of the
+/// high-mass tail, returning the masses and their weights.
+/// See `get_weighted_stellar_masses`.
 #[pyfunction]
-pub fn get_rock_masses() -> Vec<f64> {
-    let mut rng: ThreadRng = rand::thread_rng();
+#[pyo3(signature = (
+    n=RUNS,
+    seed=None,
+    threads=None,
+    strategy="random",
+    tail_fraction=TAIL_FRACTION,
+    tail_index=TAIL_INDEX,
+))]
+pub fn get_weighted_rock_masses<'py>(
+    py: Python<'py>,
+    n: usize,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    strategy: &str,
+    tail_fraction: f64,
+    tail_index: f64,
+) -> PyResult<(&'py PyArray1<f64>, &'py PyArray1<f64>)> {
+    let quantile = RockQuantile::default();
+    sample_weighted(
+        py,
+        n,
+        seed,
+        threads,
+        strategy,
+        tail_fraction,
+        tail_index,
+        sampling::ROCK_MASS_STREAM,
+        |u| quantile.quantile(u),
+    )
+}
 
-    let rock_mass: Vec<f64> = (0..RUNS)
-        .map(|_| rock_dist::rock_dist(rng.gen_range(0.0..1.0)))
-        .collect();
+/// Samples `n` stellar masses in parallel and returns only their histogram,
+/// so the IMF can be estimated from far more draws than fit in memory.
+///
+/// `edges` are the bin edges in SI units (a contiguous float64 array),
+/// binned like `numpy.histogram`. The counts are a uint64 array and equal
+/// `numpy.histogram(get_stellar_masses(n, seed), edges)` for the same seed
+/// and `strategy`.
+#[pyfunction]
+#[pyo3(signature = (edges, n=RUNS, seed=None, threads=None, strategy="random"))]
+pub fn histogram_stellar_masses<'py>(
+    py: Python<'py>,
+    edges: PyReadonlyArray1<'py, f64>,
+    n: usize,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    strategy: &str,
+) -> PyResult<&'py PyArray1<u64>> {
+    let quantile = ImfQuantile::default();
+    sample_histogram(
+        py,
+        edges,
+        n,
+        seed,
+        threads,
+        strategy,
+        sampling::STELLAR_MASS_STREAM,
+        |u| quantile.quantile(u),
+    )
+}
 
-    rock_mass // SI units
+/// Samples `n` rock masses in parallel and returns only their histogram.
+/// See `histogram_stellar_masses`.
+#[pyfunction]
+#[pyo3(signature = (edges, n=RUNS, seed=None, threads=None, strategy="random"))]
+pub fn histogram_rock_masses<'py>(
+    py: Python<'py>,
+    edges: PyReadonlyArray1<'py, f64>,
+    n: usize,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    strategy: &str,
+) -> PyResult<&'py PyArray1<u64>> {
+    let quantile = RockQuantile::default();
+    sample_histogram(
+        py,
+        edges,
+        n,
+        seed,
+        threads,
+        strategy,
+        sampling::ROCK_MASS_STREAM,
+        |u| quantile.quantile(u),
+    )
 }
 
 #[pyfunction]
-pub fn return_coll_times() -> (
+pub fn return_coll_times(
+    py: Python<'_>,
+) -> (
     HashMap<Key, HashMap<Key, f64>>,
     HashMap<Key, HashMap<Key, HashMap<Key, f64>>>,
     HashMap<Key, HashMap<Key, HashMap<Key, f64>>>,
@@ -62,15 +381,92 @@ pub fn return_coll_times() -> (
         v_o[i] *= 1_000.0;
     }
 
-    let stellar_masses: Vec<f64> = get_stellar_masses();
+    py.allow_threads(|| {
+        let stellar_masses: Vec<f64> = sample_stellar_masses(RUNS, sampling::random_seed());
+
+        monte_carlo::get_coll_times(n_o, v_o, stellar_masses) // Everything in SI units
+    })
+}
+
+/// Same values as `return_coll_times`, but returned as two dicts of flat
+/// float64 NumPy arrays instead of nested dicts.
+///
+/// The first dict holds the Earth columns `n_o`, `v_o` and `coll_time`.
+/// The second holds the disk columns `stellar_mass`, `n_o`, `v_o`,
+/// `coll_time_side` and `coll_time_top`.
+///
+/// If `stellar_masses` is given (a contiguous float64 array in SI units),
+/// those masses are used so the collision times describe the same
+/// population as the rest of the run. Otherwise a fresh sample is drawn.
+///
+/// `n_o` (in AU^-3) and `v_o` (in km/s) set the grid. They default to
+/// [0.01, 0.05, 0.1, 0.5, 1.0] AU^-3 and [1, 5, 10, 20, 30] km/s.
+#[pyfunction]
+#[pyo3(signature = (stellar_masses=None, n_o=None, v_o=None))]
+pub fn return_coll_time_columns<'py>(
+    py: Python<'py>,
+    stellar_masses: Option<PyReadonlyArray1<'py, f64>>,
+    n_o: Option<Vec<f64>>,
+    v_o: Option<Vec<f64>>,
+) -> PyResult<(&'py PyDict, &'py PyDict)> {
+    let mut n_o: Vec<f64> = n_o.unwrap_or_else(|| vec![0.01, 0.05, 0.1, 0.5, 1.0]);
+    let mut v_o: Vec<f64> = v_o.unwrap_or_else(|| vec![1.0, 5.0, 10.0, 20.0, 30.0]);
+
+    // unit conversions
+    for i in 0..n_o.len() {
+        n_o[i] /= AU_TO_M.powi(3);
+    }
+    for i in 0..v_o.len() {
+        v_o[i] *= 1_000.0;
+    }
+
+    let given_masses: Option<&[f64]> = match &stellar_masses {
+        Some(masses) => Some(masses.as_slice()?),
+        None => None,
+    };
+
+    // Only plain Rust data is touched here, so other Python threads run meanwhile
+    let columns = py.allow_threads(|| {
+        let sampled_masses: Vec<f64>;
+        let stellar_masses: &[f64] = match given_masses {
+            Some(masses) => masses,
+            None => {
+                sampled_masses = sample_stellar_masses(RUNS, sampling::random_seed());
+                &sampled_masses
+            }
+        };
+        monte_carlo::get_coll_time_columns(&n_o, &v_o, stellar_masses) // Everything in SI units
+    });
+
+    let earth = PyDict::new(py);
+    earth.set_item("n_o", columns.earth_n_o.into_pyarray(py))?;
+    earth.set_item("v_o", columns.earth_v_o.into_pyarray(py))?;
+    earth.set_item("coll_time", columns.earth_coll_time.into_pyarray(py))?;
+
+    let disk = PyDict::new(py);
+    disk.set_item("stellar_mass", columns.stellar_mass.into_pyarray(py))?;
+    disk.set_item("n_o", columns.n_o.into_pyarray(py))?;
+    disk.set_item("v_o", columns.v_o.into_pyarray(py))?;
+    disk.set_item("coll_time_side", columns.coll_time_side.into_pyarray(py))?;
+    disk.set_item("coll_time_top", columns.coll_time_top.into_pyarray(py))?;
 
-    monte_carlo::get_coll_times(n_o, v_o, stellar_masses) // Everything in SI units
+    Ok((earth, disk))
 }
 
 #[pymodule]
 fn rust(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(get_stellar_masses, m)?)?;
     m.add_function(wrap_pyfunction!(get_rock_masses, m)?)?;
+    m.add_function(wrap_pyfunction!(get_weighted_stellar_masses, m)?)?;
+    m.add_function(wrap_pyfunction!(get_weighted_rock_masses, m)?)?;
+    m.add_function(wrap_pyfunction!(histogram_stellar_masses, m)?)?;
+    m.add_function(wrap_pyfunction!(histogram_rock_masses, m)?)?;
     m.add_function(wrap_pyfunction!(return_coll_times, m)?)?;
+    m.add_function(wrap_pyfunction!(return_coll_time_columns, m)?)?;
+    m.add_class::<stream::SampleStream>()?;
+    m.add_class::<samplers::ImfSampler>()?;
+    m.add_class::<samplers::RockSampler>()?;
+    m.add_function(wrap_pyfunction!(stream::stream_stellar_masses, m)?)?;
+    m.add_function(wrap_pyfunction!(stream::stream_rock_masses, m)?)?;
     Ok(())
 }
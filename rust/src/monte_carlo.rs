@@ -4,6 +4,8 @@ use std::collections::HashMap;
 use std::f64::consts::PI;
 use std::hash::{Hash, Hasher};
 
+use rayon::prelude::*;
+
 #[derive(PartialEq, Debug, Copy, Clone)]
 pub struct Key {
     pub value: f64,
@@ -70,6 +72,110 @@ pub fn get_coll_times(
     (coll_times_earth, coll_times_disk_side, coll_times_disk_top)
 }
 
+/// Flat, column-oriented collision times.
+///
+/// Every `Vec` in a group has the same length, so row `i` of the Earth
+/// columns (or of the disk columns) describes one (n_o, v_o) or
+/// (stellar mass, n_o, v_o) combination. Rows are ordered stellar mass
+/// first, then n_o, then v_o.
+pub struct CollTimeColumns {
+    pub earth_n_o: Vec<f64>,
+    pub earth_v_o: Vec<f64>,
+    pub earth_coll_time: Vec<f64>,
+    pub stellar_mass: Vec<f64>,
+    pub n_o: Vec<f64>,
+    pub v_o: Vec<f64>,
+    pub coll_time_side: Vec<f64>,
+    pub coll_time_top: Vec<f64>,
+}
+
+/// Terms of the disk collision times that only depend on the star,
+/// so they can be computed once per star instead of once per (n_o, v_o).
+pub struct DiskTerms {
+    pub csa_sideview: f64,
+    pub csa_topview: f64,
+    pub v_esc_sq: f64,
+}
+
+impl DiskTerms {
+    pub fn new(stellar_mass: f64) -> DiskTerms {
+        let disk_mass: f64 = 0.1 * stellar_mass;
+        let disk_radius: f64 = 200.0 * AU_TO_M * (stellar_mass / M_SUN).powf(0.3);
+
+        DiskTerms {
+            csa_sideview: 0.1 * AU_TO_M * disk_radius,
+            csa_topview: PI * disk_radius.powi(2),
+            v_esc_sq: 2.0 * G * (stellar_mass + disk_mass) / disk_radius,
+        }
+    }
+
+    /// n_o * v_o * (1 + v_esc^2 / v_o^2), the flux per unit cross section
+    /// including gravitational focusing.
+    #[inline]
+    fn focused_flux(&self, n_o: f64, v_o: f64) -> f64 {
+        n_o * (v_o + self.v_esc_sq / v_o)
+    }
+}
+
+/// Same physics as `get_coll_times`, but stored as contiguous columns
+/// instead of nested hash maps so they can be handed to NumPy directly.
+///
+/// The per-star terms are computed once per star, and stars are
+/// processed in parallel, each filling its own slice of every column.
+pub fn get_coll_time_columns(n_o: &[f64], v_o: &[f64], stellar_masses: &[f64]) -> CollTimeColumns {
+    let n_grid = n_o.len() * v_o.len();
+    let n_rows = stellar_masses.len() * n_grid;
+
+    let mut columns = CollTimeColumns {
+        earth_n_o: Vec::with_capacity(n_grid),
+        earth_v_o: Vec::with_capacity(n_grid),
+        earth_coll_time: Vec::with_capacity(n_grid),
+        stellar_mass: vec![0.0; n_rows],
+        n_o: vec![0.0; n_rows],
+        v_o: vec![0.0; n_rows],
+        coll_time_side: vec![0.0; n_rows],
+        coll_time_top: vec![0.0; n_rows],
+    };
+
+    for &n in n_o {
+        for &v in v_o {
+            columns.earth_n_o.push(n);
+            columns.earth_v_o.push(v);
+            columns.earth_coll_time.push(t_coll_earth(n, v));
+        }
+    }
+
+    if n_grid == 0 {
+        return columns;
+    }
+
+    (
+        columns.stellar_mass.par_chunks_mut(n_grid),
+        columns.n_o.par_chunks_mut(n_grid),
+        columns.v_o.par_chunks_mut(n_grid),
+        columns.coll_time_side.par_chunks_mut(n_grid),
+        columns.coll_time_top.par_chunks_mut(n_grid),
+        stellar_masses.par_iter(),
+    )
+        .into_par_iter()
+        .for_each(|(mass_row, n_row, v_row, side_row, top_row, &stellar_mass)| {
+            let terms = DiskTerms::new(stellar_mass);
+            for (i, &n) in n_o.iter().enumerate() {
+                for (j, &v) in v_o.iter().enumerate() {
+                    let k = i * v_o.len() + j;
+                    let flux = terms.focused_flux(n, v);
+                    mass_row[k] = stellar_mass;
+                    n_row[k] = n;
+                    v_row[k] = v;
+                    side_row[k] = 1.0 / (flux * terms.csa_sideview);
+                    top_row[k] = 1.0 / (flux * terms.csa_topview);
+                }
+            }
+        });
+
+    columns
+}
+
 fn t_coll_earth(n_o: f64, v_o: f64) -> f64 {
     let r_earth = 6.371e6; // in meters
     let m_earth = 5.972e24; // in kilograms
@@ -1,41 +1,97 @@
 /// This module contains functions representing equations in https://doi.org/10.1093/mnras/sts479
 
-const STELLAR_MASS: f64 = 1.98840987e30;
-const MU: f64 = 0.2 * STELLAR_MASS;
-const ALPHA: f64 = 2.3;
-const BETA: f64 = 1.4;
-const UPPER_MASS_LIMIT: f64 = 50.0 * STELLAR_MASS; // This value is the only one different from the paper
-const LOWER_MASS_LIMIT: f64 = 0.1 * STELLAR_MASS;
+use crate::table::Quantile;
 
-/// This function replicates the quantile function,
-/// Equation 4 in Table 1 of https://doi.org/10.1093/mnras/sts479.
-/// Values of constants are taken directly from the paper,
-/// except the upper mass limit.
-///
-/// Args:
-///   u: A f64 value, a random number between 0 and 1.
-///
-/// Returns:
-///  f64: The stellar mass value associated with the given u value (in solar masses).
+pub const STELLAR_MASS: f64 = 1.98840987e30;
+pub const MU: f64 = 0.2; // Solar masses
+pub const ALPHA: f64 = 2.3;
+pub const BETA: f64 = 1.4;
+pub const UPPER_MASS_LIMIT: f64 = 50.0; // Solar masses. This value is the only one different from the paper
+pub const LOWER_MASS_LIMIT: f64 = 0.1; // Solar masses
+
+/// The quantile function of the IMF,
+/// Equation 4 in Table 1 of https://doi.org/10.1093/mnras/sts479,
+/// with every term that does not depend on `u` computed once in `new`.
 ///
-pub fn quantile_func(u: f64) -> f64 {
-    MU * ((u * (auxiliary_func(UPPER_MASS_LIMIT) - auxiliary_func(LOWER_MASS_LIMIT))
-        + auxiliary_func(LOWER_MASS_LIMIT))
-    .powf(1.0 / (1.0 - BETA))
-        - 1.0)
-        .powf(1.0 / (1.0 - ALPHA))
+/// `Default` gives the values of the paper, except the upper mass limit.
+#[derive(Clone, Debug)]
+pub struct ImfQuantile {
+    pub mu: f64,
+    pub alpha: f64,
+    pub beta: f64,
+    pub lower: f64,
+    pub upper: f64,
+    mu_si: f64,
+    aux_lower: f64,
+    aux_range: f64,
+    beta_exponent: f64,
+    alpha_exponent: f64,
+}
+
+impl ImfQuantile {
+    /// Args:
+    ///   mu: Scale mass of the IMF, in solar masses.
+    ///   alpha: High-mass power-law index.
+    ///   beta: Low-mass power-law index.
+    ///   lower: Lower mass limit, in solar masses.
+    ///   upper: Upper mass limit, in solar masses.
+    pub fn new(mu: f64, alpha: f64, beta: f64, lower: f64, upper: f64) -> Result<Self, String> {
+        if !(mu > 0.0 && lower > 0.0 && lower < upper && upper.is_finite()) {
+            return Err("Need mu > 0 and 0 < lower < upper".to_string());
+        }
+        if alpha == 1.0 || beta == 1.0 {
+            return Err("alpha and beta must not be 1".to_string());
+        }
+        // Evaluated in SI units, like the samples
+        let mu_si = mu * STELLAR_MASS;
+        let aux_lower = auxiliary_func(lower * STELLAR_MASS, mu_si, alpha, beta);
+        let aux_upper = auxiliary_func(upper * STELLAR_MASS, mu_si, alpha, beta);
+        Ok(ImfQuantile {
+            mu,
+            alpha,
+            beta,
+            lower,
+            upper,
+            mu_si,
+            aux_lower,
+            aux_range: aux_upper - aux_lower,
+            beta_exponent: 1.0 / (1.0 - beta),
+            alpha_exponent: 1.0 / (1.0 - alpha),
+        })
+    }
+}
+
+impl Default for ImfQuantile {
+    fn default() -> Self {
+        ImfQuantile::new(MU, ALPHA, BETA, LOWER_MASS_LIMIT, UPPER_MASS_LIMIT).unwrap()
+    }
+}
+
+impl Quantile for ImfQuantile {
+    /// Args:
+    ///   u: A f64 value, a random number between 0 and 1.
+    ///
+    /// Returns:
+    ///  f64: The stellar mass value associated with the given u value (SI units).
+    #[inline]
+    fn quantile(&self, u: f64) -> f64 {
+        self.mu_si
+            * ((u * self.aux_range + self.aux_lower).powf(self.beta_exponent) - 1.0)
+                .powf(self.alpha_exponent)
+    }
 }
 
 /// This function replicates the auxiliary function,
 /// Equation 1 in Table 1 of https://doi.org/10.1093/mnras/sts479.
-/// Values of constants are taken directly from the paper.
 ///
 /// Args:
 ///  stellar_mass: A f64 value, the stellar mass value.
+///  mu: Scale mass of the IMF, in the same units as stellar_mass.
+///  alpha, beta: Power-law indices of the IMF.
 ///
 /// Returns:
 ///  f64: The value of the auxiliary function for the given stellar mass.
 ///
-fn auxiliary_func(stellar_mass: f64) -> f64 {
-    (1.0 + (stellar_mass / MU).powf(1.0 - ALPHA)).powf(1.0 - BETA)
+fn auxiliary_func(stellar_mass: f64, mu: f64, alpha: f64, beta: f64) -> f64 {
+    (1.0 + (stellar_mass / mu).powf(1.0 - alpha)).powf(1.0 - beta)
 }
@@ -1,16 +1,62 @@
-const P: f64 = 1.8;
-const M_MOON: f64 = 7.34767309e22;
-const M_LOW: f64 = 10.0;
-const M_UPP: f64 = M_MOON;
+use crate::table::Quantile;
 
-/// This function generates a mass distribution of rocks,
-/// rocks being the type of rock 'Oumuamua is thought to be.
-///
-/// Args:
-///    u (f64): Random number between 0 and 1
+pub const P: f64 = 1.8;
+pub const M_MOON: f64 = 7.34767309e22;
+pub const M_LOW: f64 = 10.0;
+pub const M_UPP: f64 = M_MOON;
+
+/// Mass distribution of rocks, rocks being the type of rock
+/// 'Oumuamua is thought to be: a power law dN/dm ∝ m^-P between
+/// `lower` and `upper`, with the powers of the limits computed once in `new`.
 ///
-/// Returns:
-///   f64: Rock mass in kg
-pub fn rock_dist(u: f64) -> f64 {
-    (u * M_UPP.powf(1.0 - P) + (1.0 - u) * M_LOW.powf(1.0 - P)).powf(1.0 / (1.0 - P))
+/// `Default` gives P = 1.8 between 10 kg and the mass of the Moon.
+#[derive(Clone, Debug)]
+pub struct RockQuantile {
+    pub p: f64,
+    pub lower: f64,
+    pub upper: f64,
+    lower_term: f64,
+    upper_term: f64,
+    exponent: f64,
+}
+
+impl RockQuantile {
+    /// Args:
+    ///   p: Power-law index of the mass distribution.
+    ///   lower: Lower mass limit, in kg.
+    ///   upper: Upper mass limit, in kg.
+    pub fn new(p: f64, lower: f64, upper: f64) -> Result<Self, String> {
+        if !(lower > 0.0 && lower < upper && upper.is_finite()) {
+            return Err("Need 0 < lower < upper".to_string());
+        }
+        if p == 1.0 {
+            return Err("p must not be 1".to_string());
+        }
+        Ok(RockQuantile {
+            p,
+            lower,
+            upper,
+            lower_term: lower.powf(1.0 - p),
+            upper_term: upper.powf(1.0 - p),
+            exponent: 1.0 / (1.0 - p),
+        })
+    }
+}
+
+impl Default for RockQuantile {
+    fn default() -> Self {
+        RockQuantile::new(P, M_LOW, M_UPP).unwrap()
+    }
+}
+
+impl Quantile for RockQuantile {
+    /// Args:
+    ///    u (f64): Random number between 0 and 1
+    ///
+    /// Returns:
+    ///   f64: Rock mass in kg
+    #[inline]
+    fn quantile(&self, u: f64) -> f64 {
+        (u * self.upper_term + (1.0 - u) * self.lower_term).powf(self.exponent)
+    }
 }
@@ -0,0 +1,469 @@
+use std::sync::Arc;
+
+use numpy::{IntoPyArray, PyArray1, PyReadonlyArray1};
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+
+use crate::quantile_function::{self, ImfQuantile};
+use crate::rock_dist::{self, RockQuantile};
+use crate::sampling;
+use crate::stream::SampleStream;
+use crate::table::{Quantile, Sampler};
+use crate::{sample_histogram, sample_into, sample_weighted, RUNS, TAIL_FRACTION, TAIL_INDEX};
+
+const DEFAULT_TOLERANCE: f64 = 1e-6;
+
+fn build<Q: Quantile>(
+    quantile: Result<Q, String>,
+    table_size: Option<usize>,
+    tolerance: f64,
+) -> PyResult<Arc<Sampler<Q>>> {
+    let quantile = quantile.map_err(PyValueError::new_err)?;
+    let sampler = Sampler::new(quantile, table_size, tolerance).map_err(PyValueError::new_err)?;
+    Ok(Arc::new(sampler))
+}
+
+fn quantile<'py, Q: Quantile>(
+    py: Python<'py>,
+    sampler: &Sampler<Q>,
+    u: PyReadonlyArray1<'py, f64>,
+) -> PyResult<&'py PyArray1<f64>> {
+    let u: &[f64] = u.as_slice()?;
+    let values: Vec<f64> = py.allow_threads(|| u.iter().map(|&u| sampler.draw(u)).collect());
+    Ok(values.into_pyarray(py))
+}
+
+fn stream<Q: Quantile + 'static>(
+    sampler: &Arc<Sampler<Q>>,
+    stream: u64,
+    n: usize,
+    chunk_size: usize,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    strategy: &str,
+) -> PyResult<SampleStream> {
+    let sampler = Arc::clone(sampler);
+    SampleStream::new(
+        Box::new(move |u| sampler.draw(u)),
+        stream,
+        n,
+        chunk_size,
+        seed,
+        threads,
+        strategy,
+    )
+}
+
+/// Reusable sampler of stellar masses (SI units) from the IMF of
+/// https://doi.org/10.1093/mnras/sts479, with configurable parameters.
+///
+/// Masses and `mu` are given in solar masses. Every constant of the
+/// quantile function is computed once, when the sampler is made.
+///
+/// If `table_size` is given, the quantile function is tabulated on that
+/// many intervals and samples are interpolated from the table, except in
+/// intervals where the relative error would exceed `tolerance`.
+///
+/// Without a table and with the default parameters, `sample(n, seed)`
+/// gives the same masses as `get_stellar_masses(n, seed)`.
+#[pyclass]
+pub struct ImfSampler {
+    sampler: Arc<Sampler<ImfQuantile>>,
+}
+
+#[pymethods]
+impl ImfSampler {
+    #[new]
+    #[pyo3(signature = (
+        alpha=quantile_function::ALPHA,
+        beta=quantile_function::BETA,
+        mu=quantile_function::MU,
+        lower=quantile_function::LOWER_MASS_LIMIT,
+        upper=quantile_function::UPPER_MASS_LIMIT,
+        table_size=None,
+        tolerance=DEFAULT_TOLERANCE,
+    ))]
+    fn new(
+        alpha: f64,
+        beta: f64,
+        mu: f64,
+        lower: f64,
+        upper: f64,
+        table_size: Option<usize>,
+        tolerance: f64,
+    ) -> PyResult<Self> {
+        let quantile = ImfQuantile::new(mu, alpha, beta, lower, upper);
+        Ok(ImfSampler {
+            sampler: build(quantile, table_size, tolerance)?,
+        })
+    }
+
+    #[getter]
+    fn alpha(&self) -> f64 {
+        self.sampler.quantile.alpha
+    }
+
+    #[getter]
+    fn beta(&self) -> f64 {
+        self.sampler.quantile.beta
+    }
+
+    #[getter]
+    fn mu(&self) -> f64 {
+        self.sampler.quantile.mu
+    }
+
+    #[getter]
+    fn lower(&self) -> f64 {
+        self.sampler.quantile.lower
+    }
+
+    #[getter]
+    fn upper(&self) -> f64 {
+        self.sampler.quantile.upper
+    }
+
+    /// Number of intervals of the lookup table, or None without one.
+    #[getter]
+    fn table_size(&self) -> Option<usize> {
+        self.sampler.table.as_ref().map(|t| t.size())
+    }
+
+    /// Largest relative error measured in the interpolated intervals.
+    #[getter]
+    fn table_error(&self) -> Option<f64> {
+        self.sampler.table.as_ref().map(|t| t.max_error())
+    }
+
+    /// Fraction of the table's intervals evaluated exactly.
+    #[getter]
+    fn exact_fraction(&self) -> Option<f64> {
+        self.sampler.table.as_ref().map(|t| t.exact_fraction())
+    }
+
+    /// Samples `n` stellar masses (SI units) in parallel into a NumPy array,
+    /// or into `out` if it is given (see `get_stellar_masses`).
+    #[pyo3(signature = (n=None, seed=None, threads=None, out=None, strategy="random"))]
+    fn sample<'py>(
+        &self,
+        py: Python<'py>,
+        n: Option<usize>,
+        seed: Option<u64>,
+        threads: Option<usize>,
+        out: Option<&'py PyArray1<f64>>,
+        strategy: &str,
+    ) -> PyResult<&'py PyArray1<f64>> {
+        let sampler = &self.sampler;
+        sample_into(
+            py,
+            n,
+            seed,
+            threads,
+            out,
+            strategy,
+            sampling::STELLAR_MASS_STREAM,
+            |u| sampler.draw(u),
+        )
+    }
+
+    /// Samples `n` stellar masses with importance sampling of the
+    /// high-mass tail, returning the masses and their weights.
+    /// See `get_weighted_stellar_masses`.
+    #[pyo3(signature = (
+        n=RUNS,
+        seed=None,
+        threads=None,
+        strategy="random",
+        tail_fraction=TAIL_FRACTION,
+        tail_index=TAIL_INDEX,
+    ))]
+    fn sample_weighted<'py>(
+        &self,
+        py: Python<'py>,
+        n: usize,
+        seed: Option<u64>,
+        threads: Option<usize>,
+        strategy: &str,
+        tail_fraction: f64,
+        tail_index: f64,
+    ) -> PyResult<(&'py PyArray1<f64>, &'py PyArray1<f64>)> {
+        let sampler = &self.sampler;
+        sample_weighted(
+            py,
+            n,
+            seed,
+            threads,
+            strategy,
+            tail_fraction,
+            tail_index,
+            sampling::STELLAR_MASS_STREAM,
+            |u| sampler.draw(u),
+        )
+    }
+
+    /// Samples `n` stellar masses and returns only their histogram over
+    /// `edges` (SI units). See `histogram_stellar_masses`.
+    #[pyo3(signature = (edges, n=RUNS, seed=None, threads=None, strategy="random"))]
+    fn histogram<'py>(
+        &self,
+        py: Python<'py>,
+        edges: PyReadonlyArray1<'py, f64>,
+        n: usize,
+        seed: Option<u64>,
+        threads: Option<usize>,
+        strategy: &str,
+    ) -> PyResult<&'py PyArray1<u64>> {
+        let sampler = &self.sampler;
+        sample_histogram(
+            py,
+            edges,
+            n,
+            seed,
+            threads,
+            strategy,
+            sampling::STELLAR_MASS_STREAM,
+            |u| sampler.draw(u),
+        )
+    }
+
+    /// Returns an iterator over `n` stellar masses in chunks of `chunk_size`.
+    /// See `stream_stellar_masses`.
+    #[pyo3(signature = (n, chunk_size=1 << 20, seed=None, threads=None, strategy="random"))]
+    fn stream(
+        &self,
+        n: usize,
+        chunk_size: usize,
+        seed: Option<u64>,
+        threads: Option<usize>,
+        strategy: &str,
+    ) -> PyResult<SampleStream> {
+        stream(
+            &self.sampler,
+            sampling::STELLAR_MASS_STREAM,
+            n,
+            chunk_size,
+            seed,
+            threads,
+            strategy,
+        )
+    }
+
+    /// Maps values of `u` in [0, 1) to stellar masses (SI units).
+    fn quantile<'py>(
+        &self,
+        py: Python<'py>,
+        u: PyReadonlyArray1<'py, f64>,
+    ) -> PyResult<&'py PyArray1<f64>> {
+        quantile(py, &self.sampler, u)
+    }
+
+    fn __repr__(&self) -> String {
+        let q = &self.sampler.quantile;
+        format!(
+            "ImfSampler(alpha={}, beta={}, mu={}, lower={}, upper={}, table_size={:?})",
+            q.alpha,
+            q.beta,
+            q.mu,
+            q.lower,
+            q.upper,
+            self.table_size()
+        )
+    }
+}
+
+/// Reusable sampler of rock masses (kg) from the power law
+/// dN/dm ∝ m^-p between `lower` and `upper`.
+///
+/// The powers of the mass limits are computed once, when the sampler
+/// is made. `table_size` and `tolerance` work as for `ImfSampler`.
+///
+/// Without a table and with the default parameters, `sample(n, seed)`
+/// gives the same masses as `get_rock_masses(n, seed)`.
+#[pyclass]
+pub struct RockSampler {
+    sampler: Arc<Sampler<RockQuantile>>,
+}
+
+#[pymethods]
+impl RockSampler {
+    #[new]
+    #[pyo3(signature = (
+        p=rock_dist::P,
+        lower=rock_dist::M_LOW,
+        upper=rock_dist::M_UPP,
+        table_size=None,
+        tolerance=DEFAULT_TOLERANCE,
+    ))]
+    fn new(
+        p: f64,
+        lower: f64,
+        upper: f64,
+        table_size: Option<usize>,
+        tolerance: f64,
+    ) -> PyResult<Self> {
+        let quantile = RockQuantile::new(p, lower, upper);
+        Ok(RockSampler {
+            sampler: build(quantile, table_size, tolerance)?,
+        })
+    }
+
+    #[getter]
+    fn p(&self) -> f64 {
+        self.sampler.quantile.p
+    }
+
+    #[getter]
+    fn lower(&self) -> f64 {
+        self.sampler.quantile.lower
+    }
+
+    #[getter]
+    fn upper(&self) -> f64 {
+        self.sampler.quantile.upper
+    }
+
+    /// Number of intervals of the lookup table, or None without one.
+    #[getter]
+    fn table_size(&self) -> Option<usize> {
+        self.sampler.table.as_ref().map(|t| t.size())
+    }
+
+    /// Largest relative error measured in the interpolated intervals.
+    #[getter]
+    fn table_error(&self) -> Option<f64> {
+        self.sampler.table.as_ref().map(|t| t.max_error())
+    }
+
+    /// Fraction of the table's intervals evaluated exactly.
+    #[getter]
+    fn exact_fraction(&self) -> Option<f64> {
+        self.sampler.table.as_ref().map(|t| t.exact_fraction())
+    }
+
+    /// Samples `n` rock masses (kg) in parallel into a NumPy array,
+    /// or into `out` if it is given (see `get_stellar_masses`).
+    #[pyo3(signature = (n=None, seed=None, threads=None, out=None, strategy="random"))]
+    fn sample<'py>(
+        &self,
+        py: Python<'py>,
+        n: Option<usize>,
+        seed: Option<u64>,
+        threads: Option<usize>,
+        out: Option<&'py PyArray1<f64>>,
+        strategy: &str,
+    ) -> PyResult<&'py PyArray1<f64>> {
+        let sampler = &self.sampler;
+        sample_into(
+            py,
+            n,
+            seed,
+            threads,
+            out,
+            strategy,
+            sampling::ROCK_MASS_STREAM,
+            |u| sampler.draw(u),
+        )
+    }
+
+    /// Samples `n` rock masses with importance sampling of the
+    /// high-mass tail, returning the masses and their weights.
+    /// See `get_weighted_stellar_masses`.
+    #[pyo3(signature = (
+        n=RUNS,
+        seed=None,
+        threads=None,
+        strategy="random",
+        tail_fraction=TAIL_FRACTION,
+        tail_index=TAIL_INDEX,
+    ))]
+    fn sample_weighted<'py>(
+        &self,
+        py: Python<'py>,
+        n: usize,
+        seed: Option<u64>,
+        threads: Option<usize>,
+        strategy: &str,
+        tail_fraction: f64,
+        tail_index: f64,
+    ) -> PyResult<(&'py PyArray1<f64>, &'py PyArray1<f64>)> {
+        let sampler = &self.sampler;
+        sample_weighted(
+            py,
+            n,
+            seed,
+            threads,
+            strategy,
+            tail_fraction,
+            tail_index,
+            sampling::ROCK_MASS_STREAM,
+            |u| sampler.draw(u),
+        )
+    }
+
+    /// Samples `n` rock masses and returns only their histogram over
+    /// `edges` (kg). See `histogram_rock_masses`.
+    #[pyo3(signature = (edges, n=RUNS, seed=None, threads=None, strategy="random"))]
+    fn histogram<'py>(
+        &self,
+        py: Python<'py>,
+        edges: PyReadonlyArray1<'py, f64>,
+        n: usize,
+        seed: Option<u64>,
+        threads: Option<usize>,
+        strategy: &str,
+    ) -> PyResult<&'py PyArray1<u64>> {
+        let sampler = &self.sampler;
+        sample_histogram(
+            py,
+            edges,
+            n,
+            seed,
+            threads,
+            strategy,
+            sampling::ROCK_MASS_STREAM,
+            |u| sampler.draw(u),
+        )
+    }
+
+    /// Returns an iterator over `n` rock masses in chunks of `chunk_size`.
+    /// See `stream_rock_masses`.
+    #[pyo3(signature = (n, chunk_size=1 << 20, seed=None, threads=None, strategy="random"))]
+    fn stream(
+        &self,
+        n: usize,
+        chunk_size: usize,
+        seed: Option<u64>,
+        threads: Option<usize>,
+        strategy: &str,
+    ) -> PyResult<SampleStream> {
+        stream(
+            &self.sampler,
+            sampling::ROCK_MASS_STREAM,
+            n,
+            chunk_size,
+            seed,
+            threads,
+            strategy,
+        )
+    }
+
+    /// Maps values of `u` in [0, 1) to rock masses (kg).
+    fn quantile<'py>(
+        &self,
+        py: Python<'py>,
+        u: PyReadonlyArray1<'py, f64>,
+    ) -> PyResult<&'py PyArray1<f64>> {
+        quantile(py, &self.sampler, u)
+    }
+
+    fn __repr__(&self) -> String {
+        let q = &self.sampler.quantile;
+        format!(
+            "RockSampler(p={}, lower={}, upper={}, table_size={:?})",
+            q.p,
+            q.lower,
+            q.upper,
+            self.table_size()
+        )
+    }
+}
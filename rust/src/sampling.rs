@@ -0,0 +1,280 @@
+use rand::{Rng, SeedableRng};
+use rand_chacha::ChaCha8Rng;
+use rayon::prelude::*;
+use rayon::{ThreadPoolBuildError, ThreadPoolBuilder};
+
+/// Number of samples drawn from each RNG stream.
+///
+/// Samples are generated in fixed-size blocks, each with its own
+/// ChaCha stream derived from (seed, stream id, block index). The
+/// output therefore only depends on the seed, never on how many
+/// threads the blocks were spread across.
+pub const BLOCK_SIZE: usize = 1 << 16;
+
+/// Stream ids keep the stellar and rock samplers independent
+/// even when they are given the same seed.
+pub const STELLAR_MASS_STREAM: u64 = 1;
+pub const ROCK_MASS_STREAM: u64 = 2;
+
+/// Block index reserved for the scrambling of quasi-random points.
+/// Sample blocks never reach it (it would take 2^64 samples).
+const SCRAMBLE_BLOCK: usize = (1 << 48) - 1;
+
+/// Largest double below 1, so that `u` always stays in [0, 1).
+const BELOW_ONE: f64 = 1.0 - f64::EPSILON / 2.0;
+
+/// Names accepted by `Strategy::parse`.
+pub const STRATEGIES: [&str; 4] = ["random", "stratified", "sobol", "halton"];
+
+/// How the uniform numbers fed to a quantile function are drawn.
+///
+/// `Random` draws independent uniforms. `Stratified` splits [0, 1) into
+/// `n` equal strata and draws one uniform in each, which in one dimension
+/// is the same as Latin hypercube sampling. `Sobol` and `Halton` use
+/// randomly scrambled low-discrepancy sequences, so the error of a
+/// quantile falls close to 1/n rather than 1/sqrt(n).
+///
+/// Each distribution is one-dimensional, so each stream is one coordinate
+/// of the sequence: the stellar masses use the first coordinate and the
+/// rock masses the second. Pairing the i-th star with the i-th rock then
+/// gives the points of a two-dimensional Sobol or Halton sequence.
+#[derive(Clone, Copy, Debug, PartialEq)]
+pub enum Strategy {
+    Random,
+    Stratified,
+    Sobol,
+    Halton,
+}
+
+impl Strategy {
+    pub fn parse(name: &str) -> Result<Strategy, String> {
+        match name {
+            "random" => Ok(Strategy::Random),
+            "stratified" => Ok(Strategy::Stratified),
+            "sobol" => Ok(Strategy::Sobol),
+            "halton" => Ok(Strategy::Halton),
+            _ => Err(format!(
+                "Unknown sampling strategy {}, expected one of {:?}",
+                name, STRATEGIES
+            )),
+        }
+    }
+}
+
+/// Returns a seed from the thread-local RNG, for runs that were
+/// not given one.
+pub fn random_seed() -> u64 {
+    rand::thread_rng().gen()
+}
+
+/// Returns the RNG for one block of one stream.
+pub fn block_rng(seed: u64, stream: u64, block: usize) -> ChaCha8Rng {
+    let mut rng = ChaCha8Rng::seed_from_u64(seed);
+    rng.set_stream((stream << 48) | block as u64);
+    rng
+}
+
+/// Maps the top 53 bits of `bits` to [0, 1).
+fn to_unit(bits: u64) -> f64 {
+    (bits >> 11) as f64 * (1.0 / (1u64 << 53) as f64)
+}
+
+/// Point `index` of the first (`dimension` 0) or second coordinate of
+/// the Sobol sequence, as a 64-bit binary fraction.
+fn sobol(index: u64, dimension: usize) -> u64 {
+    if dimension == 0 {
+        // Direction numbers 1/2, 1/4, ..., i.e. the van der Corput sequence
+        return index.reverse_bits();
+    }
+    // Direction numbers of the primitive polynomial x + 1: v_k = v_{k-1} ^ (v_{k-1} >> 1)
+    let mut direction: u64 = 1 << 63;
+    let mut point: u64 = 0;
+    let mut i = index;
+    while i > 0 {
+        if i & 1 == 1 {
+            point ^= direction;
+        }
+        direction ^= direction >> 1;
+        i >>= 1;
+    }
+    point
+}
+
+/// Radical inverse of `index` in `base`, the Halton coordinate for that base.
+fn radical_inverse(index: u64, base: u64) -> f64 {
+    let inverse = 1.0 / base as f64;
+    let mut scale = inverse;
+    let mut value = 0.0;
+    let mut i = index;
+    while i > 0 {
+        value += (i % base) as f64 * scale;
+        i /= base;
+        scale *= inverse;
+    }
+    value
+}
+
+/// The uniform points of one stream of a run of `n` samples.
+///
+/// Every point depends only on the seed, the stream and its index, so
+/// blocks can be filled in any order, on any number of threads.
+pub struct Points {
+    strategy: Strategy,
+    seed: u64,
+    stream: u64,
+    n: usize,
+    // Random digital shift (Sobol) or rotation (Halton) of the sequence
+    scramble: u64,
+}
+
+impl Points {
+    pub fn new(strategy: Strategy, seed: u64, stream: u64, n: usize) -> Points {
+        let scramble = block_rng(seed, stream, SCRAMBLE_BLOCK).gen();
+        Points {
+            strategy,
+            seed,
+            stream,
+            n,
+            scramble,
+        }
+    }
+
+    /// Independent uniform points, as drawn before strategies existed.
+    pub fn random(seed: u64, stream: u64, n: usize) -> Points {
+        Points::new(Strategy::Random, seed, stream, n)
+    }
+
+    /// Returns the RNG of one block of points.
+    pub fn rng(&self, block: usize) -> ChaCha8Rng {
+        block_rng(self.seed, self.stream, block)
+    }
+
+    /// Returns point `index`, where `rng` is the RNG of the block holding it
+    /// and has drawn for every earlier point of that block.
+    pub fn point(&self, index: usize, rng: &mut ChaCha8Rng) -> f64 {
+        // The two streams are the two coordinates of the sequences
+        let dimension = (self.stream as usize + 1) % 2;
+        match self.strategy {
+            Strategy::Random => rng.gen_range(0.0..1.0),
+            Strategy::Stratified => {
+                ((index as f64 + rng.gen_range(0.0..1.0)) / self.n as f64).min(BELOW_ONE)
+            }
+            Strategy::Sobol => to_unit(sobol(index as u64, dimension) ^ self.scramble),
+            Strategy::Halton => {
+                let base = [2, 3][dimension];
+                let u = radical_inverse(index as u64, base) + to_unit(self.scramble);
+                (if u >= 1.0 { u - 1.0 } else { u }).min(BELOW_ONE)
+            }
+        }
+    }
+}
+
+/// Defensive importance sampling of the upper tail of a distribution.
+///
+/// A fraction `fraction` of the points is drawn from the density
+/// (1 - index) (1 - u)^-index, which piles up near u = 1 (the most
+/// massive stars and rocks), and the rest uniformly. Each sample is
+/// weighted by the ratio of the uniform density to this mixture, so
+/// weighted statistics are unbiased. The uniform part bounds every
+/// weight by 1 / (1 - fraction).
+pub struct TailImportance {
+    pub fraction: f64,
+    pub index: f64,
+}
+
+impl TailImportance {
+    pub fn new(fraction: f64, index: f64) -> Result<TailImportance, String> {
+        if !(fraction > 0.0 && fraction < 1.0) {
+            return Err("tail_fraction must be between 0 and 1".to_string());
+        }
+        if !(index >= 0.0 && index < 1.0) {
+            return Err("tail_index must be in [0, 1)".to_string());
+        }
+        Ok(TailImportance { fraction, index })
+    }
+
+    /// Maps a uniform point `v` to a point `u` of the mixture,
+    /// returning `u` and its weight.
+    pub fn apply(&self, v: f64) -> (f64, f64) {
+        let tail = 1.0 - self.index;
+        // Distance of u from 1, kept separately so the weight stays exact
+        let gap = if v < self.fraction {
+            (1.0 - v / self.fraction).powf(1.0 / tail)
+        } else {
+            1.0 - (v - self.fraction) / (1.0 - self.fraction)
+        };
+        let density = (1.0 - self.fraction) + self.fraction * tail * gap.powf(-self.index);
+        ((1.0 - gap).min(BELOW_ONE), 1.0 / density)
+    }
+}
+
+/// Fills `out` in parallel with `dist(u)`, where `u` is uniform on [0, 1).
+///
+/// Args:
+///   out: Buffer to fill.
+///   seed: Seed of the run.
+///   stream: Stream id of the distribution being sampled.
+///   dist: Quantile function mapping `u` to a sample.
+pub fn fill_parallel<F>(out: &mut [f64], seed: u64, stream: u64, dist: F)
+where
+    F: Fn(f64) -> f64 + Sync,
+{
+    let points = Points::random(seed, stream, out.len());
+    fill_blocks(out, &points, 0, dist);
+}
+
+/// Fills `out` in parallel with `dist(u)` for the points `u` of `points`,
+/// starting at block `first_block`. Filling consecutive slices with
+/// consecutive block offsets gives exactly the same samples as one call
+/// over the whole array.
+pub fn fill_blocks<F>(out: &mut [f64], points: &Points, first_block: usize, dist: F)
+where
+    F: Fn(f64) -> f64 + Sync,
+{
+    out.par_chunks_mut(BLOCK_SIZE)
+        .enumerate()
+        .for_each(|(block, chunk)| {
+            let block = first_block + block;
+            let mut rng = points.rng(block);
+            for (k, x) in chunk.iter_mut().enumerate() {
+                *x = dist(points.point(block * BLOCK_SIZE + k, &mut rng));
+            }
+        });
+}
+
+/// Same as `fill_blocks` over a whole run, but draws the points from
+/// `tail`'s importance density and writes each sample's weight to `weights`.
+pub fn fill_weighted<F>(
+    out: &mut [f64],
+    weights: &mut [f64],
+    points: &Points,
+    tail: &TailImportance,
+    dist: F,
+) where
+    F: Fn(f64) -> f64 + Sync,
+{
+    out.par_chunks_mut(BLOCK_SIZE)
+        .zip(weights.par_chunks_mut(BLOCK_SIZE))
+        .enumerate()
+        .for_each(|(block, (chunk, weight_chunk))| {
+            let mut rng = points.rng(block);
+            for (k, (x, w)) in chunk.iter_mut().zip(weight_chunk.iter_mut()).enumerate() {
+                let (u, weight) = tail.apply(points.point(block * BLOCK_SIZE + k, &mut rng));
+                *x = dist(u);
+                *w = weight;
+            }
+        });
+}
+
+/// Runs `f` on a pool with `threads` threads,
+/// or on rayon's global pool if `threads` is None.
+pub fn with_threads<T, F>(threads: Option<usize>, f: F) -> Result<T, ThreadPoolBuildError>
+where
+    T: Send,
+    F: FnOnce() -> T + Send,
+{
+    match threads {
+        Some(n) => Ok(ThreadPoolBuilder::new().num_threads(n).build()?.install(f)),
+        None => Ok(f()),
+    }
+}
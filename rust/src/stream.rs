@@ -0,0 +1,158 @@
+use crate::quantile_function::ImfQuantile;
+use crate::rock_dist::RockQuantile;
+use crate::sampling::{self, Points, Strategy};
+use crate::table::Quantile;
+
+use numpy::IntoPyArray;
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+use rayon::{ThreadPool, ThreadPoolBuilder};
+
+/// Iterator over fixed-size chunks of a sample, so that arbitrarily
+/// large runs can be processed without holding every sample in memory.
+///
+/// `chunk_size` is rounded up to a multiple of `sampling::BLOCK_SIZE`,
+/// which keeps chunks aligned with the RNG blocks. Concatenating every
+/// chunk therefore gives the same values as sampling all `n` at once
+/// with the same seed and strategy.
+#[pyclass]
+pub struct SampleStream {
+    dist: Box<dyn Fn(f64) -> f64 + Send + Sync>,
+    points: Points,
+    n: usize,
+    chunk_size: usize,
+    seed: u64,
+    position: usize,
+    pool: Option<ThreadPool>,
+}
+
+impl SampleStream {
+    pub fn new(
+        dist: Box<dyn Fn(f64) -> f64 + Send + Sync>,
+        stream: u64,
+        n: usize,
+        chunk_size: usize,
+        seed: Option<u64>,
+        threads: Option<usize>,
+        strategy: &str,
+    ) -> PyResult<Self> {
+        if chunk_size == 0 {
+            return Err(PyValueError::new_err("chunk_size must be positive"));
+        }
+        let blocks_per_chunk = (chunk_size + sampling::BLOCK_SIZE - 1) / sampling::BLOCK_SIZE;
+        let pool = match threads {
+            Some(t) => Some(
+                ThreadPoolBuilder::new()
+                    .num_threads(t)
+                    .build()
+                    .map_err(|e| PyValueError::new_err(e.to_string()))?,
+            ),
+            None => None,
+        };
+        let strategy = Strategy::parse(strategy).map_err(PyValueError::new_err)?;
+        let seed = seed.unwrap_or_else(sampling::random_seed);
+
+        Ok(SampleStream {
+            dist,
+            points: Points::new(strategy, seed, stream, n),
+            n,
+            chunk_size: blocks_per_chunk * sampling::BLOCK_SIZE,
+            seed,
+            position: 0,
+            pool,
+        })
+    }
+
+    fn next_chunk(&self, len: usize) -> Vec<f64> {
+        let mut chunk: Vec<f64> = vec![0.0; len];
+        let first_block = self.position / sampling::BLOCK_SIZE;
+        let (points, dist) = (&self.points, &*self.dist);
+        match &self.pool {
+            Some(pool) => {
+                pool.install(|| sampling::fill_blocks(&mut chunk, points, first_block, dist))
+            }
+            None => sampling::fill_blocks(&mut chunk, points, first_block, dist),
+        }
+        chunk
+    }
+}
+
+#[pymethods]
+impl SampleStream {
+    /// Seed used by the stream, so that a run with a random seed can be reproduced.
+    #[getter]
+    fn seed(&self) -> u64 {
+        self.seed
+    }
+
+    /// Number of samples in each chunk (the last chunk may be shorter).
+    #[getter]
+    fn chunk_size(&self) -> usize {
+        self.chunk_size
+    }
+
+    fn __len__(&self) -> usize {
+        (self.n + self.chunk_size - 1) / self.chunk_size
+    }
+
+    fn __iter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+        slf
+    }
+
+    fn __next__(mut slf: PyRefMut<'_, Self>, py: Python<'_>) -> Option<PyObject> {
+        if slf.position >= slf.n {
+            return None;
+        }
+        let len = slf.chunk_size.min(slf.n - slf.position);
+        // The stream stays borrowed while the GIL is released, so another
+        // thread iterating it at the same time gets an error, not a race
+        let stream: &SampleStream = &slf;
+        let chunk = py.allow_threads(|| stream.next_chunk(len));
+        slf.position += len;
+        Some(chunk.into_pyarray(py).into())
+    }
+}
+
+/// Returns an iterator over `n` stellar masses (SI units) in chunks of `chunk_size`.
+#[pyfunction]
+#[pyo3(signature = (n, chunk_size=1 << 20, seed=None, threads=None, strategy="random"))]
+pub fn stream_stellar_masses(
+    n: usize,
+    chunk_size: usize,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    strategy: &str,
+) -> PyResult<SampleStream> {
+    let quantile = ImfQuantile::default();
+    SampleStream::new(
+        Box::new(move |u| quantile.quantile(u)),
+        sampling::STELLAR_MASS_STREAM,
+        n,
+        chunk_size,
+        seed,
+        threads,
+        strategy,
+    )
+}
+
+/// Returns an iterator over `n` rock masses (SI units) in chunks of `chunk_size`.
+#[pyfunction]
+#[pyo3(signature = (n, chunk_size=1 << 20, seed=None, threads=None, strategy="random"))]
+pub fn stream_rock_masses(
+    n: usize,
+    chunk_size: usize,
+    seed: Option<u64>,
+    threads: Option<usize>,
+    strategy: &str,
+) -> PyResult<SampleStream> {
+    let quantile = RockQuantile::default();
+    SampleStream::new(
+        Box::new(move |u| quantile.quantile(u)),
+        sampling::ROCK_MASS_STREAM,
+        n,
+        chunk_size,
+        seed,
+        threads,
+        strategy,
+    )
+}